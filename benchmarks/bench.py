@@ -0,0 +1,222 @@
+"""Benchmark data-prep and scoring hot paths on synthetic inputs
+
+Each (case, rows) pair runs in its own Python process so peak RSS is not polluted
+by previous cases. Results are saved as JSON and compared against a baseline JSON
+(benchmarks/baseline.json by default), exiting with non-zero code when wall time
+or peak RSS regresses beyond tolerance. Runs offline, peak RSS is read from /proc
+on Linux.
+
+Best-of-3 wall times vary up to ~18% between runs on a shared single CPU host,
+while peak RSS stays within ~3%, hence default tolerances of 0.2 and 0.1. Timings
+only compare on the host baseline was recorded on, a warning is printed otherwise.
+
+Examples:
+    python3 benchmarks/bench.py --sizes 100000 1000000
+
+    python3 benchmarks/bench.py \
+        --cases module1.transform_dataframe module4.predict \
+        --output results.json
+
+    python3 benchmarks/bench.py \
+        --output results.json \
+        --baseline baseline.json \
+        --tolerance 0.2 \
+        --rss-tolerance 0.1
+
+    # recording a new baseline
+    python3 benchmarks/bench.py --output benchmarks/baseline.json --no-baseline
+"""
+
+import argparse
+import contextlib
+import json
+import os
+import platform
+import resource
+import subprocess
+import sys
+import time
+
+from cases import CASES
+
+
+DEFAULT_SIZES = [100_000, 1_000_000, 10_000_000]
+DEFAULT_BASELINE = os.path.join(os.path.dirname(os.path.abspath(__file__)), "baseline.json")
+DEFAULT_TOLERANCE = 0.2
+DEFAULT_RSS_TOLERANCE = 0.1
+
+
+def reset_peak_rss() -> None:
+    # Linux resets VmHWM (peak resident set size) when writing "5" to clear_refs
+    with contextlib.suppress(OSError):
+        with open("/proc/self/clear_refs", "w") as file:
+            file.write("5")
+
+
+def read_peak_rss_mb() -> float:
+    with contextlib.suppress(OSError):
+        with open("/proc/self/status") as file:
+            for line in file:
+                if line.startswith("VmHWM:"):
+                    return int(line.split()[1]) / 1024
+
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+
+def run_case(case: str, n_rows: int, repeat: int) -> dict:
+    """Run case in current process, wall time is best of repeat runs"""
+    (make_input, run) = CASES[case](n_rows)
+
+    wall_times = []
+    peak_rss_mb = 0.0
+    for _ in range(repeat):
+        data = make_input()
+        reset_peak_rss()
+        with open(os.devnull, "w") as devnull, contextlib.redirect_stdout(devnull):
+            start = time.perf_counter()
+            run(data)
+            wall_times.append(time.perf_counter() - start)
+        peak_rss_mb = max(peak_rss_mb, read_peak_rss_mb())
+        del data
+
+    wall_time_s = min(wall_times)
+
+    return dict(
+        case=case,
+        rows=n_rows,
+        status="ok",
+        wall_time_s=wall_time_s,
+        rows_per_sec=n_rows / wall_time_s,
+        peak_rss_mb=peak_rss_mb,
+    )
+
+
+def spawn_case(case: str, n_rows: int, repeat: int, timeout: float) -> dict:
+    command = [sys.executable, __file__, "--worker", case, str(n_rows), str(repeat)]
+    try:
+        process = subprocess.run(command, capture_output=True, text=True, timeout=timeout)
+    except subprocess.TimeoutExpired:
+        return dict(case=case, rows=n_rows, status="timeout")
+
+    if process.returncode < 0:
+        # e.g. SIGKILL from kernel OOM killer
+        return dict(case=case, rows=n_rows, status="error", reason=f"killed by signal {-process.returncode}")
+    if process.returncode != 0:
+        reason = (process.stderr.strip().splitlines() or ["unknown error"])[-1]
+        status = "skipped" if "ImportError" in reason or "ModuleNotFoundError" in reason else "error"
+        return dict(case=case, rows=n_rows, status=status, reason=reason)
+
+    return json.loads(process.stdout.strip().splitlines()[-1])
+
+
+def compare(results: list, baseline: dict, tolerance: float, rss_tolerance: float):
+    """(regressions, uncompared) descriptions of results against baseline ones"""
+    base_results = {(r["case"], r["rows"]): r for r in baseline["results"] if r["status"] == "ok"}
+    tolerances = dict(wall_time_s=tolerance, peak_rss_mb=rss_tolerance)
+
+    regressions = []
+    uncompared = []
+    for result in results:
+        if result["status"] != "ok":
+            continue
+        base = base_results.get((result["case"], result["rows"]))
+        if base is None:
+            uncompared.append(f'{result["case"]} ({result["rows"]} rows)')
+            continue
+        for metric, metric_tolerance in tolerances.items():
+            ratio = result[metric] / base[metric]
+            result[f"{metric}_ratio"] = ratio
+            if ratio > 1 + metric_tolerance:
+                regressions.append(f'{result["case"]} ({result["rows"]} rows): {metric} x{ratio:.2f}')
+
+    return (regressions, uncompared)
+
+
+def print_header() -> None:
+    print(f'{"case":<32}{"rows":>12}{"wall (s)":>12}{"rows/sec":>14}{"peak RSS (MB)":>16}')
+
+
+def print_results(results: list) -> None:
+    for r in results:
+        if r["status"] != "ok":
+            print(f'{r["case"]:<32}{r["rows"]:>12}  {r["status"]}: {r.get("reason", "")}')
+            continue
+        print(
+            f'{r["case"]:<32}{r["rows"]:>12}{r["wall_time_s"]:>12.3f}'
+            f'{r["rows_per_sec"]:>14,.0f}{r["peak_rss_mb"]:>16.1f}'
+        )
+
+
+def main(
+    cases,
+    sizes,
+    repeat,
+    timeout,
+    output=None,
+    baseline=DEFAULT_BASELINE,
+    tolerance=DEFAULT_TOLERANCE,
+    rss_tolerance=DEFAULT_RSS_TOLERANCE,
+):
+    print_header()
+    results = []
+    for case in cases:
+        for n_rows in sizes:
+            results.append(spawn_case(case, n_rows, repeat, timeout))
+            print_results(results[-1:])
+
+    report = dict(
+        host=dict(
+            platform=platform.platform(),
+            python=platform.python_version(),
+            cpu_count=os.cpu_count(),
+        ),
+        created_at=time.strftime("%Y-%m-%dT%H:%M:%S"),
+        results=results,
+    )
+
+    regressions = []
+    if baseline:
+        with open(baseline) as file:
+            base_report = json.load(file)
+        if base_report["host"] != report["host"]:
+            print(f'\nWarning: baseline was recorded on {base_report["host"]}, timings may not compare')
+        (regressions, uncompared) = compare(results, base_report, tolerance, rss_tolerance)
+        if uncompared:
+            print("\nNot compared, missing from baseline:")
+            print("\n".join(uncompared))
+        report["baseline"] = dict(
+            path=baseline,
+            tolerance=tolerance,
+            rss_tolerance=rss_tolerance,
+            regressions=regressions,
+            uncompared=uncompared,
+        )
+
+    if output:
+        with open(output, "w") as file:
+            json.dump(report, file, indent=2)
+
+    if regressions:
+        print("\nRegressions beyond tolerance:")
+        print("\n".join(regressions))
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    if len(sys.argv) > 1 and sys.argv[1] == "--worker":
+        (case, n_rows, repeat) = sys.argv[2], int(sys.argv[3]), int(sys.argv[4])
+        print(json.dumps(run_case(case, n_rows, repeat)))
+        sys.exit(0)
+
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--cases", nargs="+", default=list(CASES), choices=list(CASES))
+    parser.add_argument("--sizes", nargs="+", default=DEFAULT_SIZES, type=int)
+    parser.add_argument("--repeat", default=3, type=int)
+    parser.add_argument("--timeout", default=1800, type=float, help="seconds per case and size")
+    parser.add_argument("--output", default=None)
+    parser.add_argument("--baseline", default=DEFAULT_BASELINE)
+    parser.add_argument("--no-baseline", action="store_const", const=None, dest="baseline")
+    parser.add_argument("--tolerance", default=DEFAULT_TOLERANCE, type=float, help="wall time ratio")
+    parser.add_argument("--rss-tolerance", default=DEFAULT_RSS_TOLERANCE, type=float, help="peak RSS ratio")
+    kwargs = vars(parser.parse_args())
+    main(**kwargs)
@@ -0,0 +1,144 @@
+"""Benchmark cases for data-prep and scoring hot paths
+
+Every case takes a number of rows and returns a pair of callables: make_input()
+builds a fresh input outside of timing (hot paths mutate their dataframes) and
+run(input) is the timed call. Modules are imported from their own directories,
+cases raise ImportError when module dependencies (e.g. Prefect, Evidently) are missing.
+"""
+
+import atexit
+import importlib
+import os
+import sys
+import tempfile
+
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+
+
+REPO_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+YEAR_MONTH = "2022-01"
+CHUNK_SIZE = 1_000_000
+
+
+def import_module_from(module_dir: str, name: str):
+    sys.path.insert(0, os.path.join(REPO_DIR, module_dir))
+    return importlib.import_module(name)
+
+
+def make_trips(n_rows: int, vehicle_type: str = "yellow", seed: int = 42) -> pd.DataFrame:
+    """Synthetic trips with TLC schema, same rows as generate_data.py writes for same seed"""
+    generate_data = import_module_from("", "generate_data")
+    chunks = [
+        generate_data.generate_chunk(
+            vehicle_type,
+            YEAR_MONTH,
+            min(CHUNK_SIZE, n_rows - start),
+            np.random.default_rng([seed, chunk_index]),
+        )
+        for (chunk_index, start) in enumerate(range(0, n_rows, CHUNK_SIZE))
+    ]
+
+    return pa.concat_tables(chunks).to_pandas()
+
+
+def module1_transform_dataframe(n_rows):
+    module = import_module_from("module-1", "module")
+    df = make_trips(n_rows, "yellow")
+
+    return (
+        lambda: df.copy(),
+        lambda df_in: module.transform_dataframe(df_in, "yellow", verbose=False),
+    )
+
+
+def module1_vectorize_Xy(n_rows):
+    module = import_module_from("module-1", "module")
+    categorical = ["DOLocationID", "PULocationID"]
+    ids = np.arange(1, import_module_from("", "generate_data").N_ZONES + 1)
+    encoder = module.LocationEncoder({col: ids for col in categorical})
+    df = module.transform_dataframe(make_trips(n_rows, "yellow"), "yellow", verbose=False)
+
+    return (
+        lambda: df,
+        lambda df_in: module.vectorize_Xy(df_in, categorical, [], "duration", encoder),
+    )
+
+
+def module3_transform_dataframe(n_rows):
+    module = import_module_from("module-3/src", "pipeline_xgboost")
+    df = make_trips(n_rows, "green")
+
+    return (
+        lambda: df.copy(),
+        lambda df_in: module.transform_dataframe.fn(df_in, "green"),
+    )
+
+
+def module4_read_data(n_rows):
+    module = import_module_from("module-4", "starter")
+    generate_data = import_module_from("", "generate_data")
+    # cases run in their own worker process, input file is removed when it exits
+    temp_dir = tempfile.TemporaryDirectory(prefix="bench-")
+    atexit.register(temp_dir.cleanup)
+    file_path = generate_data.generate("yellow", YEAR_MONTH, n_rows, temp_dir.name)
+
+    return (lambda: file_path, module.read_data)
+
+
+def module4_predict(n_rows):
+    from sklearn.feature_extraction import DictVectorizer
+    from sklearn.linear_model import LinearRegression
+
+    module = import_module_from("module-4", "starter")
+    df = make_trips(n_rows, "yellow")
+    df["duration"] = (df["tpep_dropoff_datetime"] - df["tpep_pickup_datetime"]).dt.total_seconds() / 60
+    df[module.CATEGORICAL] = df[module.CATEGORICAL].astype("str")
+
+    df_fit = df[:50_000]
+    dv = DictVectorizer()
+    X_fit = dv.fit_transform(df_fit[module.CATEGORICAL].to_dict(orient="records"))
+    model = LinearRegression().fit(X_fit, df_fit["duration"])
+
+    return (lambda: df, lambda df_in: module.predict(df_in, dv, model))
+
+
+def module5_preprocess_dataframe(n_rows):
+    module = import_module_from("module-5/pipelines/src", "transform_tasks")
+    df = make_trips(n_rows, "green")
+
+    return (
+        lambda: df.copy(),
+        lambda df_in: module.preprocess_dataframe.fn(df_in),
+    )
+
+
+def module5_default_report(n_rows):
+    module = import_module_from("module-5/pipelines/src", "DefaultReport")
+    transform_tasks = importlib.import_module("transform_tasks")
+    constants = importlib.import_module("constants")
+
+    def make_frame(seed):
+        df = transform_tasks.preprocess_dataframe.fn(make_trips(n_rows, "green", seed))
+        noise = np.random.default_rng(seed).normal(0, 3, len(df))
+        df[constants.PREDICTION] = df[constants.TARGET] + noise
+        return df
+
+    df_ref, df_cur = make_frame(1), make_frame(2)
+
+    return (
+        lambda: df_cur,
+        lambda df_in: module.DefaultReport().run(current_data=df_in, reference_data=df_ref),
+    )
+
+
+CASES = {
+    "module1.transform_dataframe": module1_transform_dataframe,
+    "module1.vectorize_Xy": module1_vectorize_Xy,
+    "module3.transform_dataframe": module3_transform_dataframe,
+    "module4.read_data": module4_read_data,
+    "module4.predict": module4_predict,
+    "module5.preprocess_dataframe": module5_preprocess_dataframe,
+    "module5.DefaultReport.run": module5_default_report,
+}
@@ -14,6 +14,7 @@ echo_default_year_month_pairs() {
 
 DATA_BASE_URL=https://d37ci6vzurychx.cloudfront.net
 
+PARALLEL_DOWNLOADS="${PARALLEL_DOWNLOADS:-4}"
 RAW_DATA_DIR="${RAW_DATA_DIR:-"$(realpath $(dirname $0))/data/raw2"}"
 VEHICLE_TYPE="${VEHICLE_TYPE:-green}"
 YEAR_MONTH_PAIRS="${YEAR_MONTH_PAIRS:-"$(echo_default_year_month_pairs)"}"
@@ -22,5 +23,5 @@ echo "Downloading to: ${RAW_DATA_DIR}"
 mkdir -p "${RAW_DATA_DIR}"
 wget -P "${RAW_DATA_DIR}" -q "${DATA_BASE_URL}/misc/taxi+_zone_lookup.csv"
 for YEAR_MONTH in $YEAR_MONTH_PAIRS; do
-    wget -P "${RAW_DATA_DIR}" -q "${DATA_BASE_URL}/trip-data/${VEHICLE_TYPE}_tripdata_${YEAR_MONTH}.parquet"
-done
+    echo "${DATA_BASE_URL}/trip-data/${VEHICLE_TYPE}_tripdata_${YEAR_MONTH}.parquet"
+done | xargs -P "${PARALLEL_DOWNLOADS}" -n 1 wget -P "${RAW_DATA_DIR}" -q
@@ -0,0 +1,219 @@
+"""Deterministic synthetic NYC taxi trip data at production scale
+
+Writes Parquet files with the same columns and types as TLC green/yellow trip data,
+named like downloaded files so any module can read them through --source. Rows are
+generated and written chunk by chunk, so memory is bounded by chunk size regardless
+of total rows. Each chunk gets its own random stream derived from (seed, chunk index),
+making output identical for same parameters.
+
+Examples:
+    python3 generate_data.py --vehicle-type green --year-month 2022-01 --rows 1000000
+
+    python3 generate_data.py \
+        --vehicle-type yellow \
+        --year-month 2023-03 \
+        --rows 100000000 \
+        --row-group-size 1000000 \
+        --output-dir data/synthetic
+
+    # drifted month with missing values
+    python3 generate_data.py --year-month 2022-02 --drift 0.3 --missing-rate 0.05
+"""
+
+import argparse
+import os
+
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+import pyarrow.parquet as pq
+
+
+N_ZONES = 265  # location IDs in taxi zone lookup
+DATETIME_PREFIXES = dict(green="lpep", yellow="tpep")
+
+# columns that are null altogether on a share of records in TLC files
+NULLABLE_COLUMNS = dict(
+    green=["store_and_fwd_flag", "RatecodeID", "passenger_count", "payment_type", "trip_type", "congestion_surcharge"],
+    yellow=["passenger_count", "RatecodeID", "store_and_fwd_flag", "congestion_surcharge", "airport_fee"],
+)
+
+
+def get_schema(vehicle_type: str) -> pa.Schema:
+    timestamp = pa.timestamp("us")
+    if vehicle_type == "green":
+        fields = [
+            ("VendorID", pa.int64()),
+            ("lpep_pickup_datetime", timestamp),
+            ("lpep_dropoff_datetime", timestamp),
+            ("store_and_fwd_flag", pa.string()),
+            ("RatecodeID", pa.float64()),
+            ("PULocationID", pa.int64()),
+            ("DOLocationID", pa.int64()),
+            ("passenger_count", pa.float64()),
+            ("trip_distance", pa.float64()),
+            ("fare_amount", pa.float64()),
+            ("extra", pa.float64()),
+            ("mta_tax", pa.float64()),
+            ("tip_amount", pa.float64()),
+            ("tolls_amount", pa.float64()),
+            ("ehail_fee", pa.float64()),
+            ("improvement_surcharge", pa.float64()),
+            ("total_amount", pa.float64()),
+            ("payment_type", pa.float64()),
+            ("trip_type", pa.float64()),
+            ("congestion_surcharge", pa.float64()),
+        ]
+    elif vehicle_type == "yellow":
+        fields = [
+            ("VendorID", pa.int64()),
+            ("tpep_pickup_datetime", timestamp),
+            ("tpep_dropoff_datetime", timestamp),
+            ("passenger_count", pa.float64()),
+            ("trip_distance", pa.float64()),
+            ("RatecodeID", pa.float64()),
+            ("store_and_fwd_flag", pa.string()),
+            ("PULocationID", pa.int64()),
+            ("DOLocationID", pa.int64()),
+            ("payment_type", pa.int64()),
+            ("fare_amount", pa.float64()),
+            ("extra", pa.float64()),
+            ("mta_tax", pa.float64()),
+            ("tip_amount", pa.float64()),
+            ("tolls_amount", pa.float64()),
+            ("improvement_surcharge", pa.float64()),
+            ("total_amount", pa.float64()),
+            ("congestion_surcharge", pa.float64()),
+            ("airport_fee", pa.float64()),
+        ]
+    else:
+        raise ValueError(f"Unsupported vehicle_type: {vehicle_type}")
+
+    return pa.schema(fields)
+
+
+def get_zone_weights(drift: float = 0.0) -> np.ndarray:
+    """Skewed zone popularity, fixed across seeds; drift moves demand towards other zones"""
+    popularity = np.random.default_rng(0).zipf(1.5, N_ZONES).clip(max=1000).astype(np.float64)
+    weights = np.roll(popularity, int(round(drift * N_ZONES / 4)))
+
+    return weights / weights.sum()
+
+
+def generate_chunk(
+    vehicle_type: str,
+    year_month: str,
+    n_rows: int,
+    rng: np.random.Generator,
+    drift: float = 0.0,
+    missing_rate: float = 0.0,
+) -> pa.Table:
+    schema = get_schema(vehicle_type)
+    prefix = DATETIME_PREFIXES[vehicle_type]
+
+    month_start = pd.Timestamp(f"{year_month}-01")
+    month_seconds = int((month_start + pd.offsets.MonthBegin(1) - month_start).total_seconds())
+    pickup = month_start.to_datetime64() + rng.integers(0, month_seconds, n_rows).astype("timedelta64[s]")
+
+    # durations mostly within minutes to an hour, with outliers on both sides as in raw data
+    duration_s = rng.gamma(shape=2.0, scale=420.0 * (1 + drift), size=n_rows)
+    outliers = rng.random(n_rows)
+    duration_s[outliers < 0.01] = rng.uniform(-60, 60, (outliers < 0.01).sum())
+    duration_s[outliers > 0.995] = rng.uniform(3600, 86400, (outliers > 0.995).sum())
+    dropoff = pickup + duration_s.astype(np.int64).astype("timedelta64[s]")
+
+    zone_weights = get_zone_weights(drift)
+    trip_distance = np.round(
+        np.abs(duration_s) / 60 * rng.uniform(0.1, 0.5, n_rows) * (1 + drift / 2), 2
+    )
+    fare_amount = np.round(3.0 + 2.5 * trip_distance + 0.5 * np.abs(duration_s) / 60, 2)
+    extra = rng.choice([0.0, 0.5, 1.0, 2.5], n_rows)
+    mta_tax = np.full(n_rows, 0.5)
+    tip_amount = np.round(fare_amount * rng.choice([0.0, 0.15, 0.2, 0.25], n_rows), 2)
+    tolls_amount = np.where(rng.random(n_rows) < 0.05, 6.55, 0.0)
+    improvement_surcharge = np.full(n_rows, 0.3)
+    congestion_surcharge = rng.choice([0.0, 2.5, 2.75], n_rows)
+    total_amount = np.round(
+        fare_amount + extra + mta_tax + tip_amount + tolls_amount + improvement_surcharge + congestion_surcharge,
+        2,
+    )
+
+    columns = {
+        "VendorID": rng.integers(1, 3, n_rows),
+        f"{prefix}_pickup_datetime": pickup,
+        f"{prefix}_dropoff_datetime": dropoff,
+        "store_and_fwd_flag": rng.choice(np.array(["N", "Y"], dtype=object), n_rows, p=[0.99, 0.01]),
+        "RatecodeID": rng.choice([1.0, 2.0, 5.0], n_rows, p=[0.95, 0.03, 0.02]),
+        "PULocationID": rng.choice(np.arange(1, N_ZONES + 1), n_rows, p=zone_weights),
+        "DOLocationID": rng.choice(np.arange(1, N_ZONES + 1), n_rows, p=zone_weights),
+        "passenger_count": rng.choice(
+            np.arange(0.0, 7.0), n_rows, p=[0.02, 0.7, 0.14, 0.05, 0.03, 0.04, 0.02]
+        ),
+        "trip_distance": trip_distance,
+        "fare_amount": fare_amount,
+        "extra": extra,
+        "mta_tax": mta_tax,
+        "tip_amount": tip_amount,
+        "tolls_amount": tolls_amount,
+        "ehail_fee": np.full(n_rows, np.nan),
+        "improvement_surcharge": improvement_surcharge,
+        "total_amount": total_amount,
+        "payment_type": rng.choice([1, 2, 3, 4], n_rows, p=[0.6, 0.37, 0.02, 0.01]),
+        "trip_type": rng.choice([1.0, 2.0], n_rows, p=[0.97, 0.03]),
+        "congestion_surcharge": congestion_surcharge,
+        "airport_fee": np.where(rng.random(n_rows) < 0.08, 1.25, 0.0),
+    }
+
+    missing = rng.random(n_rows) < missing_rate
+    arrays = []
+    for field in schema:
+        values = columns[field.name]
+        mask = missing if field.name in NULLABLE_COLUMNS[vehicle_type] else None
+        if field.name == "ehail_fee":
+            mask = np.ones(n_rows, dtype=bool)
+        arrays.append(pa.array(values, type=field.type, mask=mask))
+
+    return pa.Table.from_arrays(arrays, schema=schema)
+
+
+def generate(
+    vehicle_type: str,
+    year_month: str,
+    rows: int,
+    output_dir: str,
+    seed: int = 42,
+    row_group_size: int = 1_000_000,
+    chunk_size: int = None,
+    drift: float = 0.0,
+    missing_rate: float = 0.0,
+) -> str:
+    if chunk_size is None:
+        chunk_size = row_group_size
+
+    os.makedirs(output_dir, exist_ok=True)
+    file_path = os.path.join(output_dir, f"{vehicle_type}_tripdata_{year_month}.parquet")
+
+    with pq.ParquetWriter(file_path, get_schema(vehicle_type)) as writer:
+        for chunk_index, start in enumerate(range(0, rows, chunk_size)):
+            rng = np.random.default_rng([seed, chunk_index])
+            n_rows = min(chunk_size, rows - start)
+            table = generate_chunk(vehicle_type, year_month, n_rows, rng, drift, missing_rate)
+            writer.write_table(table, row_group_size=row_group_size)
+
+    return file_path
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--vehicle-type", default="green", choices=list(DATETIME_PREFIXES))
+    parser.add_argument("--year-month", default="2022-01")
+    parser.add_argument("--rows", default=1_000_000, type=int)
+    parser.add_argument("--output-dir", default="data/synthetic")
+    parser.add_argument("--seed", default=42, type=int)
+    parser.add_argument("--row-group-size", default=1_000_000, type=int)
+    parser.add_argument("--chunk-size", default=None, type=int, help="rows generated at once")
+    parser.add_argument("--drift", default=0.0, type=float, help="shift of durations, distances and zones")
+    parser.add_argument("--missing-rate", default=0.0, type=float, help="share of records with nulls")
+    kwargs = vars(parser.parse_args())
+    file_path = generate(**kwargs)
+    print(f"Generated: {file_path}")
@@ -4,51 +4,180 @@ Using defaults:
 
 Using custom source once Parquet files and taxxi zone lookup have been downloaded:
     python3 module.py --vehicle-type="yellow" --train="2022-01" --eval="2022-02" --source="custom/local/dir"
+
+Streaming training over a range of months with bounded memory:
+    python3 module.py --vehicle-type="yellow" --train="2021-01:2022-12" --eval="2023-01" --streaming
 """
 
 import argparse
-from typing import List
+from typing import Dict, Iterator, List, Tuple
 
+import numpy as np
 import pandas as pd
-from sklearn.feature_extraction import DictVectorizer
+import pyarrow.compute as pc
+import pyarrow.dataset as ds
+import scipy.sparse as sp
 from sklearn.linear_model import LinearRegression
 from sklearn.metrics import mean_squared_error
 
-
-BASE_URL = "https://d37ci6vzurychx.cloudfront.net"
+from tripdata import get_default_cache, get_month_location, load_months, resolve_location
 
 
-def build_vectorizer(location_ids: List[str], source: str = None):
+BASE_URL = "https://d37ci6vzurychx.cloudfront.net"
+DEFAULT_CHUNK_SIZE = 500_000
+
+
+class LocationEncoder:
+    """One-hot encoder building CSR matrices straight from integer ID columns
+
+    Feature layout matches DictVectorizer fitted over string-casted IDs, i.e.
+    features are named "<column>=<id>" (numerical features keep column name)
+    and sorted lexicographically. IDs out of vocabulary are ignored the same
+    way DictVectorizer.transform ignores unseen features.
+    """
+
+    def __init__(self, vocabulary: Dict[str, np.ndarray], numerical: List[str] = None):
+        numerical = [] if numerical is None else list(numerical)
+        names = list(numerical)
+        for col, ids in vocabulary.items():
+            names += [f"{col}={i}" for i in ids]
+
+        self.feature_names_ = sorted(names)
+        position = {name: j for (j, name) in enumerate(self.feature_names_)}
+
+        self.numerical = numerical
+        self.numerical_index_ = np.array([position[col] for col in numerical], dtype=np.int64)
+        self.lookup_ = dict()
+        for col, ids in vocabulary.items():
+            ids = np.asarray(ids, dtype=np.int64)
+            table = np.full(ids.max(initial=-1) + 1, -1, dtype=np.int64)
+            table[ids] = [position[f"{col}={i}"] for i in ids]
+            self.lookup_[col] = table
+
+    @classmethod
+    def fit(cls, df: pd.DataFrame, categorical: List[str], numerical: List[str] = None):
+        vocabulary = {
+            col: np.unique(df[col].dropna().to_numpy(dtype=np.int64)) for col in categorical
+        }
+        return cls(vocabulary, numerical)
+
+    def get_feature_names_out(self):
+        return np.array(self.feature_names_, dtype=object)
+
+    def transform(self, df: pd.DataFrame):
+        n_rows = len(df)
+        rows, cols, values = [], [], []
+
+        for col, table in self.lookup_.items():
+            ids = df[col].fillna(-1).to_numpy(dtype=np.int64)
+            known = (ids >= 0) & (ids < len(table))
+            idx = np.full(n_rows, -1, dtype=np.int64)
+            idx[known] = table[ids[known]]
+            (row,) = np.nonzero(idx >= 0)
+            rows.append(row)
+            cols.append(idx[row])
+            values.append(np.ones(len(row)))
+
+        for col, j in zip(self.numerical, self.numerical_index_):
+            rows.append(np.arange(n_rows))
+            cols.append(np.full(n_rows, j))
+            values.append(df[col].to_numpy(dtype=np.float64))
+
+        X = sp.csr_matrix(
+            (np.concatenate(values), (np.concatenate(rows), np.concatenate(cols))),
+            shape=(n_rows, len(self.feature_names_)),
+            dtype=np.float64,
+        )
+
+        return X
+
+
+def build_encoder(location_ids: List[str], source: str = None, numerical: List[str] = None):
     if source is None:
         source = f"{BASE_URL}/misc"
     elif source[-1] in ["/", "\\"]:
         source = source[:-1]
 
-    df = pd.read_csv(f"{source}/taxi+_zone_lookup.csv")
-    for col in location_ids:
-        df[col] = df["LocationID"]
-
-    records = df[location_ids].astype(str).to_dict(orient="records")
-    dv = DictVectorizer().fit(records)
+    df = pd.read_csv(resolve_location(f"{source}/taxi+_zone_lookup.csv"), usecols=["LocationID"])
+    ids = np.unique(df["LocationID"].to_numpy(dtype=np.int64))
+    encoder = LocationEncoder({col: ids for col in location_ids}, numerical)
 
-    return dv
+    return encoder
 
 
-def dict_vectorize_Xy(
-    df: pd.DataFrame, features: List[str], target: str, dv: DictVectorizer = None
+def vectorize_Xy(
+    df: pd.DataFrame,
+    categorical: List[str],
+    numerical: List[str],
+    target: str,
+    encoder: LocationEncoder = None,
 ):
-    records = df[features].to_dict(orient="records")
-    if dv is None:
-        dv = DictVectorizer()
-        X = dv.fit_transform(records)
-    else:
-        X = dv.transform(records)
+    if encoder is None:
+        encoder = LocationEncoder.fit(df, categorical, numerical)
+    X = encoder.transform(df)
 
     y = df[target].values
 
     print(f"Dimensionality of X is: {X.get_shape()[1]}")
 
-    return (X, y, dv)
+    return (X, y, encoder)
+
+
+class StreamingLinearRegression:
+    """Least squares fitted from sufficient statistics accumulated chunk by chunk
+
+    Accumulates X'X, X'y, column sums and moments of y, so memory depends on the
+    number of features only. Solving mirrors LinearRegression with intercept:
+    minimum-norm solution of the centered problem, hence rank-deficient one-hot
+    groups and columns never seen in training get same coefficients.
+    """
+
+    def __init__(self, rcond: float = 1e-10):
+        self.rcond = rcond
+        self.n_samples_ = 0
+        self.xtx_ = None
+        self.xty_ = None
+        self.x_sum_ = None
+        self.y_sum_ = 0.0
+        self.yty_ = 0.0
+
+    def partial_fit(self, X, y):
+        X = sp.csr_matrix(X)
+        y = np.asarray(y, dtype=np.float64)
+        if self.xtx_ is None:
+            n_features = X.shape[1]
+            self.xtx_ = np.zeros((n_features, n_features))
+            self.xty_ = np.zeros(n_features)
+            self.x_sum_ = np.zeros(n_features)
+
+        self.xtx_ += (X.T @ X).toarray()
+        self.xty_ += X.T @ y
+        self.x_sum_ += np.asarray(X.sum(axis=0)).ravel()
+        self.y_sum_ += y.sum()
+        self.yty_ += y @ y
+        self.n_samples_ += len(y)
+
+        return self
+
+    def solve(self):
+        n = self.n_samples_
+        x_mean = self.x_sum_ / n
+        y_mean = self.y_sum_ / n
+
+        gram = self.xtx_ - n * np.outer(x_mean, x_mean)
+        xty = self.xty_ - n * x_mean * y_mean
+        self.coef_ = np.linalg.lstsq(gram, xty, rcond=self.rcond)[0]
+        self.intercept_ = y_mean - x_mean @ self.coef_
+
+        # training error straight from statistics, no second pass over data
+        yty = self.yty_ - n * y_mean**2
+        sse = yty - 2 * self.coef_ @ xty + self.coef_ @ gram @ self.coef_
+        self.rmse_ = np.sqrt(max(sse, 0.0) / n)
+
+        return self
+
+    def predict(self, X):
+        return X @ self.coef_ + self.intercept_
 
 
 def predict_eval(model, X, y_actual):
@@ -57,42 +186,77 @@ def predict_eval(model, X, y_actual):
     print(f"RMSE: {rmse:0.4f}")
 
 
-def read_dataframe(
-    vehicle_type: str,
-    year_month: str,
-    source: str = None,
-):
-    if source is None:
-        source = f"{BASE_URL}/trip-data"
-    elif source[-1] in ["/", "\\"]:
-        source = source[:-1]
+def predict_eval_chunks(model, encoder: LocationEncoder, chunks: Iterator[pd.DataFrame], target: str):
+    sse, n_samples = 0.0, 0
+    for df in chunks:
+        y_pred = model.predict(encoder.transform(df))
+        sse += ((df[target].values - y_pred) ** 2).sum()
+        n_samples += len(df)
 
-    file_location = f"{source}/{vehicle_type}_tripdata_{year_month}.parquet"
-    df = pd.read_parquet(file_location)
+    rmse = np.sqrt(sse / n_samples)
+    print(f"RMSE: {rmse:0.4f}")
 
-    print(f"Number of raw columns is: {len(df.columns)}")
 
-    return df
+def parse_year_months(year_months: str) -> List[str]:
+    """Expand either "YYYY-MM" or inclusive range "YYYY-MM:YYYY-MM" into year-month list"""
+    start, _, end = year_months.partition(":")
+    periods = pd.period_range(start, end or start, freq="M")
 
+    return [p.strftime("%Y-%m") for p in periods]
 
-def transform_dataframe(df: pd.DataFrame, categorical: List[str], vehicle_type: str):
-    df[categorical] = df[categorical].astype(str)
 
+def get_datetime_columns(vehicle_type: str) -> Tuple[str, str]:
     if vehicle_type == "green":
-        duration = df["lpep_dropoff_datetime"] - df["lpep_pickup_datetime"]
+        return ("lpep_pickup_datetime", "lpep_dropoff_datetime")
     elif vehicle_type == "yellow":
-        duration = df["tpep_dropoff_datetime"] - df["tpep_pickup_datetime"]
+        return ("tpep_pickup_datetime", "tpep_dropoff_datetime")
     else:
         raise ValueError(f"Unsupported vehicle_type: {vehicle_type}")
 
+
+def build_duration_filter(vehicle_type: str, min_duration: float = 1, max_duration: float = 60):
+    """Arrow expression keeping trips whose duration in minutes is within inclusive bounds"""
+    (pickup, dropoff) = get_datetime_columns(vehicle_type)
+    duration_ms = pc.milliseconds_between(pc.field(pickup), pc.field(dropoff))
+
+    return (duration_ms >= min_duration * 60_000) & (duration_ms <= max_duration * 60_000)
+
+
+def iter_dataframe_chunks(
+    vehicle_type: str,
+    year_months: List[str],
+    source: str = None,
+    chunk_size: int = DEFAULT_CHUNK_SIZE,
+    columns: List[str] = None,
+    filters: pc.Expression = None,
+):
+    """Yield transformed chunks reading Parquet row groups one at a time
+
+    Remote files are read from local cache, decoded rows are bounded by chunk size.
+    """
+    for year_month in year_months:
+        file_location = get_month_location(vehicle_type, year_month, source)
+        dataset = ds.dataset(resolve_location(file_location), format="parquet")
+
+        batches = dataset.to_batches(columns=columns, filter=filters, batch_size=chunk_size)
+        for batch in batches:
+            yield transform_dataframe(batch.to_pandas(), vehicle_type, verbose=False)
+
+
+def transform_dataframe(df: pd.DataFrame, vehicle_type: str, verbose: bool = True):
+    (pickup, dropoff) = get_datetime_columns(vehicle_type)
+    duration = df[dropoff] - df[pickup]
+
     df["duration"] = duration.dt.total_seconds() / 60
-    std_value = df["duration"].std()
-    print(f"Duration standard deviation: {std_value:.2f} min")
+    if verbose:
+        std_value = df["duration"].std()
+        print(f"Duration standard deviation: {std_value:.2f} min")
 
     idx = (df["duration"] >= 1) & (df["duration"] <= 60)
     df = df[idx]
-    ratio = idx.sum() / len(idx)
-    print(f"Fraction of records left after dropping outliers is: {ratio * 100 :.2f}%")
+    if verbose:
+        ratio = idx.sum() / len(idx)
+        print(f"Fraction of records left after dropping outliers is: {ratio * 100 :.2f}%")
 
     return df
 
@@ -102,33 +266,78 @@ def main(
     train_year_month: str,
     eval_year_month: str,
     source: str = None,
+    streaming: bool = False,
+    chunk_size: int = DEFAULT_CHUNK_SIZE,
+    pushdown: bool = True,
 ):
     location_ids = ["DOLocationID", "PULocationID"]
     categorical = location_ids
     numerical = []
     # categorical = ["VendorID", *location_ids]
     # numerical = ["trip_distance"]
-    features = categorical + numerical
     target = "duration"
 
-    # dv = build_vectorizer(location_ids, source)  # using all location IDs from web source
-    dv = None  # using location IDs from training (MUST cover all IDs from evaluation, otherwise, mismatching number of features)
+    encoder = build_encoder(location_ids, source, numerical)  # using all location IDs from zone lookup
+    # encoder = None  # using location IDs from training (IDs unseen in training are ignored on evaluation)
+
+    # pushing down projection and duration filter skips unused columns and outliers on read,
+    # disable it for reporting statistics over raw records
+    if pushdown:
+        read_kwargs = dict(
+            columns=[*get_datetime_columns(vehicle_type), *categorical, *numerical],
+            filters=build_duration_filter(vehicle_type),
+        )
+    else:
+        read_kwargs = dict()
+
+    train_year_months = parse_year_months(train_year_month)
+    eval_year_months = parse_year_months(eval_year_month)
+
+    if streaming:
+        if encoder is None:
+            raise ValueError("Streaming requires a fixed encoder vocabulary")
+
+        print(f"\nTraining (streaming): {train_year_month}")
+        chunks = iter_dataframe_chunks(
+            vehicle_type, train_year_months, source, chunk_size, **read_kwargs
+        )
+        lr_model = StreamingLinearRegression()
+        for df_chunk in chunks:
+            lr_model.partial_fit(encoder.transform(df_chunk), df_chunk[target].values)
+        lr_model.solve()
+        print(f"Number of training records is: {lr_model.n_samples_}")
+        print(f"RMSE: {lr_model.rmse_:0.4f}")
+
+        print(f"\nEvaluation (streaming): {eval_year_month}")
+        chunks = iter_dataframe_chunks(
+            vehicle_type, eval_year_months, source, chunk_size, **read_kwargs
+        )
+        predict_eval_chunks(lr_model, encoder, chunks, target)
+        print(f"\nTrip data cache: {get_default_cache().stats()}")
+        return
+
+    # train and evaluation months are downloaded and decoded concurrently
+    pairs = [(vehicle_type, ym) for ym in train_year_months + eval_year_months]
+    dfs = list(load_months(pairs, source, **read_kwargs))
+    print(f"Number of columns read is: {len(dfs[0].columns)}")
 
     print(f"\nTraining: {train_year_month}")
-    df_train = read_dataframe(vehicle_type, train_year_month, source)
-    df_train = transform_dataframe(df_train, categorical, vehicle_type)
-    (X_train, y_train, dv) = dict_vectorize_Xy(df_train, features, target, dv)
+    df_train = pd.concat(dfs[: len(train_year_months)], ignore_index=True)
+    df_train = transform_dataframe(df_train, vehicle_type)
+    (X_train, y_train, encoder) = vectorize_Xy(df_train, categorical, numerical, target, encoder)
 
     lr_model = LinearRegression()
     lr_model.fit(X_train, y_train)
     predict_eval(lr_model, X_train, y_train)
 
     print(f"\nEvaluation: {eval_year_month}")
-    df_eval = read_dataframe(vehicle_type, eval_year_month, source)
-    df_eval = transform_dataframe(df_eval, categorical, vehicle_type)
-    (X_eval, y_eval, dv) = dict_vectorize_Xy(df_eval, features, target, dv)
+    df_eval = pd.concat(dfs[len(train_year_months) :], ignore_index=True)
+    df_eval = transform_dataframe(df_eval, vehicle_type)
+    (X_eval, y_eval, encoder) = vectorize_Xy(df_eval, categorical, numerical, target, encoder)
     predict_eval(lr_model, X_eval, y_eval)
 
+    print(f"\nTrip data cache: {get_default_cache().stats()}")
+
 
 if __name__ == "__main__":
     parser = argparse.ArgumentParser()
@@ -136,5 +345,8 @@ if __name__ == "__main__":
     parser.add_argument("--train-year-month", "--train", default="2022-01")
     parser.add_argument("--eval-year-month", "--eval", default="2022-02")
     parser.add_argument("--source", default=None)
+    parser.add_argument("--streaming", action="store_true")
+    parser.add_argument("--chunk-size", default=DEFAULT_CHUNK_SIZE, type=int)
+    parser.add_argument("--no-pushdown", dest="pushdown", action="store_false")
     kwargs = vars(parser.parse_args())
     main(**kwargs)
@@ -0,0 +1,46 @@
+import numpy as np
+import pandas as pd
+
+from module import LocationEncoder, StreamingLinearRegression
+
+
+def make_trips(n_rows=5000, n_locations=40, seed=0):
+    rng = np.random.default_rng(seed)
+    df = pd.DataFrame(
+        {
+            "PULocationID": rng.integers(1, n_locations, n_rows),
+            "DOLocationID": rng.integers(1, n_locations, n_rows),
+        }
+    )
+    df["duration"] = 5 + 0.3 * df["PULocationID"] + 0.1 * df["DOLocationID"] + rng.normal(0, 2, n_rows)
+
+    return df
+
+
+def test_partial_fit_chunks_match_single_lstsq_fit():
+    df = make_trips()
+    categorical = ["PULocationID", "DOLocationID"]
+    encoder = LocationEncoder.fit(df, categorical)
+    X = encoder.transform(df)
+    y = df["duration"].to_numpy()
+
+    model = StreamingLinearRegression()
+    for start in range(0, len(df), 700):
+        chunk = df.iloc[start : start + 700]
+        model.partial_fit(encoder.transform(chunk), chunk["duration"].to_numpy())
+    model.solve()
+
+    # one-hot groups make design rank-deficient: coefficients are not unique,
+    # fitted values and SSE are
+    design = np.hstack([X.toarray(), np.ones((len(df), 1))])
+    coef = np.linalg.lstsq(design, y, rcond=None)[0]
+    expected_pred = design @ coef
+    expected_sse = np.sum((y - expected_pred) ** 2)
+
+    y_pred = model.predict(X)
+    sse = np.sum((y - y_pred) ** 2)
+
+    assert model.n_samples_ == len(df)
+    np.testing.assert_allclose(sse, expected_sse, rtol=1e-8)
+    np.testing.assert_allclose(model.rmse_, np.sqrt(expected_sse / len(df)), rtol=1e-6)
+    np.testing.assert_allclose(y_pred, expected_pred, atol=1e-8)
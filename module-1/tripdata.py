@@ -0,0 +1,306 @@
+"""Local content-addressed cache for NYC TLC trip data files
+
+Remote files are stored by SHA-256 checksum of their content under
+"<cache_dir>/objects/" and indexed by URL in "<cache_dir>/index.json" along with
+ETag/Last-Modified headers used for conditional revalidation. Least recently used
+files are evicted once total size exceeds disk budget, and files no URL points to
+any more are removed. Local paths are never cached.
+
+Index updates and object moves are serialized by an exclusive lock on
+"<cache_dir>/index.lock" (fcntl, where available), as several processes (e.g.
+load_months workers and Prefect flows) may share one cache directory.
+
+Configuration through environment variables:
+    TRIP_DATA_CACHE_DIR: cache directory, defaults to "~/.cache/dtc-mlops/trip-data"
+    TRIP_DATA_CACHE_MAX_BYTES: disk budget in bytes, defaults to 10 GiB
+    TRIP_DATA_CACHE_OFFLINE: "1" serves cached files without revalidation
+
+Note: identical copies of this file live in every module so each one keeps
+running (and building its Docker image) on its own, tests/test_tripdata.py fails
+when they differ.
+
+Multiple months are loaded by load_months overlapping downloads (thread pool)
+with Parquet decoding (process pool), yielding DataFrames in requested order.
+
+Examples:
+    cache = TripDataCache()
+    file_path = cache.fetch(f"{BASE_URL}/trip-data/green_tripdata_2023-01.parquet")
+    print(cache.stats())
+
+    pairs = [("green", "2023-01"), ("green", "2023-02")]
+    for df in load_months(pairs, columns=["PULocationID", "DOLocationID"]):
+        print(df.shape)
+
+    # any local HTTP server works as stand-in for CloudFront
+    python3 -m http.server --directory data/ 8000
+    file_path = resolve_location("http://localhost:8000/green_tripdata_2023-01.parquet")
+"""
+
+import contextlib
+import hashlib
+import json
+import os
+import tempfile
+import threading
+import time
+import urllib.error
+import urllib.request
+from concurrent.futures import Executor, ProcessPoolExecutor, ThreadPoolExecutor, as_completed
+from typing import Callable, Iterator, List, Tuple
+
+try:
+    import fcntl
+except ImportError:  # Windows, index is only guarded within process
+    fcntl = None
+
+
+BASE_URL = "https://d37ci6vzurychx.cloudfront.net"
+DEFAULT_CACHE_DIR = os.path.join(
+    os.environ.get("XDG_CACHE_HOME", os.path.expanduser("~/.cache")), "dtc-mlops", "trip-data"
+)
+DEFAULT_MAX_BYTES = 10 * 1024**3
+DEFAULT_MAX_DOWNLOADS = 4
+CHUNK_BYTES = 1024**2
+
+
+def is_remote(location: str) -> bool:
+    return isinstance(location, str) and location.startswith(("http://", "https://"))
+
+
+class TripDataCache:
+    def __init__(self, cache_dir: str = None, max_bytes: int = None, offline: bool = None):
+        if cache_dir is None:
+            cache_dir = os.environ.get("TRIP_DATA_CACHE_DIR", DEFAULT_CACHE_DIR)
+        if max_bytes is None:
+            max_bytes = int(os.environ.get("TRIP_DATA_CACHE_MAX_BYTES", DEFAULT_MAX_BYTES))
+        if offline is None:
+            offline = os.environ.get("TRIP_DATA_CACHE_OFFLINE", "0") == "1"
+
+        self.cache_dir = cache_dir
+        self.max_bytes = max_bytes
+        self.offline = offline
+        self.objects_dir = os.path.join(cache_dir, "objects")
+        self.index_path = os.path.join(cache_dir, "index.json")
+        self.lock_path = os.path.join(cache_dir, "index.lock")
+
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+
+        os.makedirs(self.objects_dir, exist_ok=True)
+
+    def fetch(self, url: str) -> str:
+        """Return local path of cached copy of url, downloading or revalidating as required"""
+        with self._locked():
+            entry = self._read_index().get(url)
+        if entry is not None and not os.path.exists(self._object_path(entry["sha256"])):
+            entry = None
+
+        headers = dict()
+        if entry is not None:
+            if self.offline:
+                return self._record(url, entry, hit=True)
+            if entry.get("etag"):
+                headers["If-None-Match"] = entry["etag"]
+            if entry.get("last_modified"):
+                headers["If-Modified-Since"] = entry["last_modified"]
+
+        request = urllib.request.Request(url, headers=headers)
+        try:
+            with urllib.request.urlopen(request) as response:
+                (downloaded, tmp_path) = self._download(response)
+        except urllib.error.HTTPError as e:
+            # not modified, or origin failing while stale copy is available
+            if entry is not None and (e.code == 304 or e.code >= 500):
+                return self._record(url, entry, hit=True)
+            raise
+        except urllib.error.URLError:
+            # unreachable origin, stale copy is better than failing
+            if entry is not None:
+                return self._record(url, entry, hit=True)
+            raise
+
+        return self._record(url, downloaded, hit=False, tmp_path=tmp_path)
+
+    def stats(self):
+        with self._locked():
+            index = self._read_index()
+        size = sum(entry["size"] for entry in self._unique_objects(index).values())
+
+        return dict(hits=self.hits, misses=self.misses, files=len(index), bytes=size)
+
+    def _download(self, response):
+        sha256 = hashlib.sha256()
+        size = 0
+        fd, tmp_path = tempfile.mkstemp(dir=self.objects_dir, suffix=".part")
+        try:
+            with os.fdopen(fd, "wb") as file:
+                while True:
+                    chunk = response.read(CHUNK_BYTES)
+                    if not chunk:
+                        break
+                    sha256.update(chunk)
+                    file.write(chunk)
+                    size += len(chunk)
+        except BaseException:
+            os.remove(tmp_path)
+            raise
+
+        entry = dict(
+            sha256=sha256.hexdigest(),
+            size=size,
+            etag=response.headers.get("ETag"),
+            last_modified=response.headers.get("Last-Modified"),
+        )
+
+        return (entry, tmp_path)
+
+    def _record(self, url, entry, hit: bool, tmp_path: str = None) -> str:
+        """Index entry of url, moving downloaded file into place and removing replaced object"""
+        with self._locked():
+            if hit:
+                self.hits += 1
+            else:
+                self.misses += 1
+            if tmp_path is not None:
+                os.replace(tmp_path, self._object_path(entry["sha256"]))
+
+            index = self._read_index()
+            previous = index.get(url)
+            index[url] = dict(entry, last_access=time.time())
+            if previous is not None and previous["sha256"] != entry["sha256"]:
+                # content behind url changed, old object is orphaned unless other urls share it
+                if all(e["sha256"] != previous["sha256"] for e in index.values()):
+                    self._remove_object(previous["sha256"])
+            self._evict(index, keep=entry["sha256"])
+            self._write_index(index)
+
+        return self._object_path(entry["sha256"])
+
+    @contextlib.contextmanager
+    def _locked(self):
+        """Exclusive access to index and objects across threads and processes"""
+        with self._lock, open(self.lock_path, "a") as lock_file:
+            if fcntl is not None:
+                fcntl.flock(lock_file, fcntl.LOCK_EX)
+            # lock is released when file is closed
+            yield
+
+    def _evict(self, index, keep: str):
+        objects = self._unique_objects(index)
+        total = sum(entry["size"] for entry in objects.values())
+        by_access = sorted(objects.items(), key=lambda item: item[1]["last_access"])
+        for checksum, entry in by_access:
+            if total <= self.max_bytes:
+                break
+            if checksum == keep:
+                continue
+
+            self._remove_object(checksum)
+            for url in [u for (u, e) in index.items() if e["sha256"] == checksum]:
+                del index[url]
+            total -= entry["size"]
+
+    def _object_path(self, checksum: str) -> str:
+        return os.path.join(self.objects_dir, checksum)
+
+    def _remove_object(self, checksum: str):
+        path = self._object_path(checksum)
+        if os.path.exists(path):
+            os.remove(path)
+
+    def _read_index(self):
+        if not os.path.exists(self.index_path):
+            return dict()
+        with open(self.index_path) as file:
+            return json.load(file)
+
+    def _write_index(self, index):
+        fd, tmp_path = tempfile.mkstemp(dir=self.cache_dir, suffix=".json")
+        with os.fdopen(fd, "w") as file:
+            json.dump(index, file, indent=1)
+        os.replace(tmp_path, self.index_path)
+
+    @staticmethod
+    def _unique_objects(index):
+        """Map checksum to most recently accessed entry, same content may be indexed by several URLs"""
+        objects = dict()
+        for entry in index.values():
+            checksum = entry["sha256"]
+            if checksum not in objects or objects[checksum]["last_access"] < entry["last_access"]:
+                objects[checksum] = entry
+
+        return objects
+
+
+__default_cache = None
+
+
+def get_default_cache() -> TripDataCache:
+    global __default_cache
+    if __default_cache is None:
+        __default_cache = TripDataCache()
+
+    return __default_cache
+
+
+def resolve_location(location: str) -> str:
+    """Route remote locations through default cache, local paths are returned as given"""
+    if is_remote(location):
+        return get_default_cache().fetch(location)
+
+    return location
+
+
+def get_month_location(vehicle_type: str, year_month: str, source: str = None) -> str:
+    if source is None:
+        source = f"{BASE_URL}/trip-data"
+    elif source[-1] in ["/", "\\"]:
+        source = source[:-1]
+
+    return f"{source}/{vehicle_type}_tripdata_{year_month}.parquet"
+
+
+def read_parquet(file_path: str, columns: List[str] = None, filters=None):
+    """Default decoder for load_months, pandas is imported here to keep cache stdlib-only"""
+    import pandas as pd
+
+    return pd.read_parquet(file_path, columns=columns, filters=filters)
+
+
+def load_months(
+    pairs: List[Tuple[str, str]],
+    source: str = None,
+    columns: List[str] = None,
+    filters=None,
+    read_fn: Callable = read_parquet,
+    max_downloads: int = DEFAULT_MAX_DOWNLOADS,
+    max_workers: int = None,
+    executor: Executor = None,
+) -> Iterator:
+    """Yield one DataFrame per (vehicle_type, year_month) pair in order as soon as it is ready
+
+    Downloads run on a bounded thread pool through default cache and each finished
+    download is decoded on a process pool right away, so network transfer of next
+    months overlaps with decoding of previous ones. read_fn must be picklable and is
+    called as read_fn(file_path, columns=columns, filters=filters).
+
+    Given executor decodes instead of a process pool of max_workers created for the
+    call, so several calls can share one pool; it is left running.
+    """
+    locations = [get_month_location(vt, ym, source) for (vt, ym) in pairs]
+    if max_workers is None:
+        max_workers = min(len(locations), os.cpu_count() or 1)
+
+    with ThreadPoolExecutor(max_workers=max_downloads) as downloader, contextlib.ExitStack() as stack:
+        decoder = executor or stack.enter_context(ProcessPoolExecutor(max_workers=max(max_workers, 1)))
+        downloads = {downloader.submit(resolve_location, loc): i for (i, loc) in enumerate(locations)}
+        completed = as_completed(downloads)
+        decodes = dict()
+        for i in range(len(locations)):
+            while i not in decodes:
+                future = next(completed)
+                decodes[downloads[future]] = decoder.submit(
+                    read_fn, future.result(), columns=columns, filters=filters
+                )
+            yield decodes.pop(i).result()
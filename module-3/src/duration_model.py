@@ -0,0 +1,87 @@
+"""Trip duration model packaged as single MLflow pyfunc
+
+Raw trip columns go in and predicted durations come out: PU_DO codes are computed
+vectorized, PairEncoder builds CSR batches and the booster predicts in-place on
+them, with no dict records nor intermediate DMatrix. Artifacts are the booster in
+XGBoost UBJSON format and the encoder as NumPy arrays, both loaded without pickle.
+
+Examples:
+    model = mlflow.pyfunc.load_model("runs:/<run_id>/models_mlflow")
+    y_pred = model.predict(df[["PULocationID", "DOLocationID", "trip_distance"]])
+"""
+
+import os
+import tempfile
+
+import mlflow.artifacts
+import mlflow.pyfunc
+import numpy as np
+import pandas as pd
+import xgboost as xgb
+
+from features import PairEncoder, encode_pu_do
+
+
+DEFAULT_BATCH_SIZE = 100_000
+INPUT_COLUMNS = ["PULocationID", "DOLocationID"]
+
+
+class DurationModel(mlflow.pyfunc.PythonModel):
+    def __init__(self, batch_size: int = DEFAULT_BATCH_SIZE):
+        self.batch_size = batch_size
+
+    def load_context(self, context):
+        self.encoder = PairEncoder.load(context.artifacts["encoder"])
+        self.booster = xgb.Booster()
+        self.booster.load_model(context.artifacts["booster"])
+
+    def predict(self, context, model_input: pd.DataFrame) -> np.ndarray:
+        missing = [col for col in INPUT_COLUMNS + self.encoder.numerical if col not in model_input.columns]
+        if missing:
+            raise ValueError(f"Missing input columns: {missing}")
+
+        codes = encode_pu_do(model_input["PULocationID"], model_input["DOLocationID"])
+        features = pd.DataFrame({"PU_DO": codes})
+        for col in self.encoder.numerical:
+            features[col] = model_input[col].to_numpy()
+
+        y_pred = np.empty(len(features), dtype=np.float32)
+        for start in range(0, len(features), self.batch_size):
+            end = start + self.batch_size
+            X = self.encoder.transform(features.iloc[start:end])
+            y_pred[start:end] = self.booster.inplace_predict(X)
+
+        return y_pred
+
+
+def log_duration_model(booster: xgb.Booster, encoder: PairEncoder, artifact_path: str = "models_mlflow"):
+    """Log booster and encoder as one pyfunc model of active run"""
+    src_dir = os.path.dirname(os.path.abspath(__file__))
+
+    with tempfile.TemporaryDirectory() as d:
+        artifacts = dict(
+            booster=os.path.join(d, "booster.ubj"),
+            encoder=os.path.join(d, "encoder.npz"),
+        )
+        booster.save_model(artifacts["booster"])
+        encoder.save(artifacts["encoder"])
+
+        mlflow.pyfunc.log_model(
+            artifact_path=artifact_path,
+            python_model=DurationModel(),
+            artifacts=artifacts,
+            code_path=[os.path.join(src_dir, "features.py"), os.path.join(src_dir, "duration_model.py")],
+        )
+
+
+def load_duration_model_artifacts(run_id: str, artifact_path: str = "models_mlflow"):
+    """Booster and encoder logged by log_duration_model, e.g. to continue training"""
+    with tempfile.TemporaryDirectory() as d:
+        artifacts_dir = mlflow.artifacts.download_artifacts(
+            run_id=run_id, artifact_path=f"{artifact_path}/artifacts", dst_path=d
+        )
+        booster = xgb.Booster()
+        booster.load_model(os.path.join(artifacts_dir, "booster.ubj"))
+        encoder = PairEncoder.load(os.path.join(artifacts_dir, "encoder.npz"))
+
+    return (booster, encoder)
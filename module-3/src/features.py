@@ -0,0 +1,128 @@
+"""Feature engineering for duration model
+
+PU_DO crossed feature is stored as int32 code PU * N_ZONES + DO instead of
+"PU_DO" strings, and PairEncoder one-hot encodes codes straight into a CSR
+matrix, with no per-row strings nor dict records.
+"""
+
+from typing import List
+
+import numpy as np
+import pandas as pd
+import scipy.sparse as sp
+
+
+# location IDs span 1..265 in taxi zone lookup, codes are reversible for IDs below N_ZONES
+N_ZONES = 266
+
+
+def encode_pu_do(pu: pd.Series, do: pd.Series) -> np.ndarray:
+    """Crossed PU_DO code, -1 for missing or out of range location IDs"""
+    pu = pu.fillna(-1).to_numpy(dtype=np.int64)
+    do = do.fillna(-1).to_numpy(dtype=np.int64)
+    valid = (pu >= 0) & (pu < N_ZONES) & (do >= 0) & (do < N_ZONES)
+
+    return np.where(valid, pu * N_ZONES + do, -1).astype(np.int32)
+
+
+def decode_pu_do(codes: np.ndarray) -> np.ndarray:
+    """Original "PU_DO" labels for reporting"""
+    codes = np.asarray(codes)
+    labels = pd.Series(codes // N_ZONES).astype(str) + "_" + pd.Series(codes % N_ZONES).astype(str)
+
+    return labels.to_numpy(dtype=object)
+
+
+class PairEncoder:
+    """One-hot encoder of PU_DO codes along with numerical columns
+
+    Numerical columns come first followed by one column per vocabulary code, so
+    vocabulary can be extended by appending codes without moving existing columns.
+    Codes out of vocabulary are left out of the matrix (missing for XGBoost), the
+    same way DictVectorizer ignores unseen features.
+
+    Matrix width is fixed by capacity, which may reserve empty columns after the
+    vocabulary: XGBoost boosters only continue training on matrices of same width,
+    so extended vocabularies fill reserved columns.
+    """
+
+    def __init__(self, vocabulary: np.ndarray, numerical: List[str], capacity: int = None):
+        self.vocabulary_ = np.asarray(vocabulary, dtype=np.int32)
+        self.numerical = list(numerical)
+        self.capacity = max(capacity or 0, len(self.vocabulary_))
+
+        self.lookup_ = np.full(N_ZONES * N_ZONES, -1, dtype=np.int32)
+        self.lookup_[self.vocabulary_] = np.arange(len(self.vocabulary_)) + len(self.numerical)
+
+    @classmethod
+    def fit(cls, df: pd.DataFrame, numerical: List[str], headroom: float = 0.0):
+        """Vocabulary of codes in df, reserving headroom share of extra columns"""
+        codes = df["PU_DO"].to_numpy()
+        vocabulary = np.unique(codes[codes >= 0])
+
+        return cls(vocabulary, numerical, int(np.ceil(len(vocabulary) * (1 + headroom))))
+
+    def extend(self, df: pd.DataFrame):
+        """New encoder with unseen codes appended at the end of vocabulary
+
+        Only codes fitting in reserved columns are added, most frequent ones first.
+        """
+        (codes, counts) = np.unique(df["PU_DO"].to_numpy(), return_counts=True)
+        unseen = (codes >= 0) & (self.lookup_[codes.clip(min=0)] < 0)
+        by_frequency = np.argsort(-counts[unseen], kind="stable")
+        new_codes = codes[unseen][by_frequency][: self.capacity - len(self.vocabulary_)]
+
+        return PairEncoder(np.concatenate([self.vocabulary_, new_codes]), self.numerical, self.capacity)
+
+    def unknown_share(self, df: pd.DataFrame) -> float:
+        """Share of valid codes in df left out of the matrix"""
+        codes = df["PU_DO"].to_numpy()
+        codes = codes[codes >= 0]
+
+        return float((self.lookup_[codes] < 0).mean()) if len(codes) else 0.0
+
+    def save(self, file_path: str) -> None:
+        """Store as plain NumPy arrays, loading needs no pickle"""
+        np.savez(
+            file_path,
+            vocabulary=self.vocabulary_,
+            numerical=np.array(self.numerical, dtype=str),
+            capacity=np.array(self.capacity),
+        )
+
+    @classmethod
+    def load(cls, file_path: str):
+        with np.load(file_path, allow_pickle=False) as arrays:
+            return cls(arrays["vocabulary"], arrays["numerical"].tolist(), int(arrays["capacity"]))
+
+    @property
+    def n_features(self) -> int:
+        return len(self.numerical) + self.capacity
+
+    def get_feature_names_out(self) -> np.ndarray:
+        pairs = [f"PU_DO={label}" for label in decode_pu_do(self.vocabulary_)]
+        return np.array(self.numerical + pairs, dtype=object)
+
+    def transform(self, df: pd.DataFrame):
+        n_rows = len(df)
+        n_numerical = len(self.numerical)
+
+        codes = df["PU_DO"].to_numpy()
+        columns = np.where(codes >= 0, self.lookup_[codes.clip(min=0)], -1)
+        known = columns >= 0
+
+        # each row holds numerical values followed by at most one PU_DO entry
+        nnz_per_row = n_numerical + known.astype(np.int64)
+        indptr = np.zeros(n_rows + 1, dtype=np.int64)
+        np.cumsum(nnz_per_row, out=indptr[1:])
+
+        indices = np.empty(indptr[-1], dtype=np.int32)
+        data = np.empty(indptr[-1], dtype=np.float32)
+        starts = indptr[:-1]
+        for j, col in enumerate(self.numerical):
+            indices[starts + j] = j
+            data[starts + j] = df[col].to_numpy(dtype=np.float32)
+        indices[starts[known] + n_numerical] = columns[known]
+        data[starts[known] + n_numerical] = 1.0
+
+        return sp.csr_matrix((data, indices, indptr), shape=(n_rows, self.n_features))
@@ -0,0 +1,136 @@
+"""Local cache of transformed DataFrames persisted as Arrow IPC (Feather v2) files
+
+Entries are keyed by SHA-256 of JSON-serializable parts, typically source file
+identity along with transform code version, and read back memory-mapped so
+numeric columns are not copied into process memory. Least recently used files are
+evicted once total size exceeds disk budget, file mtime tracks last access.
+
+Configuration through environment variables:
+    FRAME_CACHE_DIR: cache directory, defaults to "~/.cache/dtc-mlops/frames"
+    FRAME_CACHE_MAX_BYTES: disk budget in bytes, defaults to 5 GiB
+
+Examples:
+    cache = FrameCache()
+    key = cache.key(get_file_identity(file_path), "v1")
+    df = cache.get(key)
+    if df is None:
+        df = cache.put(key, transform(pd.read_parquet(file_path)))
+"""
+
+import contextlib
+import hashlib
+import json
+import os
+import tempfile
+
+import pandas as pd
+import pyarrow as pa
+import pyarrow.feather as feather
+
+
+DEFAULT_CACHE_DIR = os.path.join(
+    os.environ.get("XDG_CACHE_HOME", os.path.expanduser("~/.cache")), "dtc-mlops", "frames"
+)
+DEFAULT_MAX_BYTES = 5 * 1024**3
+SUFFIX = ".arrow"
+
+
+def get_file_identity(location: str, file_path: str) -> dict:
+    """Location as requested along with size and mtime of local file it resolved to
+
+    Remote files resolve to content-addressed cache objects, so their path already
+    changes whenever ETag/Last-Modified revalidation brings in new content.
+    """
+    stat = os.stat(file_path)
+
+    return dict(location=location, path=os.path.abspath(file_path), size=stat.st_size, mtime_ns=stat.st_mtime_ns)
+
+
+class FrameCache:
+    def __init__(self, cache_dir: str = None, max_bytes: int = None):
+        if cache_dir is None:
+            cache_dir = os.environ.get("FRAME_CACHE_DIR", DEFAULT_CACHE_DIR)
+        if max_bytes is None:
+            max_bytes = int(os.environ.get("FRAME_CACHE_MAX_BYTES", DEFAULT_MAX_BYTES))
+
+        self.cache_dir = cache_dir
+        self.max_bytes = max_bytes
+        self.hits = 0
+        self.misses = 0
+
+        os.makedirs(cache_dir, exist_ok=True)
+
+    @staticmethod
+    def key(*parts) -> str:
+        payload = json.dumps(parts, sort_keys=True, default=str)
+        return hashlib.sha256(payload.encode()).hexdigest()
+
+    def __contains__(self, key: str) -> bool:
+        """Whether an entry is stored under key, without reading it nor counting a hit"""
+        return os.path.exists(self._entry_path(key))
+
+    def get(self, key: str):
+        """Memory-mapped DataFrame stored under key, None when missing"""
+        file_path = self._entry_path(key)
+        try:
+            with pa.memory_map(file_path) as source:
+                table = pa.ipc.open_file(source).read_all()
+        except FileNotFoundError:
+            self.misses += 1
+            return None
+
+        os.utime(file_path)
+        self.hits += 1
+
+        return table.to_pandas(split_blocks=True)
+
+    def put(self, key: str, df: pd.DataFrame) -> pd.DataFrame:
+        """Store df uncompressed, so it can be memory-mapped, and return it as given"""
+        table = pa.Table.from_pandas(df, preserve_index=False)
+
+        fd, tmp_path = tempfile.mkstemp(dir=self.cache_dir, suffix=".part")
+        os.close(fd)
+        try:
+            feather.write_feather(table, tmp_path, compression="uncompressed")
+            os.replace(tmp_path, self._entry_path(key))
+        except BaseException:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+            raise
+
+        self._evict(keep=key)
+
+        return df
+
+    def stats(self):
+        entries = self._entries()
+        size = sum(stat.st_size for (_, stat) in entries)
+
+        return dict(hits=self.hits, misses=self.misses, files=len(entries), bytes=size)
+
+    def _evict(self, keep: str):
+        entries = self._entries()
+        total = sum(stat.st_size for (_, stat) in entries)
+        for file_path, stat in sorted(entries, key=lambda entry: entry[1].st_mtime):
+            if total <= self.max_bytes:
+                break
+            if file_path == self._entry_path(keep):
+                continue
+
+            # entry may be evicted concurrently by another task
+            with contextlib.suppress(FileNotFoundError):
+                os.remove(file_path)
+            total -= stat.st_size
+
+    def _entries(self):
+        entries = []
+        for name in os.listdir(self.cache_dir):
+            if name.endswith(SUFFIX):
+                with contextlib.suppress(FileNotFoundError):
+                    file_path = os.path.join(self.cache_dir, name)
+                    entries.append((file_path, os.stat(file_path)))
+
+        return entries
+
+    def _entry_path(self, key: str) -> str:
+        return os.path.join(self.cache_dir, key + SUFFIX)
@@ -1,20 +1,59 @@
 import argparse
-import pathlib
-import pickle
+import contextlib
+import functools
+import hashlib
+import inspect
+import os
 import tempfile
+import time
+from concurrent.futures import Executor, ProcessPoolExecutor, ThreadPoolExecutor, as_completed
 from datetime import datetime as dt
+from typing import List, Tuple
 
 import mlflow
+from mlflow.entities import Metric, Param, RunTag
+from mlflow.tracking import MlflowClient
 from prefect import flow, task
 from prefect.artifacts import create_markdown_artifact
+from prefect.task_runners import ConcurrentTaskRunner, SequentialTaskRunner
 
+import numpy as np
 import pandas as pd
+import pyarrow.compute as pc
+import pyarrow.dataset as ds
 import xgboost as xgb
-from sklearn.feature_extraction import DictVectorizer
 from sklearn.metrics import mean_squared_error
 
-
-BASE_URL = "https://d37ci6vzurychx.cloudfront.net"
+import features
+from duration_model import load_duration_model_artifacts, log_duration_model
+from features import N_ZONES, PairEncoder, encode_pu_do
+from frame_cache import FrameCache, get_file_identity
+from tripdata import get_default_cache, get_month_location, load_months, resolve_location
+
+
+DEFAULT_BATCH_SIZE = 1_000_000
+BEST_PARAMS = {
+    "learning_rate": 0.09585355369315604,
+    "max_depth": 30,
+    "min_child_weight": 1.060597050922164,
+    "objective": "reg:linear",
+    "reg_alpha": 0.018060244040060163,
+    "reg_lambda": 0.011658731377413597,
+    "seed": 42,
+}
+# log-uniform bounds match hyperopt space best params were originally found with
+SEARCH_SPACE = dict(
+    max_depth=(4, 100),
+    learning_rate=(np.exp(-3), 1.0),
+    min_child_weight=(np.exp(-1), np.exp(3)),
+    reg_alpha=(np.exp(-5), np.exp(-1)),
+    reg_lambda=(np.exp(-6), np.exp(-1)),
+)
+MODEL_ARTIFACT_PATH = "models_mlflow"
+# reserved share of PU_DO columns for pairs showing up in incremental training
+VOCABULARY_HEADROOM = 0.1
+NUMERICAL = ["trip_distance"]
+TARGET = "duration"
 
 
 def __render_rmse_markdown_report(rmse):
@@ -33,109 +72,552 @@ def __render_rmse_markdown_report(rmse):
     return report
 
 
-@task(retries=3, retry_delay_seconds=30)
-def read_dataframe(
-    vehicle_type: str,
-    year_month: str,
-    source: str = None,
-):
-    if source is None:
-        source = f"{BASE_URL}/trip-data"
-    elif source[-1] in ["/", "\\"]:
-        source = source[:-1]
+@contextlib.contextmanager
+def log_duration(stage: str, timings: dict = None):
+    """Print wall time of stage, optionally recording it in timings"""
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        elapsed = time.perf_counter() - start
+        if timings is not None:
+            timings[stage] = elapsed
+        print(f"{stage}: {elapsed:.2f}s")
 
-    file_location = f"{source}/{vehicle_type}_tripdata_{year_month}.parquet"
-    df = pd.read_parquet(file_location)
 
-    return df
+def parse_year_months(year_months: str) -> List[str]:
+    """Expand either "YYYY-MM" or inclusive range "YYYY-MM:YYYY-MM" into year-month list"""
+    start, _, end = year_months.partition(":")
+    periods = pd.period_range(start, end or start, freq="M")
 
+    return [p.strftime("%Y-%m") for p in periods]
 
-@task
-def transform_dataframe(df: pd.DataFrame, vehicle_type: str):
-    categorical = ["PULocationID", "DOLocationID"]
-    df[categorical] = df[categorical].astype(str)
-    df["PU_DO"] = df["PULocationID"] + "_" + df["DOLocationID"]
 
+def get_datetime_columns(vehicle_type: str) -> Tuple[str, str]:
     if vehicle_type == "green":
-        # df.lpep_dropoff_datetime = pd.to_datetime(df.lpep_dropoff_datetime)
-        # df.lpep_pickup_datetime = pd.to_datetime(df.lpep_pickup_datetime)
-        duration = df["lpep_dropoff_datetime"] - df["lpep_pickup_datetime"]
+        return ("lpep_pickup_datetime", "lpep_dropoff_datetime")
     elif vehicle_type == "yellow":
-        duration = df["tpep_dropoff_datetime"] - df["tpep_pickup_datetime"]
+        return ("tpep_pickup_datetime", "tpep_dropoff_datetime")
     else:
         raise ValueError(f"Unsupported vehicle_type: {vehicle_type}")
 
+
+def build_duration_filter(vehicle_type: str, min_duration: float = 1, max_duration: float = 60):
+    """Arrow expression keeping trips whose duration in minutes is within inclusive bounds"""
+    (pickup, dropoff) = get_datetime_columns(vehicle_type)
+    duration_ms = pc.milliseconds_between(pc.field(pickup), pc.field(dropoff))
+
+    return (duration_ms >= min_duration * 60_000) & (duration_ms <= max_duration * 60_000)
+
+
+@task
+def transform_dataframe(df: pd.DataFrame, vehicle_type: str):
+    df["PU_DO"] = encode_pu_do(df["PULocationID"], df["DOLocationID"])
+
+    (pickup, dropoff) = get_datetime_columns(vehicle_type)
+    duration = df[dropoff] - df[pickup]
+
     df["duration"] = duration.dt.total_seconds() / 60
     df = df[(df["duration"] >= 1) & (df["duration"] <= 60)]
 
     return df
 
 
-@task(log_prints=True)
-def train_best_model(
-    df_train: pd.DataFrame,
-    df_val: pd.DataFrame,
-) -> None:
-    """train a model with best hyperparams and write everything out
-    
-    TODO
-    All transformation and vectorization should be part of a single preprocessor,
-    maybe any similar to sklearn pipelines?
+def get_transform_version() -> str:
+    """Hash of transformation code, cached frames are invalidated whenever it changes"""
+    sources = [inspect.getsource(transform_dataframe.fn), inspect.getsource(features)]
+    return hashlib.sha256("".join(sources).encode()).hexdigest()[:16]
+
+
+def read_and_transform(file_path: str, vehicle_type: str, columns: List[str] = None, filters=None):
+    """Read and transform_dataframe as plain function, picklable for process pools"""
+    df = pd.read_parquet(file_path, columns=columns, filters=filters)
+    return transform_dataframe.fn(df, vehicle_type)
+
+
+def transform_into_frame_cache(file_path: str, vehicle_type: str, columns: List[str] = None, filters=None):
+    """(key, cached) of transformed file in frame cache, read and transformed on miss only
+
+    Runs in load_months decoder workers, so frames go back memory-mapped from cache
+    files instead of pickled. Workers only see resolved paths, which remote files
+    get from content-addressed trip data cache.
+    """
+    frame_cache = FrameCache()
+    identity = get_file_identity(file_path, file_path)
+    key = frame_cache.key(identity, vehicle_type, columns, str(filters), get_transform_version())
+    if key in frame_cache:
+        return (key, True)
+
+    frame_cache.put(key, read_and_transform(file_path, vehicle_type, columns, filters))
+    return (key, False)
+
+
+def get_transform_executor(name: str):
+    """Executor decoding and transforming months of a flow, shut down on exit
+
+    Shared by load_months calls of all read_transformed_dataframe runs, either as a
+    process pool or as a thread pool keeping work in flow process.
+    """
+    if name == "process":
+        return ProcessPoolExecutor(max_workers=os.cpu_count() or 1)
+    elif name == "thread":
+        return ThreadPoolExecutor(max_workers=os.cpu_count() or 1)
+    else:
+        raise ValueError(f"Unsupported transform_executor: {name}")
+
+
+@task(retries=3, retry_delay_seconds=30, log_prints=True)
+def read_transformed_dataframe(
+    vehicle_type: str,
+    year_month: str,
+    source: str = None,
+    columns: List[str] = None,
+    filters: pc.Expression = None,
+    use_frame_cache: bool = True,
+    executor: Executor = None,
+) -> pd.DataFrame:
+    """Read and transform one month through load_months, reusing frame cached for unchanged inputs
+
+    Cache keys combine source file identity, projection, filters and transform code
+    version. Downloads run on load_months threads, decoding and transforming on
+    executor shared by months of the flow, or on a process pool of its own.
+    """
+    with log_duration(f"Read and transform {year_month}"):
+        read_fn = transform_into_frame_cache if use_frame_cache else read_and_transform
+        (result,) = load_months(
+            [(vehicle_type, year_month)],
+            source,
+            columns=columns,
+            filters=filters,
+            read_fn=functools.partial(read_fn, vehicle_type=vehicle_type),
+            executor=executor,
+        )
+        if not use_frame_cache:
+            return result
+
+        (key, cached) = result
+        if cached:
+            print(f"Frame cache hit: {year_month}")
+        df = FrameCache().get(key)
+        if df is None:
+            # evicted by months stored meanwhile, cache budget is below one flow input
+            file_path = resolve_location(get_month_location(vehicle_type, year_month, source))
+            df = read_and_transform(file_path, vehicle_type, columns, filters)
+
+    return df
+
+
+class ParquetBatchIter(xgb.DataIter):
+    """Feed XGBoost with encoded Parquet batches, decoding one batch at a time
+
+    Batches go through transform_dataframe and PairEncoder, so rows match the
+    in-memory path. XGBoost may call reset() and iterate several times.
     """
 
-    categorical = ["PU_DO"]
-    numerical = ["trip_distance"]
-    features = categorical + numerical
-    target = "duration"
-
-    dv = DictVectorizer()
-    X_train = dv.fit_transform(df_train[features].to_dict(orient="records"))
-    X_val = dv.transform(df_val[features].to_dict(orient="records"))
-    y_train = df_train[target].values
-    y_val = df_val[target].values
-
-    with mlflow.start_run():
-        train = xgb.DMatrix(X_train, label=y_train)
-        valid = xgb.DMatrix(X_val, label=y_val)
-
-        best_params = {
-            "learning_rate": 0.09585355369315604,
-            "max_depth": 30,
-            "min_child_weight": 1.060597050922164,
-            "objective": "reg:linear",
-            "reg_alpha": 0.018060244040060163,
-            "reg_lambda": 0.011658731377413597,
-            "seed": 42,
-        }
+    def __init__(
+        self,
+        file_paths: List[str],
+        vehicle_type: str,
+        encoder: PairEncoder,
+        columns: List[str] = None,
+        filters: pc.Expression = None,
+        batch_size: int = DEFAULT_BATCH_SIZE,
+        cache_prefix: str = None,
+    ):
+        self.file_paths = file_paths
+        self.vehicle_type = vehicle_type
+        self.encoder = encoder
+        self.columns = columns
+        self.filters = filters
+        self.batch_size = batch_size
+        self._frames = None
+        super().__init__(cache_prefix=cache_prefix)
+
+    def _iter_frames(self):
+        dataset = ds.dataset(self.file_paths, format="parquet")
+        batches = dataset.to_batches(columns=self.columns, filter=self.filters, batch_size=self.batch_size)
+        for batch in batches:
+            df = transform_dataframe.fn(batch.to_pandas(), self.vehicle_type)
+            if len(df) > 0:
+                yield df
+
+    def reset(self):
+        self._frames = None
+
+    def next(self, input_data) -> int:
+        if self._frames is None:
+            self._frames = self._iter_frames()
+
+        df = next(self._frames, None)
+        if df is None:
+            return 0
+
+        input_data(data=self.encoder.transform(df), label=df[TARGET].to_numpy())
+        return 1
+
+
+def fit_encoder_from_files(
+    file_paths: List[str],
+    numerical: List[str],
+    filters: pc.Expression = None,
+    batch_size: int = DEFAULT_BATCH_SIZE,
+    headroom: float = 0.0,
+) -> PairEncoder:
+    """Same vocabulary as PairEncoder.fit, scanning location columns only"""
+    dataset = ds.dataset(file_paths, format="parquet")
+    columns = ["PULocationID", "DOLocationID"]
+
+    seen = np.zeros(N_ZONES * N_ZONES, dtype=bool)
+    for batch in dataset.to_batches(columns=columns, filter=filters, batch_size=batch_size):
+        df = batch.to_pandas()
+        codes = encode_pu_do(df["PULocationID"], df["DOLocationID"])
+        seen[codes[codes >= 0]] = True
+
+    vocabulary = np.flatnonzero(seen)
+
+    return PairEncoder(vocabulary, numerical, int(np.ceil(len(vocabulary) * (1 + headroom))))
+
+
+def __train_and_log(
+    train: xgb.DMatrix,
+    valid: xgb.DMatrix,
+    encoder: PairEncoder,
+    params: dict = None,
+    num_boost_round: int = 100,
+    xgb_model: xgb.Booster = None,
+    tags: dict = None,
+) -> Tuple[float, str]:
+    """Train (or continue training xgb_model) and log params, RMSE, report and model"""
+    with mlflow.start_run() as run:
+        best_params = dict(BEST_PARAMS, **(params or dict()))
         mlflow.log_params(best_params)
+        mlflow.set_tags(dict(dict(model_artifact=MODEL_ARTIFACT_PATH, training_mode="full"), **(tags or dict())))
 
         booster = xgb.train(
             params=best_params,
             dtrain=train,
-            num_boost_round=100,
+            num_boost_round=num_boost_round,
             evals=[(valid, "validation")],
             early_stopping_rounds=20,
+            xgb_model=xgb_model,
         )
 
         y_pred = booster.predict(valid)
-        rmse = mean_squared_error(y_val, y_pred, squared=False)
+        rmse = mean_squared_error(valid.get_label(), y_pred, squared=False)
         mlflow.log_metric("rmse", rmse)
         report = __render_rmse_markdown_report(rmse)
         create_markdown_artifact(key="duration-model-report", markdown=report)
 
-        # saving preprocessor
-        with tempfile.TemporaryDirectory() as d:
-            file_path = pathlib.Path(d) / "preprocessor.b"
-            with open(file_path, "wb") as file:
-                pickle.dump(dv, file)
-                mlflow.log_artifact(str(file_path), artifact_path="preprocessor")
+        # preprocessing and booster as single pyfunc model
+        log_duration_model(booster, encoder, artifact_path=MODEL_ARTIFACT_PATH)
+
+    return (rmse, run.info.run_id)
+
+
+def find_last_model_run(experiment_id: str, training_mode: str = None):
+    """Most recent finished run of experiment which logged duration model, None if any"""
+    filter_string = f"attributes.status = 'FINISHED' and tags.model_artifact = '{MODEL_ARTIFACT_PATH}'"
+    if training_mode is not None:
+        filter_string += f" and tags.training_mode = '{training_mode}'"
+
+    runs = MlflowClient().search_runs(
+        [experiment_id], filter_string, order_by=["attributes.start_time DESC"], max_results=1
+    )
+
+    return runs[0] if runs else None
+
+
+def score_logged_model(run_id: str, df: pd.DataFrame) -> float:
+    """RMSE on df of duration model logged by run, with encoder it was trained with"""
+    (booster, encoder) = load_duration_model_artifacts(run_id, MODEL_ARTIFACT_PATH)
+    y_pred = booster.predict(xgb.DMatrix(encoder.transform(df)))
+
+    return mean_squared_error(df[TARGET].values, y_pred, squared=False)
+
+
+def sample_params(n_trials: int, seed: int = 42) -> List[dict]:
+    """Random search candidates over SEARCH_SPACE on top of BEST_PARAMS"""
+    rng = np.random.default_rng(seed)
+
+    candidates = []
+    for _ in range(n_trials):
+        params = dict(BEST_PARAMS)
+        for name, (low, high) in SEARCH_SPACE.items():
+            if name == "max_depth":
+                params[name] = int(rng.integers(low, high + 1))
+            else:
+                params[name] = float(np.exp(rng.uniform(np.log(low), np.log(high))))
+        candidates.append(params)
 
-        mlflow.xgboost.log_model(booster, artifact_path="models_mlflow")
+    return candidates
+
+
+__trial_matrices = dict()
+
+
+def __init_trial_worker(train_path: str, valid_path: str, nthread: int):
+    # each worker loads shared matrices once, trials reuse them
+    __trial_matrices["train"] = xgb.DMatrix(train_path)
+    __trial_matrices["valid"] = xgb.DMatrix(valid_path)
+    __trial_matrices["nthread"] = nthread
+
+
+def __run_trial(params: dict, num_boost_round: int, early_stopping_rounds: int) -> dict:
+    start = dt.now()
+    booster = xgb.train(
+        params=dict(params, nthread=__trial_matrices["nthread"]),
+        dtrain=__trial_matrices["train"],
+        num_boost_round=num_boost_round,
+        evals=[(__trial_matrices["valid"], "validation")],
+        early_stopping_rounds=early_stopping_rounds,
+        verbose_eval=False,
+    )
+
+    return dict(
+        params=params,
+        rmse=booster.best_score,
+        best_iteration=booster.best_iteration,
+        duration_s=(dt.now() - start).total_seconds(),
+    )
+
+
+def __log_trials(client: MlflowClient, experiment_id: str, parent_run_id: str, trials: List[dict]):
+    """One nested run per trial, params and metrics sent in single batch request"""
+    timestamp = int(dt.now().timestamp() * 1000)
+    for trial in trials:
+        run = client.create_run(experiment_id, tags={"mlflow.parentRunId": parent_run_id})
+        client.log_batch(
+            run.info.run_id,
+            metrics=[
+                Metric("rmse", trial["rmse"], timestamp, 0),
+                Metric("best_iteration", trial["best_iteration"], timestamp, 0),
+                Metric("duration_s", trial["duration_s"], timestamp, 0),
+            ],
+            params=[Param(k, str(v)) for (k, v) in trial["params"].items()],
+            tags=[RunTag("mlflow.runName", f"trial-{trial['index']}")],
+        )
+        client.set_terminated(run.info.run_id)
+
+
+@task(log_prints=True)
+def search_best_params(
+    df_train: pd.DataFrame,
+    df_val: pd.DataFrame,
+    n_trials: int,
+    max_workers: int = None,
+    num_boost_round: int = 100,
+    early_stopping_rounds: int = 20,
+    seed: int = 42,
+) -> dict:
+    """Random search on a process pool sized to host cores
+
+    Train/valid matrices are built once and saved as XGBoost binaries, every worker
+    loads them in its initializer. Trials stop early on validation RMSE, finished
+    trials are logged to MLflow in batches as nested runs of a search run.
+    """
+    if max_workers is None:
+        max_workers = os.cpu_count() or 1
+    max_workers = max(1, min(max_workers, n_trials))
+    nthread = max(1, (os.cpu_count() or 1) // max_workers)
+
+    # same feature width as final training, reserved columns included
+    encoder = PairEncoder.fit(df_train, NUMERICAL, VOCABULARY_HEADROOM)
+    candidates = sample_params(n_trials, seed)
+
+    client = MlflowClient()
+    trials = []
+    with tempfile.TemporaryDirectory() as d, mlflow.start_run(run_name="xgboost-search") as parent:
+        train_path = os.path.join(d, "train.buffer")
+        valid_path = os.path.join(d, "valid.buffer")
+        xgb.DMatrix(encoder.transform(df_train), label=df_train[TARGET].values).save_binary(train_path)
+        xgb.DMatrix(encoder.transform(df_val), label=df_val[TARGET].values).save_binary(valid_path)
+
+        mlflow.log_params(dict(n_trials=n_trials, max_workers=max_workers, seed=seed))
+        print(f"Searching {n_trials} trials on {max_workers} workers ({nthread} threads each)...")
+
+        pending = []
+        with ProcessPoolExecutor(
+            max_workers=max_workers,
+            initializer=__init_trial_worker,
+            initargs=(train_path, valid_path, nthread),
+        ) as executor:
+            futures = {
+                executor.submit(__run_trial, params, num_boost_round, early_stopping_rounds): i
+                for (i, params) in enumerate(candidates)
+            }
+            for future in as_completed(futures):
+                pending.append(dict(future.result(), index=futures[future]))
+                if len(pending) == max_workers:
+                    __log_trials(client, parent.info.experiment_id, parent.info.run_id, pending)
+                    trials.extend(pending)
+                    pending = []
+        __log_trials(client, parent.info.experiment_id, parent.info.run_id, pending)
+        trials.extend(pending)
+
+        best = min(trials, key=lambda trial: trial["rmse"])
+        mlflow.log_metric("best_rmse", best["rmse"])
+        print(f"Best trial {best['index']}: rmse={best['rmse']:.4f} params={best['params']}")
+
+    return best["params"]
+
+
+@task(log_prints=True)
+def train_best_model(
+    df_train: pd.DataFrame,
+    df_val: pd.DataFrame,
+    params: dict = None,
+) -> None:
+    """train a model with best hyperparams and write everything out
+
+    Encoder and booster are logged together as DurationModel pyfunc, taking raw
+    trip columns as input.
+    """
+
+    with log_duration("Vectorize"):
+        encoder = PairEncoder.fit(df_train, NUMERICAL, VOCABULARY_HEADROOM)
+        # encoding and DMatrix construction mostly run in NumPy and XGBoost without GIL
+        with ThreadPoolExecutor(max_workers=2) as executor:
+            (train, valid) = executor.map(
+                lambda df: xgb.DMatrix(encoder.transform(df), label=df[TARGET].values),
+                [df_train, df_val],
+            )
+
+    with log_duration("Train and log"):
+        __train_and_log(train, valid, encoder, params)
 
     return None
 
 
-@flow(name="pipeline-xgboost", log_prints=True)
+@task(log_prints=True)
+def train_incremental_model(
+    df_train: pd.DataFrame,
+    df_val: pd.DataFrame,
+    experiment_id: str,
+    num_boost_round: int = 20,
+    params: dict = None,
+    compare_full_retrain: bool = False,
+    max_rmse_ratio: float = 1.05,
+) -> None:
+    """Continue boosting last logged model on new data for num_boost_round rounds
+
+    Vocabulary of last model is extended with unseen PU_DO pairs, appended columns
+    leave existing tree splits valid. Validation RMSE is compared on same validation
+    month to a full retrain on same data with compare_full_retrain, otherwise to
+    model of last full retrain run scored again on df_val, and run is tagged
+    full_retrain_recommended once ratio exceeds max_rmse_ratio.
+    """
+    last_run = find_last_model_run(experiment_id)
+    if last_run is None:
+        print("No previous model found, training from scratch...")
+        return train_best_model.fn(df_train, df_val, params)
+
+    print(f"Continuing model of run {last_run.info.run_id}...")
+    (booster, encoder) = load_duration_model_artifacts(last_run.info.run_id, MODEL_ARTIFACT_PATH)
+    n_pairs = len(encoder.vocabulary_)
+    encoder = encoder.extend(df_train)
+    unknown_share = encoder.unknown_share(df_train)
+    print(f"Vocabulary extended by {len(encoder.vocabulary_) - n_pairs} PU_DO pairs")
+    print(f"Training rows with PU_DO pairs beyond reserved columns: {unknown_share:.2%}")
+
+    train = xgb.DMatrix(encoder.transform(df_train), label=df_train[TARGET].values)
+    valid = xgb.DMatrix(encoder.transform(df_val), label=df_val[TARGET].values)
+
+    rmse_full = None
+    if compare_full_retrain:
+        rmse_full_metric = "rmse_full_retrain"
+        with log_duration("Full retrain"):
+            full_encoder = PairEncoder.fit(df_train, NUMERICAL, VOCABULARY_HEADROOM)
+            (rmse_full, _) = __train_and_log(
+                xgb.DMatrix(full_encoder.transform(df_train), label=df_train[TARGET].values),
+                xgb.DMatrix(full_encoder.transform(df_val), label=df_val[TARGET].values),
+                full_encoder,
+                params,
+            )
+    else:
+        # logged RMSE of last full run was measured on its own validation month
+        rmse_full_metric = "rmse_last_full_model"
+        last_full_run = find_last_model_run(experiment_id, training_mode="full")
+        if last_full_run is not None:
+            rmse_full = score_logged_model(last_full_run.info.run_id, df_val)
+
+    with log_duration("Incremental training"):
+        (rmse, run_id) = __train_and_log(
+            train,
+            valid,
+            encoder,
+            params,
+            num_boost_round=num_boost_round,
+            xgb_model=booster,
+            tags=dict(training_mode="incremental", parent_model_run_id=last_run.info.run_id),
+        )
+
+    client = MlflowClient()
+    client.log_metric(run_id, "unknown_pair_share", unknown_share)
+    if rmse_full is not None:
+        ratio = rmse / rmse_full
+        recommended = ratio > max_rmse_ratio
+        client.log_metric(run_id, rmse_full_metric, rmse_full)
+        client.log_metric(run_id, "rmse_ratio", ratio)
+        client.set_tag(run_id, "full_retrain_recommended", str(recommended).lower())
+        print(f"RMSE incremental {rmse:.4f} vs {rmse_full_metric} {rmse_full:.4f} (x{ratio:.3f})")
+        if recommended:
+            print(f"RMSE ratio above {max_rmse_ratio}, full retrain recommended")
+
+    return None
+
+
+@task(log_prints=True)
+def train_best_model_out_of_core(
+    train_files: List[str],
+    val_files: List[str],
+    vehicle_type: str,
+    columns: List[str] = None,
+    filters: pc.Expression = None,
+    batch_size: int = DEFAULT_BATCH_SIZE,
+) -> None:
+    """Same as train_best_model, streaming Parquet batches into external memory DMatrix
+
+    Encoded pages are cached on disk, so memory is bounded by batch size regardless
+    of the number of training months. External memory requires hist tree method.
+    """
+
+    encoder = fit_encoder_from_files(train_files, NUMERICAL, filters, batch_size, VOCABULARY_HEADROOM)
+    print(f"Vocabulary size: {len(encoder.vocabulary_)}")
+
+    with tempfile.TemporaryDirectory() as d:
+        (train, valid) = [
+            xgb.DMatrix(
+                ParquetBatchIter(
+                    files,
+                    vehicle_type,
+                    encoder,
+                    columns,
+                    filters,
+                    batch_size,
+                    cache_prefix=os.path.join(d, name),
+                )
+            )
+            for (name, files) in [("train", train_files), ("valid", val_files)]
+        ]
+        print(f"Training rows: {train.num_row()}, validation rows: {valid.num_row()}")
+
+        __train_and_log(train, valid, encoder, params=dict(tree_method="hist"))
+        # releasing matrices while their cache pages still exist
+        del train, valid
+
+    return None
+
+
+def get_task_runner(name: str):
+    if name == "concurrent":
+        return ConcurrentTaskRunner()
+    elif name == "sequential":
+        return SequentialTaskRunner()
+    else:
+        raise ValueError(f"Unsupported task runner: {name}")
+
+
+@flow(name="pipeline-xgboost", log_prints=True, task_runner=ConcurrentTaskRunner())
 def pipeline_xgboost_main(
     mlflow_experiment: str,
     mlflow_uri: str,
@@ -143,22 +625,92 @@ def pipeline_xgboost_main(
     val_year_month: str,
     vehicle_type: str,
     source: str = None,
+    out_of_core: bool = False,
+    batch_size: int = DEFAULT_BATCH_SIZE,
+    search_trials: int = 0,
+    search_workers: int = None,
+    use_frame_cache: bool = True,
+    transform_executor: str = "thread",
+    incremental_rounds: int = 0,
+    compare_full_retrain: bool = False,
 ) -> None:
-    """The main training pipeline"""
+    """The main training pipeline
+
+    train_year_month may be an inclusive range "YYYY-MM:YYYY-MM". With out_of_core,
+    months are read in batches of batch_size rows instead of whole DataFrames.
+    With search_trials, hyperparams are searched again before training final model.
+    With use_frame_cache, transformed months are reused across runs with same inputs.
+    Read-then-transform chains of all months are submitted at once, so with default
+    concurrent task runner reading takes about as long as the slowest month.
+    With incremental_rounds, last logged model keeps boosting on new data instead.
+    """
+    if out_of_core and (search_trials or incremental_rounds):
+        raise ValueError("Hyperparameter search and incremental training require in-memory training")
 
     mlflow.set_tracking_uri(mlflow_uri)
-    mlflow.set_experiment(mlflow_experiment)
+    experiment = mlflow.set_experiment(mlflow_experiment)
+    flow_start = time.perf_counter()
+    timings = dict()
 
     print("Reading data files...")
-    df_train = read_dataframe(vehicle_type, train_year_month, source)
-    df_val = read_dataframe(vehicle_type, val_year_month, source)
-
-    print("Transforming dataframes...")
-    df_train = transform_dataframe(df_train, vehicle_type)
-    df_val = transform_dataframe(df_val, vehicle_type)
+    read_kwargs = dict(
+        columns=[*get_datetime_columns(vehicle_type), "PULocationID", "DOLocationID", "trip_distance"],
+        filters=build_duration_filter(vehicle_type),
+    )
+    train_year_months = parse_year_months(train_year_month)
+
+    if out_of_core:
+        (train_files, val_files) = [
+            [resolve_location(get_month_location(vehicle_type, ym, source)) for ym in year_months]
+            for year_months in [train_year_months, [val_year_month]]
+        ]
+        print(f"Trip data cache: {get_default_cache().stats()}")
+
+        print("Training model out of core...")
+        train_best_model_out_of_core(train_files, val_files, vehicle_type, batch_size=batch_size, **read_kwargs)
+        return
+
+    with log_duration("Read and transform all months", timings), get_transform_executor(
+        transform_executor
+    ) as executor:
+        futures = [
+            read_transformed_dataframe.submit(
+                vehicle_type,
+                ym,
+                source,
+                use_frame_cache=use_frame_cache,
+                executor=executor,
+                **read_kwargs,
+            )
+            for ym in [*train_year_months, val_year_month]
+        ]
+        (*dfs_train, df_val) = [future.result() for future in futures]
+        df_train = pd.concat(dfs_train, ignore_index=True) if len(dfs_train) > 1 else dfs_train[0]
+
+    print(f"Trip data cache: {get_default_cache().stats()}")
+
+    params = None
+    if search_trials:
+        print("Searching hyperparams...")
+        with log_duration("Search", timings):
+            params = search_best_params(df_train, df_val, search_trials, search_workers)
 
     print("Training model...")
-    train_best_model(df_train, df_val)
+    with log_duration("Train", timings):
+        if incremental_rounds:
+            train_incremental_model(
+                df_train,
+                df_val,
+                experiment.experiment_id,
+                incremental_rounds,
+                params,
+                compare_full_retrain,
+            )
+        else:
+            train_best_model(df_train, df_val, params)
+
+    timings["Total"] = time.perf_counter() - flow_start
+    print("Stage timings: " + ", ".join(f"{stage} {elapsed:.2f}s" for (stage, elapsed) in timings.items()))
 
 
 if __name__ == "__main__":
@@ -169,5 +721,15 @@ if __name__ == "__main__":
     parser.add_argument("--train-year-month", "--train", default="2022-01")
     parser.add_argument("--val-year-month", "--val", default="2022-02")
     parser.add_argument("--vehicle-type", default="green")
+    parser.add_argument("--out-of-core", action="store_true", help="stream Parquet batches into XGBoost")
+    parser.add_argument("--batch-size", default=DEFAULT_BATCH_SIZE, type=int)
+    parser.add_argument("--search-trials", default=0, type=int, help="search hyperparams before training")
+    parser.add_argument("--search-workers", default=None, type=int, help="defaults to CPU count")
+    parser.add_argument("--no-frame-cache", dest="use_frame_cache", action="store_false")
+    parser.add_argument("--transform-executor", default="thread", choices=["thread", "process"])
+    parser.add_argument("--task-runner", default="concurrent", choices=["concurrent", "sequential"])
+    parser.add_argument("--incremental-rounds", default=0, type=int, help="continue last model for N rounds")
+    parser.add_argument("--compare-full-retrain", action="store_true")
     kwargs = vars(parser.parse_args())
-    pipeline_xgboost_main(**kwargs)
+    task_runner = get_task_runner(kwargs.pop("task_runner"))
+    pipeline_xgboost_main.with_options(task_runner=task_runner)(**kwargs)
@@ -9,6 +9,9 @@ if __name__ == "__main__":
     parser = argparse.ArgumentParser()
     parser.add_argument("--name", required=True)
     parser.add_argument("--pool-name", required=True)
+    parser.add_argument("--incremental", action="store_true", help="continue boosting last logged model")
+    parser.add_argument("--incremental-rounds", default=20, type=int)
+    parser.add_argument("--compare-full-retrain", action="store_true")
     args = parser.parse_args()
 
     deployment = Deployment.build_from_flow(
@@ -22,6 +25,8 @@ if __name__ == "__main__":
             train_year_month="2023-01",
             val_year_month="2023-02",
             vehicle_type="green",
+            incremental_rounds=args.incremental_rounds if args.incremental else 0,
+            compare_full_retrain=args.compare_full_retrain,
         ),
     )
     deployment.apply()
@@ -0,0 +1,69 @@
+from types import SimpleNamespace
+
+import numpy as np
+import pandas as pd
+import pytest
+import xgboost as xgb
+
+from features import PairEncoder, encode_pu_do
+
+pytest.importorskip("mlflow")
+
+from duration_model import DurationModel  # noqa: E402
+
+
+NUMERICAL = ["trip_distance"]
+
+
+def make_trips(n: int, seed: int) -> pd.DataFrame:
+    rng = np.random.default_rng(seed)
+    df = pd.DataFrame(
+        {
+            "PULocationID": rng.integers(1, 30, n).astype("float64"),
+            "DOLocationID": rng.integers(1, 30, n),
+            "trip_distance": rng.exponential(2.5, n),
+        }
+    )
+    df.loc[rng.random(n) < 0.05, "PULocationID"] = np.nan
+
+    return df
+
+
+@pytest.fixture(scope="module")
+def model_files(tmp_path_factory):
+    """Booster and encoder artifacts as logged by log_duration_model"""
+    df = make_trips(2000, seed=0)
+    features = df.assign(PU_DO=encode_pu_do(df["PULocationID"], df["DOLocationID"]))
+    encoder = PairEncoder.fit(features, NUMERICAL, headroom=0.1)
+    y = 3.0 * df["trip_distance"] + np.random.default_rng(1).normal(0, 2, len(df)) + df["DOLocationID"] % 7
+    booster = xgb.train(dict(max_depth=4, seed=42), xgb.DMatrix(encoder.transform(features), label=y), 20)
+
+    d = tmp_path_factory.mktemp("model")
+    artifacts = dict(booster=str(d / "booster.ubj"), encoder=str(d / "encoder.npz"))
+    booster.save_model(artifacts["booster"])
+    encoder.save(artifacts["encoder"])
+
+    return artifacts
+
+
+@pytest.mark.parametrize("n_rows", [1, 999, 1000, 2501])
+def test_batched_predict_matches_dmatrix(model_files, n_rows):
+    model = DurationModel(batch_size=500)
+    model.load_context(SimpleNamespace(artifacts=model_files))
+    # unseen pairs and location IDs included
+    df = make_trips(n_rows, seed=2).assign(DOLocationID=lambda df: df["DOLocationID"] + 20)
+
+    features = df.assign(PU_DO=encode_pu_do(df["PULocationID"], df["DOLocationID"]))
+    expected = model.booster.predict(xgb.DMatrix(model.encoder.transform(features)))
+
+    y_pred = model.predict(None, df)
+    assert y_pred.shape == (n_rows,)
+    np.testing.assert_array_equal(y_pred, expected)
+
+
+def test_predict_missing_columns(model_files):
+    model = DurationModel()
+    model.load_context(SimpleNamespace(artifacts=model_files))
+
+    with pytest.raises(ValueError, match="trip_distance"):
+        model.predict(None, make_trips(10, seed=3).drop(columns="trip_distance"))
@@ -0,0 +1,80 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from features import N_ZONES, PairEncoder, decode_pu_do, encode_pu_do
+
+
+ZONES = np.arange(1, 266)
+NUMERICAL = ["trip_distance"]
+
+
+def make_pairs(pu, do) -> pd.DataFrame:
+    df = pd.DataFrame({"PULocationID": pu, "DOLocationID": do, "trip_distance": np.linspace(0.5, 9.5, len(pu))})
+    return df.assign(PU_DO=encode_pu_do(df["PULocationID"], df["DOLocationID"]))
+
+
+def test_pu_do_round_trip_over_all_zones():
+    (pu, do) = (np.repeat(ZONES, len(ZONES)), np.tile(ZONES, len(ZONES)))
+    codes = encode_pu_do(pd.Series(pu), pd.Series(do))
+
+    assert codes.dtype == np.int32
+    assert len(np.unique(codes)) == len(ZONES) ** 2
+    expected = pd.Series(pu).astype(str) + "_" + pd.Series(do).astype(str)
+    np.testing.assert_array_equal(decode_pu_do(codes), expected.to_numpy(dtype=object))
+
+
+def test_pu_do_invalid_location_ids():
+    pu = pd.Series([np.nan, 1, -1, N_ZONES, 265, 0])
+    do = pd.Series([1, np.nan, 5, 1, N_ZONES, 0])
+
+    np.testing.assert_array_equal(encode_pu_do(pu, do), [-1, -1, -1, -1, -1, 0])
+
+
+def test_extend_fills_reserved_columns_most_frequent_first():
+    train = make_pairs([1, 1, 2, 3, 3, 3], [1, 1, 2, 3, 3, 3])
+    encoder = PairEncoder.fit(train, NUMERICAL, headroom=0.5)
+    assert (len(encoder.vocabulary_), encoder.capacity, encoder.n_features) == (3, 5, 6)
+
+    # three unseen pairs, only the two most frequent fit in reserved columns
+    new = make_pairs([1, 4, 4, 4, 5, 5, 6, -1], [1, 4, 4, 4, 5, 5, 6, 7])
+    assert encoder.unknown_share(new) == pytest.approx(6 / 7)
+    extended = encoder.extend(new)
+
+    np.testing.assert_array_equal(extended.vocabulary_[:3], encoder.vocabulary_)
+    np.testing.assert_array_equal(extended.vocabulary_[3:], encode_pu_do(pd.Series([4, 5]), pd.Series([4, 5])))
+    assert (extended.capacity, extended.n_features) == (encoder.capacity, encoder.n_features)
+    assert extended.unknown_share(new) == pytest.approx(1 / 7)
+
+    # existing columns keep their position, full encoder does not grow
+    np.testing.assert_array_equal(extended.transform(train).toarray(), encoder.transform(train).toarray())
+    full = extended.extend(make_pairs([7, 8], [7, 8]))
+    np.testing.assert_array_equal(full.vocabulary_, extended.vocabulary_)
+
+
+def test_transform_one_hot_after_numerical():
+    df = make_pairs([1, 2, 9, -1], [1, 2, 9, 3])
+    encoder = PairEncoder.fit(df.iloc[:2], NUMERICAL, headroom=1.0)
+
+    X = encoder.transform(df)
+
+    assert X.shape == (4, 1 + 4)
+    expected = np.zeros((4, 5), dtype=np.float32)
+    expected[:, 0] = df["trip_distance"]
+    expected[0, 1] = expected[1, 2] = 1.0
+    np.testing.assert_array_equal(X.toarray(), expected)
+
+
+def test_save_load_round_trip(tmp_path):
+    df = make_pairs([1, 2, 3, 4], [4, 3, 2, 1])
+    encoder = PairEncoder.fit(df, ["trip_distance", "fare_amount"], headroom=0.1)
+    file_path = tmp_path / "encoder.npz"
+
+    encoder.save(file_path)
+    loaded = PairEncoder.load(file_path)
+
+    np.testing.assert_array_equal(loaded.vocabulary_, encoder.vocabulary_)
+    assert loaded.vocabulary_.dtype == np.int32
+    assert (loaded.numerical, loaded.capacity) == (encoder.numerical, encoder.capacity)
+    np.testing.assert_array_equal(loaded.lookup_, encoder.lookup_)
+    np.testing.assert_array_equal(loaded.get_feature_names_out(), encoder.get_feature_names_out())
@@ -0,0 +1,82 @@
+import os
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from frame_cache import SUFFIX, FrameCache, get_file_identity
+
+
+def make_frame(n: int, seed: int = 0) -> pd.DataFrame:
+    rng = np.random.default_rng(seed)
+    return pd.DataFrame(
+        {
+            "PU_DO": rng.integers(0, 266 * 266, n).astype(np.int32),
+            "duration": rng.gamma(2.0, 7.0, n),
+            "passenger_count": pd.array(rng.integers(0, 7, n), dtype="Int64"),
+            "lpep_pickup_datetime": pd.date_range("2023-01-01", periods=n, freq="min"),
+            "store_and_fwd_flag": rng.choice(["N", "Y", None], n),
+        }
+    )
+
+
+@pytest.fixture
+def cache(tmp_path):
+    return FrameCache(str(tmp_path / "frames"), max_bytes=10**9)
+
+
+def test_miss_then_hit_round_trip(cache):
+    df = make_frame(1000)
+    key = cache.key({"path": "a.parquet"}, "v1")
+
+    assert cache.get(key) is None
+    assert cache.put(key, df) is df
+    cached = cache.get(key)
+
+    pd.testing.assert_frame_equal(cached, df)
+    assert cache.stats() == dict(hits=1, misses=1, files=1, bytes=os.path.getsize(cache._entry_path(key)))
+    assert not [name for name in os.listdir(cache.cache_dir) if not name.endswith(SUFFIX)]
+
+
+def test_key_changes_with_source_file(cache, tmp_path):
+    file_path = tmp_path / "green_tripdata_2023-01.parquet"
+    make_frame(100).to_parquet(file_path)
+    key = cache.key(get_file_identity("s3://bucket/green_tripdata_2023-01.parquet", str(file_path)), "v1")
+    cache.put(key, make_frame(10))
+
+    assert cache.key(get_file_identity("s3://bucket/green_tripdata_2023-01.parquet", str(file_path)), "v1") == key
+    assert cache.key(get_file_identity("s3://bucket/green_tripdata_2023-01.parquet", str(file_path)), "v2") != key
+
+    # rewritten source gets a new size and mtime, so old entry is no longer looked up
+    make_frame(200, seed=1).to_parquet(file_path)
+    stat = os.stat(file_path)
+    os.utime(file_path, ns=(stat.st_atime_ns, stat.st_mtime_ns + 10**9))
+    new_key = cache.key(get_file_identity("s3://bucket/green_tripdata_2023-01.parquet", str(file_path)), "v1")
+
+    assert new_key != key
+    assert cache.get(new_key) is None
+
+
+def test_evicts_least_recently_used(cache):
+    keys = [cache.key(i) for i in range(4)]
+    for i, key in enumerate(keys[:3]):
+        cache.put(key, make_frame(1000, seed=i))
+        os.utime(cache._entry_path(key), (1_000_000 + i, 1_000_000 + i))
+    entry_bytes = os.path.getsize(cache._entry_path(keys[0]))
+
+    # reading oldest entry makes it most recently used
+    cache.get(keys[0])
+    cache.max_bytes = int(3.5 * entry_bytes)
+    cache.put(keys[3], make_frame(1000, seed=3))
+
+    assert [cache.get(key) is not None for key in keys] == [True, False, True, True]
+
+
+def test_new_entry_kept_over_budget(cache):
+    cache.max_bytes = 1
+    (old, new) = (cache.key("old"), cache.key("new"))
+    cache.put(old, make_frame(100))
+    cache.put(new, make_frame(100))
+
+    assert cache.get(old) is None
+    pd.testing.assert_frame_equal(cache.get(new), make_frame(100))
@@ -0,0 +1,106 @@
+import numpy as np
+import pandas as pd
+import pytest
+import xgboost as xgb
+
+from features import PairEncoder, encode_pu_do
+
+pytest.importorskip("mlflow")
+pytest.importorskip("prefect")
+
+from pipeline_xgboost import TARGET, ParquetBatchIter  # noqa: E402
+
+
+NUMERICAL = ["trip_distance"]
+COLUMNS = ["PULocationID", "DOLocationID", "trip_distance", "lpep_pickup_datetime", "lpep_dropoff_datetime"]
+
+
+def make_trips(n: int, first: int, seed: int) -> pd.DataFrame:
+    """Green trips with unique durations, every tenth one out of 1..60 minutes range"""
+    rng = np.random.default_rng(seed)
+    seconds = 60 + np.arange(first, first + n)
+    seconds[::10] = np.where(np.arange(0, n, 10) % 20 == 0, 30, 3660 + np.arange(0, n, 10))
+    pickup = pd.Timestamp("2023-01-01") + pd.to_timedelta(rng.integers(0, 86400, n), unit="s")
+
+    return pd.DataFrame(
+        {
+            "PULocationID": rng.integers(1, 30, n),
+            "DOLocationID": rng.integers(1, 30, n),
+            "trip_distance": rng.exponential(2.5, n),
+            "lpep_pickup_datetime": pickup,
+            "lpep_dropoff_datetime": pickup + pd.to_timedelta(seconds, unit="s"),
+            "fare_amount": rng.gamma(2.0, 7.0, n),
+        }
+    )
+
+
+@pytest.fixture(scope="module")
+def files(tmp_path_factory):
+    d = tmp_path_factory.mktemp("data")
+    frames = [make_trips(95, first=0, seed=0), make_trips(40, first=95, seed=1)]
+    file_paths = []
+    for month, df in enumerate(frames, start=1):
+        file_path = str(d / f"green_tripdata_2023-{month:02d}.parquet")
+        df.to_parquet(file_path, row_group_size=30)
+        file_paths.append(file_path)
+
+    df = pd.concat(frames, ignore_index=True)
+    df = df.assign(PU_DO=encode_pu_do(df["PULocationID"], df["DOLocationID"]))
+    df[TARGET] = (df["lpep_dropoff_datetime"] - df["lpep_pickup_datetime"]).dt.total_seconds() / 60
+
+    return (file_paths, df[(df[TARGET] >= 1) & (df[TARGET] <= 60)])
+
+
+def collect(data_iter: ParquetBatchIter, max_batches: int = None):
+    """(data, label) of batches passed to XGBoost, until exhausted or max_batches"""
+    batches = []
+    while max_batches is None or len(batches) < max_batches:
+        if not data_iter.next(lambda data, label: batches.append((data, label))):
+            break
+
+    return batches
+
+
+def stack(batches):
+    X = np.vstack([data.toarray() for (data, _) in batches])
+    y = np.concatenate([label for (_, label) in batches])
+    order = np.argsort(y)
+
+    return (X[order], y[order])
+
+
+def test_yields_every_row_once_and_restarts(files):
+    (file_paths, expected) = files
+    expected = expected.sort_values(TARGET)
+    encoder = PairEncoder.fit(expected, NUMERICAL)
+    data_iter = ParquetBatchIter(file_paths, "green", encoder, COLUMNS, batch_size=7)
+
+    first = collect(data_iter)
+    (X, y) = stack(first)
+    np.testing.assert_array_equal(y, expected[TARGET].to_numpy())
+    np.testing.assert_array_equal(X, encoder.transform(expected).toarray())
+    assert all(len(label) <= 7 for (_, label) in first)
+    # exhausted iterator stays exhausted until reset
+    assert collect(data_iter) == []
+
+    # reset restarts from first batch, also in the middle of a pass
+    data_iter.reset()
+    partial = collect(data_iter, max_batches=3)
+    for (_, label), (_, first_label) in zip(partial, first[:3]):
+        np.testing.assert_array_equal(label, first_label)
+    assert len(partial) == 3
+    data_iter.reset()
+    np.testing.assert_array_equal(stack(collect(data_iter))[1], y)
+
+
+def test_external_memory_dmatrix_rows(files, tmp_path):
+    (file_paths, expected) = files
+    encoder = PairEncoder.fit(expected, NUMERICAL)
+    data_iter = ParquetBatchIter(
+        file_paths, "green", encoder, COLUMNS, batch_size=16, cache_prefix=str(tmp_path / "train")
+    )
+
+    dtrain = xgb.DMatrix(data_iter)
+
+    assert (dtrain.num_row(), dtrain.num_col()) == (len(expected), encoder.n_features)
+    np.testing.assert_allclose(np.sort(dtrain.get_label()), np.sort(expected[TARGET].to_numpy(dtype=np.float32)))
@@ -0,0 +1,81 @@
+import os
+
+import numpy as np
+import pandas as pd
+import pytest
+
+pytest.importorskip("mlflow")
+pytest.importorskip("prefect")
+
+from pipeline_xgboost import (  # noqa: E402
+    build_duration_filter,
+    get_transform_executor,
+    read_and_transform,
+    read_transformed_dataframe,
+)
+
+
+COLUMNS = ["lpep_pickup_datetime", "lpep_dropoff_datetime", "PULocationID", "DOLocationID", "trip_distance"]
+
+
+@pytest.fixture
+def source(tmp_path, monkeypatch):
+    monkeypatch.setenv("FRAME_CACHE_DIR", str(tmp_path / "frames"))
+    rng = np.random.default_rng(0)
+    for month in [1, 2]:
+        pickup = pd.Timestamp(f"2023-{month:02d}-01") + pd.to_timedelta(rng.integers(0, 86400, 500), unit="s")
+        df = pd.DataFrame(
+            {
+                "lpep_pickup_datetime": pickup,
+                "lpep_dropoff_datetime": pickup + pd.to_timedelta(rng.integers(0, 5400, 500), unit="s"),
+                "PULocationID": rng.integers(1, 266, 500),
+                "DOLocationID": rng.integers(1, 266, 500),
+                "trip_distance": rng.exponential(2.5, 500),
+                "fare_amount": rng.gamma(2.0, 7.0, 500),
+            }
+        )
+        df.to_parquet(tmp_path / f"green_tripdata_2023-{month:02d}.parquet")
+
+    return str(tmp_path)
+
+
+def read(source, year_month, executor, use_frame_cache=True):
+    return read_transformed_dataframe.fn(
+        "green",
+        year_month,
+        source,
+        columns=COLUMNS,
+        filters=build_duration_filter("green"),
+        use_frame_cache=use_frame_cache,
+        executor=executor,
+    )
+
+
+@pytest.mark.parametrize("executor_name", ["thread", "process"])
+def test_frame_cache_miss_then_hit(source, executor_name, capsys):
+    expected = read_and_transform(
+        os.path.join(source, "green_tripdata_2023-02.parquet"), "green", COLUMNS, build_duration_filter("green")
+    ).reset_index(drop=True)
+
+    with get_transform_executor(executor_name) as executor:
+        missed = read(source, "2023-02", executor)
+        assert "Frame cache hit" not in capsys.readouterr().out
+        hit = read(source, "2023-02", executor)
+        assert "Frame cache hit: 2023-02" in capsys.readouterr().out
+        other = read(source, "2023-01", executor)
+
+    pd.testing.assert_frame_equal(missed, expected)
+    pd.testing.assert_frame_equal(hit, expected)
+    assert len(other) and not other["lpep_pickup_datetime"].isin(expected["lpep_pickup_datetime"]).all()
+    assert len(os.listdir(os.environ["FRAME_CACHE_DIR"])) == 2
+
+
+def test_without_frame_cache(source):
+    expected = read_and_transform(
+        os.path.join(source, "green_tripdata_2023-01.parquet"), "green", COLUMNS, build_duration_filter("green")
+    )
+
+    with get_transform_executor("thread") as executor:
+        pd.testing.assert_frame_equal(read(source, "2023-01", executor, use_frame_cache=False), expected)
+    pd.testing.assert_frame_equal(read(source, "2023-01", None, use_frame_cache=False), expected)
+    assert not os.path.exists(os.environ["FRAME_CACHE_DIR"])
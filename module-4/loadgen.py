@@ -0,0 +1,89 @@
+#!/usr/bin/env python
+"""Load generator for serve.py over keep-alive connections on localhost
+
+Each of --concurrency clients sends single-ride requests back to back until
+--requests have been sent overall, with location IDs drawn at random. Client-side
+throughput and latency percentiles are printed along with service /metrics.
+
+Examples:
+    python loadgen.py --requests 20000 --concurrency 64
+    python loadgen.py --host 127.0.0.1 --port 9696 --requests 100000 --concurrency 256
+"""
+
+import argparse
+import asyncio
+import json
+import random
+import time
+
+import numpy as np
+
+
+N_ZONES = 265
+
+
+async def request(reader, writer, host, method, path, payload=None):
+    body = json.dumps(payload).encode() if payload is not None else b""
+    head = f"{method} {path} HTTP/1.1\r\nHost: {host}\r\nContent-Length: {len(body)}\r\n\r\n"
+    writer.write(head.encode() + body)
+    await writer.drain()
+
+    status = int((await reader.readline()).split()[1])
+    length = 0
+    while True:
+        line = await reader.readline()
+        if line in (b"\r\n", b""):
+            break
+        (name, _, value) = line.decode("latin-1").partition(":")
+        if name.strip().lower() == "content-length":
+            length = int(value)
+
+    return (status, json.loads(await reader.readexactly(length)))
+
+
+async def client(host, port, counter, latencies_ms, errors, seed):
+    rng = random.Random(seed)
+    (reader, writer) = await asyncio.open_connection(host, port)
+    try:
+        while counter[0] > 0:
+            counter[0] -= 1
+            ride = dict(PULocationID=rng.randint(1, N_ZONES), DOLocationID=rng.randint(1, N_ZONES))
+            start = time.perf_counter()
+            (status, _) = await request(reader, writer, host, "POST", "/predict", ride)
+            latencies_ms.append((time.perf_counter() - start) * 1000)
+            if status != 200:
+                errors.append(status)
+    finally:
+        writer.close()
+
+
+async def main(host, port, requests, concurrency):
+    counter = [requests]
+    latencies_ms = []
+    errors = []
+
+    start = time.perf_counter()
+    await asyncio.gather(
+        *[client(host, port, counter, latencies_ms, errors, seed) for seed in range(concurrency)]
+    )
+    elapsed = time.perf_counter() - start
+
+    (p50, p99) = np.percentile(latencies_ms, [50, 99])
+    print(f"Requests: {len(latencies_ms)}, errors: {len(errors)}, concurrency: {concurrency}")
+    print(f"Throughput: {len(latencies_ms) / elapsed:,.0f} requests/sec")
+    print(f"Client latency: p50 {p50:.2f} ms, p99 {p99:.2f} ms")
+
+    (reader, writer) = await asyncio.open_connection(host, port)
+    (_, metrics) = await request(reader, writer, host, "GET", "/metrics")
+    writer.close()
+    print(f"Service metrics: {json.dumps(metrics, indent=2)}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", default=9696, type=int)
+    parser.add_argument("--requests", default=10_000, type=int)
+    parser.add_argument("--concurrency", default=32, type=int)
+    kwargs = vars(parser.parse_args())
+    asyncio.run(main(**kwargs))
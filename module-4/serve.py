@@ -0,0 +1,277 @@
+#!/usr/bin/env python
+"""Online duration scoring service with asyncio micro-batching
+
+Model is loaded once at startup, through coefficient table when given. Concurrent
+requests are queued and grouped into micro-batches, closed once max batch size is
+reached or max wait has passed since first queued ride, and each batch is scored
+by a single vectorized predict off the event loop. Plain HTTP/1.1 with keep-alive
+on standard library asyncio streams, no web framework required.
+
+Endpoints:
+    POST /predict: one ride {"PULocationID": 10, "DOLocationID": 50} or a list of rides,
+        answered with {"duration": ...} or a list of them
+    GET /metrics: request, ride and batch counters, throughput and p50/p99 latency in ms
+    GET /health
+
+Location IDs must be integers between -1 (missing) and MAX_LOCATION_ID, others are
+answered with 400. When scoring a batch fails, its rides are scored again one by
+one, so only requests whose rides fail get 500 and connections stay open.
+
+Examples:
+    python serve.py --port 9696 --max-batch-size 64 --max-wait-ms 2
+    python serve.py --table-file model.npy
+
+    curl -X POST localhost:9696/predict -d '{"PULocationID": 10, "DOLocationID": 50}'
+    curl localhost:9696/metrics
+"""
+
+import argparse
+import asyncio
+import collections
+import json
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+import pandas as pd
+
+from starter import CATEGORICAL, load_predictor
+
+
+LATENCY_WINDOW = 10_000  # latest requests percentiles are computed over
+MAX_BODY_BYTES = 1024**2
+MAX_LOCATION_ID = 2**31 - 1  # int32, unseen IDs below are scored as in batch scoring
+REASONS = {200: "OK", 400: "Bad Request", 404: "Not Found", 413: "Payload Too Large", 500: "Internal Server Error"}
+
+
+class MicroBatcher:
+    def __init__(self, predict_fn, max_batch_size=64, max_wait_ms=2.0):
+        self.predict_fn = predict_fn
+        self.max_batch_size = max_batch_size
+        self.max_wait_s = max_wait_ms / 1000
+
+        self.queue = asyncio.Queue()
+        # single thread keeps predictions ordered and event loop free to accept requests
+        self.executor = ThreadPoolExecutor(max_workers=1)
+
+        self.started_at = time.monotonic()
+        self.requests = 0
+        self.rides = 0
+        self.batches = 0
+        self.latencies_ms = collections.deque(maxlen=LATENCY_WINDOW)
+
+    async def predict(self, rides):
+        """Predicted durations of rides, scored along with other queued rides"""
+        futures = []
+        for ride in rides:
+            future = asyncio.get_running_loop().create_future()
+            self.queue.put_nowait((ride, future))
+            futures.append(future)
+
+        results = await asyncio.gather(*futures, return_exceptions=True)
+        for result in results:
+            if isinstance(result, Exception):
+                raise result
+
+        return results
+
+    async def run(self):
+        loop = asyncio.get_running_loop()
+        while True:
+            batch = [await self.queue.get()]
+            deadline = loop.time() + self.max_wait_s
+            while len(batch) < self.max_batch_size:
+                timeout = deadline - loop.time()
+                if timeout <= 0:
+                    break
+                try:
+                    batch.append(await asyncio.wait_for(self.queue.get(), timeout))
+                except asyncio.TimeoutError:
+                    break
+
+            (rides, futures) = zip(*batch)
+            try:
+                y_pred = await loop.run_in_executor(self.executor, self._predict_batch, rides)
+            except Exception:
+                # scoring rides one by one, so failing rides do not fail others of batch
+                for ride, future in batch:
+                    await self._predict_one(ride, future)
+                continue
+
+            self.batches += 1
+            self.rides += len(rides)
+            for future, value in zip(futures, y_pred):
+                if not future.done():
+                    future.set_result(float(value))
+
+    async def _predict_one(self, ride, future):
+        try:
+            (value,) = await asyncio.get_running_loop().run_in_executor(self.executor, self._predict_batch, [ride])
+        except Exception as e:
+            if not future.done():
+                future.set_exception(e)
+            return
+
+        self.batches += 1
+        self.rides += 1
+        if not future.done():
+            future.set_result(float(value))
+
+    def _predict_batch(self, rides):
+        df = pd.DataFrame({col: np.array([ride[col] for ride in rides], dtype=int) for col in CATEGORICAL})
+        return self.predict_fn(df)
+
+    def record(self, latency_ms):
+        self.requests += 1
+        self.latencies_ms.append(latency_ms)
+
+    def metrics(self):
+        uptime_s = time.monotonic() - self.started_at
+        latencies = np.array(self.latencies_ms)
+        (p50, p99) = np.percentile(latencies, [50, 99]) if len(latencies) else (None, None)
+
+        return dict(
+            uptime_s=uptime_s,
+            requests=self.requests,
+            rides=self.rides,
+            batches=self.batches,
+            mean_batch_size=self.rides / self.batches if self.batches else None,
+            requests_per_sec=self.requests / uptime_s,
+            rides_per_sec=self.rides / uptime_s,
+            latency_p50_ms=p50,
+            latency_p99_ms=p99,
+            queue_size=self.queue.qsize(),
+        )
+
+
+def parse_location_id(value) -> int:
+    if value is None:
+        return -1
+
+    try:
+        location_id = int(value)
+    except (OverflowError, TypeError, ValueError):
+        raise ValueError(f"Invalid location ID: {value!r}")
+    if not -1 <= location_id <= MAX_LOCATION_ID:
+        raise ValueError(f"Location ID out of range [-1, {MAX_LOCATION_ID}]: {value!r}")
+
+    return location_id
+
+
+def parse_ride(ride):
+    """Location IDs of ride as integers, -1 for missing ones as in batch scoring"""
+    if not isinstance(ride, dict):
+        raise TypeError("Expected a ride object or a list of them")
+
+    return {col: parse_location_id(ride.get(col)) for col in CATEGORICAL}
+
+
+async def read_request(reader):
+    """(method, path, headers, body) of next request on connection, None once closed"""
+    request_line = await reader.readline()
+    if not request_line:
+        return None
+
+    (method, path, _) = request_line.decode("latin-1").split(" ", 2)
+    headers = dict()
+    while True:
+        line = await reader.readline()
+        if line in (b"\r\n", b"\n", b""):
+            break
+        (name, _, value) = line.decode("latin-1").partition(":")
+        headers[name.strip().lower()] = value.strip()
+
+    length = int(headers.get("content-length", 0))
+    if length > MAX_BODY_BYTES:
+        raise ValueError("Payload Too Large")
+    body = await reader.readexactly(length) if length else b""
+
+    return (method, path, headers, body)
+
+
+def write_response(writer, status, payload, keep_alive=True):
+    body = json.dumps(payload).encode()
+    head = (
+        f"HTTP/1.1 {status} {REASONS[status]}\r\n"
+        "Content-Type: application/json\r\n"
+        f"Content-Length: {len(body)}\r\n"
+        f"Connection: {'keep-alive' if keep_alive else 'close'}\r\n\r\n"
+    )
+    writer.write(head.encode() + body)
+
+
+async def handle(batcher, method, path, body):
+    if method == "GET" and path == "/health":
+        return (200, dict(status="ok"))
+    if method == "GET" and path == "/metrics":
+        return (200, batcher.metrics())
+    if method != "POST" or path != "/predict":
+        return (404, dict(error=f"{method} {path}"))
+
+    try:
+        payload = json.loads(body)
+        rides = [parse_ride(ride) for ride in (payload if isinstance(payload, list) else [payload])]
+    except (TypeError, ValueError) as e:
+        return (400, dict(error=str(e)))
+
+    start = time.perf_counter()
+    try:
+        durations = await batcher.predict(rides)
+    except Exception as e:
+        return (500, dict(error=f"Prediction failed: {e}"))
+    batcher.record((time.perf_counter() - start) * 1000)
+
+    if isinstance(payload, list):
+        return (200, [dict(duration=d) for d in durations])
+    return (200, dict(duration=durations[0]))
+
+
+async def serve_connection(batcher, reader, writer):
+    try:
+        while True:
+            try:
+                request = await read_request(reader)
+            except ValueError as e:
+                status = 413 if "Too Large" in str(e) else 400
+                write_response(writer, status, dict(error=str(e)), keep_alive=False)
+                break
+            if request is None:
+                break
+
+            (method, path, headers, body) = request
+            keep_alive = headers.get("connection", "").lower() != "close"
+            (status, payload) = await handle(batcher, method, path, body)
+            write_response(writer, status, payload, keep_alive)
+            await writer.drain()
+            if not keep_alive:
+                break
+    except (asyncio.IncompleteReadError, ConnectionError):
+        pass
+    finally:
+        writer.close()
+
+
+async def main(host, port, model_file, table_file, max_batch_size, max_wait_ms):
+    batcher = MicroBatcher(load_predictor(model_file, table_file), max_batch_size, max_wait_ms)
+    batching = asyncio.create_task(batcher.run())
+
+    server = await asyncio.start_server(
+        lambda reader, writer: serve_connection(batcher, reader, writer), host, port
+    )
+    print(f"Serving on http://{host}:{port} (max batch size {max_batch_size}, max wait {max_wait_ms} ms)")
+    async with server:
+        await server.serve_forever()
+
+    batching.cancel()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", default=9696, type=int)
+    parser.add_argument("--model-file", default="model.bin")
+    parser.add_argument("--table-file", default=None, help="coefficient table used instead of model file")
+    parser.add_argument("--max-batch-size", default=64, type=int)
+    parser.add_argument("--max-wait-ms", default=2.0, type=float)
+    kwargs = vars(parser.parse_args())
+    asyncio.run(main(**kwargs))
@@ -0,0 +1,159 @@
+"""Prediction output sinks for starter.py
+
+Prediction tables are appended to a single Parquet file on local disk or any
+S3-compatible object store through pyarrow.fs, optionally compressed and laid out
+in Hive partitions "year=YYYY/month=MM/". Written bytes and time spent writing are
+tracked so compression and ride_id encoding trade-offs can be compared. Files are
+written under a ".part" name and moved into place on close, so existing outputs
+are complete ones and can be skipped by backfills.
+
+S3 credentials are read by Arrow from standard AWS environment variables, while
+S3_ENDPOINT_URL (or endpoint_url argument) points to non-AWS stores such as MinIO.
+
+Examples:
+    with PredictionSink("data/output.parquet", schema, compression="zstd") as sink:
+        sink.write(table)
+    print(sink.report())
+
+    # s3://predictions/year=2022/month=02/predictions.parquet
+    sink = PredictionSink("s3://predictions", schema, partition=(2022, 2), endpoint_url="http://localhost:9000")
+"""
+
+import os
+import time
+
+import pyarrow as pa
+import pyarrow.fs as pafs
+import pyarrow.parquet as pq
+
+
+COMPRESSIONS = ["none", "snappy", "zstd", "gzip", "lz4"]
+PARTITION_FILENAME = "predictions.parquet"
+PART_SUFFIX = ".part"
+
+
+def get_filesystem(output: str, endpoint_url: str = None):
+    """(filesystem, path) of output URI or local path"""
+    if endpoint_url is None:
+        endpoint_url = os.environ.get("S3_ENDPOINT_URL")
+
+    if output.startswith("s3://") and endpoint_url:
+        (scheme, _, endpoint) = endpoint_url.rpartition("://")
+        filesystem = pafs.S3FileSystem(endpoint_override=endpoint, scheme=scheme or "https")
+        return (filesystem, output[len("s3://") :])
+
+    return pafs.FileSystem.from_uri(output if "://" in output else os.path.abspath(output))
+
+
+def get_output_path(output: str, partition=None, endpoint_url: str = None):
+    """(filesystem, path) of output file, under year=YYYY/month=MM/ when partition (year, month) is given"""
+    (filesystem, path) = get_filesystem(output, endpoint_url)
+    if partition is not None:
+        (year, month) = partition
+        path = f"{path.rstrip('/')}/year={year:04d}/month={month:02d}/{PARTITION_FILENAME}"
+
+    return (filesystem, path)
+
+
+def output_exists(output: str, partition=None, endpoint_url: str = None) -> bool:
+    (filesystem, path) = get_output_path(output, partition, endpoint_url)
+    return filesystem.get_file_info(path).type == pafs.FileType.File
+
+
+def get_encodings(schema: pa.Schema) -> dict:
+    """Delta encoding for integer columns such as packed ride_id, dictionary for others
+
+    Sorted integers delta-encode to a few bits per value, dictionary pages would
+    only grow with unique IDs.
+    """
+    delta = [field.name for field in schema if pa.types.is_integer(field.type)]
+    if not delta:
+        return dict()
+
+    return dict(
+        use_dictionary=[field.name for field in schema if field.name not in delta],
+        column_encoding={name: "DELTA_BINARY_PACKED" for name in delta},
+    )
+
+
+class PredictionSink:
+    def __init__(
+        self,
+        output: str,
+        schema: pa.Schema,
+        compression: str = "none",
+        partition=None,
+        endpoint_url: str = None,
+    ):
+        """output is a file path, or base directory when partition (year, month) is given"""
+        (self.filesystem, path) = get_output_path(output, partition, endpoint_url)
+        self.path = path
+        self.schema = schema
+        self.compression = compression
+
+        self.rows = 0
+        self.write_time_s = 0.0
+
+        start = time.perf_counter()
+        parent = path.rpartition("/")[0]
+        if parent:
+            self.filesystem.create_dir(parent, recursive=True)
+        # written under temporary name and moved on close, so existing output is always complete
+        self._stream = self.filesystem.open_output_stream(path + PART_SUFFIX)
+        try:
+            self._writer = pq.ParquetWriter(self._stream, schema, compression=compression, **get_encodings(schema))
+        except BaseException:
+            self._stream.close()
+            self.filesystem.delete_file(path + PART_SUFFIX)
+            raise
+        self.write_time_s += time.perf_counter() - start
+
+    def write(self, table: pa.Table) -> None:
+        if table.num_rows == 0:
+            return
+
+        start = time.perf_counter()
+        self._writer.write_table(table)
+        self.write_time_s += time.perf_counter() - start
+        self.rows += table.num_rows
+
+    def close(self) -> None:
+        if self._writer is None:
+            return
+
+        start = time.perf_counter()
+        self._writer.close()
+        self._stream.close()
+        self.filesystem.move(self.path + PART_SUFFIX, self.path)
+        self.write_time_s += time.perf_counter() - start
+        self._writer = None
+
+    def report(self) -> dict:
+        size = self.filesystem.get_file_info(self.path).size
+        return dict(
+            path=self.path,
+            rows=self.rows,
+            bytes=size,
+            bytes_per_row=size / self.rows if self.rows else None,
+            write_time_s=self.write_time_s,
+            compression=self.compression,
+        )
+
+    def __enter__(self):
+        return self
+
+    def abort(self) -> None:
+        """Close without publishing, dropping what was written so far"""
+        if self._writer is None:
+            return
+
+        self._writer.close()
+        self._stream.close()
+        self.filesystem.delete_file(self.path + PART_SUFFIX)
+        self._writer = None
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        if exc_type is None:
+            self.close()
+        else:
+            self.abort()
@@ -2,60 +2,565 @@
 # coding: utf-8
 
 import argparse
+import collections
+import contextlib
+import functools
+import math
+import os
 import pickle
+import queue
+import sys
+import threading
+import time
+from concurrent.futures import ProcessPoolExecutor
 
+import numpy as np
 import pandas as pd
+import pyarrow as pa
+import pyarrow.compute as pc
+import pyarrow.parquet as pq
+
+from sinks import COMPRESSIONS, PredictionSink, output_exists
+from tripdata import get_default_cache, is_remote, resolve_location
 
 
 BASE_URL = "https://d37ci6vzurychx.cloudfront.net/trip-data"
 CATEGORICAL = ["PULocationID", "DOLocationID"]
+DATETIMES = ["tpep_pickup_datetime", "tpep_dropoff_datetime"]
+DEFAULT_CHUNK_SIZE = 1_000_000
+STATS_RTOL = 1e-12  # running mean and std against numpy ones over all predictions
+OUTPUT_SCHEMA = pa.schema([("ride_id", pa.string()), ("predictions", pa.float64())])
+# ride_id packed as integer YYYYMM * 10^10 + row position, e.g. 2022020000012345
+PACKED_OUTPUT_SCHEMA = pa.schema([("ride_id", pa.int64()), ("predictions", pa.float64())])
+RIDE_ID_ENCODINGS = dict(string=OUTPUT_SCHEMA, packed=PACKED_OUTPUT_SCHEMA)
+
+
+def build_duration_mask(table: pa.Table, min_duration=1, max_duration=60):
+    duration_ms = pc.milliseconds_between(table["tpep_pickup_datetime"], table["tpep_dropoff_datetime"])
+    mask = pc.and_(
+        pc.greater_equal(duration_ms, min_duration * 60_000),
+        pc.less_equal(duration_ms, max_duration * 60_000),
+    )
+
+    return pc.fill_null(mask, False)
+
+
+def read_data(filename, columns=None):
+    """Read only required columns and filter outliers on Arrow side
+
+    Row positions in file are kept as index since they make up ride_id.
+    """
+    if columns is None:
+        columns = DATETIMES + CATEGORICAL
+
+    table = pq.read_table(resolve_location(filename), columns=columns)
+
+    return prepare_data(table)
+
+
+def iter_data(filename, columns=None, chunk_size=DEFAULT_CHUNK_SIZE):
+    """Yield frames as read_data does, decoding at most chunk_size rows at a time
+
+    Index keeps row positions in whole file, so ride_id matches non-streaming path.
+    """
+    if columns is None:
+        columns = DATETIMES + CATEGORICAL
+
+    parquet_file = pq.ParquetFile(resolve_location(filename))
+    offset = 0
+    for batch in parquet_file.iter_batches(batch_size=chunk_size, columns=columns):
+        yield prepare_data(pa.Table.from_batches([batch]), offset)
+        offset += batch.num_rows
+
 
+def prepare_data(table: pa.Table, offset=0):
+    mask = build_duration_mask(table)
+    index = pc.indices_nonzero(mask).to_numpy() + offset
+    df = table.filter(mask).to_pandas()
+    df.index = index
 
-def read_data(filename):
-    df = pd.read_parquet(filename)
-    
     df["duration"] = df.tpep_dropoff_datetime - df.tpep_pickup_datetime
     df["duration"] = df.duration.dt.total_seconds() / 60
 
-    df = df[(df.duration >= 1) & (df.duration <= 60)].copy()
+    # missing location IDs become -1, kept as integers for coefficient table lookups
+    df[CATEGORICAL] = df[CATEGORICAL].fillna(-1).astype("int")
 
-    df[CATEGORICAL] = df[CATEGORICAL].fillna(-1).astype("int").astype("str")
-    
     return df
 
 
+def load_model(model_file="model.bin"):
+    with open(model_file, "rb") as f_in:
+        dv, model = pickle.load(f_in)
+
+    return dv, model
+
+
+def predict(df, dv, model):
+    dicts = df[CATEGORICAL].astype("str").to_dict(orient="records")
+    X_val = dv.transform(dicts)
+    y_pred = model.predict(X_val)
+
+    return y_pred
+
+
+def compile_table(dv, model):
+    """Coefficient table of one-hot linear model over integer location IDs
+
+    Row 0 holds intercept, then one row per categorical column in DictVectorizer
+    feature order, where column j holds coefficient of location ID j - 1 (so -1,
+    missing IDs, lands in column 0). IDs unseen by DictVectorizer get zero, as their
+    one-hot features are dropped. Raises ValueError for models which are not a
+    sum of per-location coefficients.
+    """
+    coef = getattr(model, "coef_", None)
+    if not type(model).__module__.startswith("sklearn.linear_model") or np.ndim(coef) != 1:
+        raise ValueError(f"Not a single-output linear model: {type(model).__name__}")
+
+    entries = []
+    for name, weight in zip(dv.get_feature_names_out(), coef):
+        (col, _, value) = name.partition("=")
+        if col not in CATEGORICAL or not value.lstrip("-").isdigit() or int(value) < -1:
+            raise ValueError(f"Unsupported feature: {name}")
+        entries.append((col, int(value), weight))
+
+    columns = sorted(set(col for (col, _, _) in entries))
+    if columns != sorted(CATEGORICAL):
+        raise ValueError(f"Expected one-hot features of {CATEGORICAL}, got {columns}")
+
+    table = np.zeros((1 + len(columns), max(value for (_, value, _) in entries) + 2))
+    table[0, 0] = model.intercept_
+    for col, value, weight in entries:
+        table[1 + columns.index(col), value + 1] = weight
+
+    return table
+
+
+def load_table(table_file):
+    """Memory-mapped coefficient table written by --export-table"""
+    return np.load(table_file, mmap_mode="r")
+
+
+def predict_table(df, table):
+    """Same predictions as predict for compiled models, through vectorized gathers"""
+    columns = sorted(CATEGORICAL)
+    # summing in DictVectorizer feature order and adding intercept last, as sparse dot product does
+    y_pred = np.zeros(len(df))
+    for row, col in enumerate(columns, start=1):
+        ids = df[col].to_numpy() + 1
+        known = (ids >= 0) & (ids < table.shape[1])
+        y_pred += np.where(known, table[row][ids.clip(0, table.shape[1] - 1)], 0.0)
+
+    return y_pred + table[0, 0]
+
+
+def load_predictor(model_file="model.bin", table_file=None):
+    """Prediction function of df, through coefficient table when available"""
+    if table_file is not None and os.path.exists(table_file):
+        return functools.partial(predict_table, table=load_table(table_file))
+    if table_file is not None:
+        print(f"Coefficient table {table_file} not found, using {model_file}", file=sys.stderr)
+
+    dv, model = load_model(model_file)
+    return functools.partial(predict, dv=dv, model=model)
+
+
+def make_output(df, y_pred, year, month, ride_id_encoding="string"):
+    if ride_id_encoding == "packed":
+        ride_id = (year * 100 + month) * 10**10 + df.index.to_numpy(dtype="int64")
+    else:
+        ride_id = f"{year:04d}/{month:02d}_" + df.index.astype("str")
+
+    schema = RIDE_ID_ENCODINGS[ride_id_encoding]
+    return pa.table(dict(ride_id=pa.array(ride_id, schema.field("ride_id").type), predictions=y_pred), schema=schema)
+
+
+class RunningStats:
+    """Mean and standard deviation updated chunk by chunk
+
+    Chunk statistics are merged with Chan et al. parallel form of Welford algorithm,
+    std is population one as numpy.std computes by default. Summation order differs
+    from numpy pairwise one over all values, so results match numpy ones within
+    STATS_RTOL (a few units in last place) rather than exactly.
+    """
+
+    def __init__(self):
+        self.count = 0
+        self.mean = 0.0
+        self.m2 = 0.0
+
+    def update(self, values):
+        count = len(values)
+        if count == 0:
+            return
+
+        mean = values.mean()
+        m2 = ((values - mean) ** 2).sum()
+
+        total = self.count + count
+        delta = mean - self.mean
+        self.mean += delta * count / total
+        self.m2 += m2 + delta**2 * self.count * count / total
+        self.count = total
+
+    @property
+    def std(self):
+        return math.sqrt(self.m2 / self.count) if self.count else float("nan")
+
+
+def write_outputs(outputs, sink=None):
+    """Append output tables in given order to sink, returning stats of their predictions"""
+    stats = RunningStats()
+    for output in outputs:
+        stats.update(output["predictions"].to_numpy())
+        if sink is not None:
+            sink.write(output)
+
+    return stats
+
+
+def score_streaming(
+    filename,
+    predict_fn,
+    year,
+    month,
+    sink=None,
+    chunk_size=DEFAULT_CHUNK_SIZE,
+    ride_id_encoding="string",
+):
+    """Score chunk by chunk appending to sink, memory is bounded by chunk size"""
+    outputs = (
+        make_output(df, predict_fn(df), year, month, ride_id_encoding)
+        for df in iter_data(filename, chunk_size=chunk_size)
+        if not df.empty
+    )
+
+    return write_outputs(outputs, sink)
+
+
+__worker_predict = None
+
+
+def __init_worker(model_file, table_file):
+    global __worker_predict
+    __worker_predict = load_predictor(model_file, table_file)
+
+
+def score_row_group(file_path, row_group, offset, year, month, ride_id_encoding="string"):
+    """Score one row group with model loaded by worker, offset is row position of group in file"""
+    table = pq.ParquetFile(file_path).read_row_group(row_group, columns=DATETIMES + CATEGORICAL)
+    df = prepare_data(table, offset)
+    if df.empty:
+        return RIDE_ID_ENCODINGS[ride_id_encoding].empty_table()
+
+    return make_output(df, __worker_predict(df), year, month, ride_id_encoding)
+
+
+def score_parallel(
+    filename,
+    year,
+    month,
+    workers,
+    sink=None,
+    model_file="model.bin",
+    table_file=None,
+    ride_id_encoding="string",
+):
+    """Score row groups on a process pool, merging outputs in row group (ride_id) order
+
+    Each worker loads model once, parallelism is bounded by number of row groups.
+    """
+    file_path = resolve_location(filename)
+    metadata = pq.ParquetFile(file_path).metadata
+    row_counts = [metadata.row_group(i).num_rows for i in range(metadata.num_row_groups)]
+    offsets = [sum(row_counts[:i]) for i in range(len(row_counts))]
+
+    with ProcessPoolExecutor(max_workers=workers, initializer=__init_worker, initargs=(model_file, table_file)) as executor:
+        outputs = executor.map(
+            score_row_group,
+            [file_path] * len(offsets),
+            range(len(offsets)),
+            offsets,
+            [year] * len(offsets),
+            [month] * len(offsets),
+            [ride_id_encoding] * len(offsets),
+        )
+        return write_outputs(outputs, sink)
+
+
+def score_month(
+    source,
+    year,
+    month,
+    output_file=None,
+    streaming=False,
+    chunk_size=DEFAULT_CHUNK_SIZE,
+    workers=1,
+    model_file="model.bin",
+    table_file=None,
+    compression="none",
+    ride_id_encoding="string",
+    partitioned=False,
+    endpoint_url=None,
+):
+    """Score one month, output is only published once every prediction was written
+
+    Sink is aborted on any failure, dropping its ".part" file.
+    """
+    filename = f"{source}/yellow_tripdata_{year}-{month:02d}.parquet"
+
+    with contextlib.ExitStack() as stack:
+        sink = None
+        if output_file:
+            sink = stack.enter_context(
+                PredictionSink(
+                    output_file,
+                    RIDE_ID_ENCODINGS[ride_id_encoding],
+                    compression=compression,
+                    partition=(year, month) if partitioned else None,
+                    endpoint_url=endpoint_url,
+                )
+            )
+
+        if workers > 1 or streaming:
+            if workers > 1:
+                stats = score_parallel(
+                    filename, year, month, workers, sink, model_file, table_file, ride_id_encoding
+                )
+            else:
+                predict_fn = load_predictor(model_file, table_file)
+                stats = score_streaming(filename, predict_fn, year, month, sink, chunk_size, ride_id_encoding)
+            if is_remote(source):
+                print(f"Trip data cache: {get_default_cache().stats()}")
+
+            print(f"Predictions stats for {year}-{month:02d}")
+            print(f"Mean: {stats.mean}")
+            print(f"Standard deviation: {stats.std}")
+        else:
+            df = read_data(filename)
+            if is_remote(source):
+                print(f"Trip data cache: {get_default_cache().stats()}")
+
+            predict_fn = load_predictor(model_file, table_file)
+            y_pred = predict_fn(df)
+
+            print(f"Predictions stats for {year}-{month:02d}")
+            print(f"Mean: {y_pred.mean()}")
+            print(f"Standard deviation: {y_pred.std()}")
+
+            if sink is not None:
+                sink.write(make_output(df, y_pred, year, month, ride_id_encoding))
+
+    if sink is not None:
+        print(f"Output: {sink.report()}")
+
+
+__STAGE_DONE = object()
+
+
+def __put(outbox, item, stop):
+    """Put item into bounded queue unless pipeline was stopped meanwhile"""
+    while not stop.is_set():
+        try:
+            outbox.put(item, timeout=0.1)
+            return True
+        except queue.Full:
+            pass
+
+    return False
+
+
+def __drain(inbox, stop):
+    """Items of upstream stage until it is done or pipeline stopped, re-raising its exception"""
+    while not stop.is_set():
+        try:
+            item = inbox.get(timeout=0.1)
+        except queue.Empty:
+            continue
+        if item is __STAGE_DONE:
+            return
+        if isinstance(item, Exception):
+            raise item
+        yield item
+
+
+def __run_stage(fn, items, outbox, stop, busy_s):
+    try:
+        for item in items:
+            start = time.perf_counter()
+            result = fn(item)
+            busy_s[fn.__name__] += time.perf_counter() - start
+            if not __put(outbox, result, stop):
+                return
+        result = __STAGE_DONE
+    except Exception as e:
+        result = e
+    __put(outbox, result, stop)
+
+
+def run_pipeline(items, stages, queue_size=1, busy_s=None):
+    """Yield items mapped through stages, each on its own thread
+
+    Stages are connected by queues of queue_size items, so stage N works on item
+    i + 1 while stage N + 1 works on item i and memory is bounded. Busy seconds of
+    each stage are accumulated into busy_s when given, keyed by function name.
+    """
+    if busy_s is None:
+        busy_s = collections.defaultdict(float)
+
+    stop = threading.Event()
+    threads = []
+    for fn in stages:
+        outbox = queue.Queue(maxsize=queue_size)
+        threads.append(threading.Thread(target=__run_stage, args=(fn, items, outbox, stop, busy_s), daemon=True))
+        threads[-1].start()
+        items = __drain(outbox, stop)
+
+    try:
+        yield from items
+    finally:
+        stop.set()
+        for thread in threads:
+            thread.join()
+
+
+def iter_months(start, end):
+    """(year, month) pairs from start to end "YYYY-MM" months, both included"""
+    (year, month) = map(int, start.split("-"))
+    (end_year, end_month) = map(int, end.split("-"))
+    while (year, month) <= (end_year, end_month):
+        yield (year, month)
+        (year, month) = (year + month // 12, month % 12 + 1)
+
+
+def backfill(
+    months,
+    source,
+    output_file,
+    predict_fn,
+    partitioned=False,
+    compression="none",
+    ride_id_encoding="string",
+    endpoint_url=None,
+    queue_size=1,
+):
+    """Score months with one loaded model, overlapping read, score and write stages
+
+    output_file is a base directory when partitioned, otherwise a path formatted
+    with year and month, e.g. "output/{year:04d}-{month:02d}.parquet". Months whose
+    output already exists are skipped. Returns (year, month, stats) of scored months.
+    """
+
+    def get_output(year, month):
+        if partitioned:
+            return (output_file, (year, month))
+        return (output_file.format(year=year, month=month), None)
+
+    pending = []
+    for year, month in months:
+        if output_exists(*get_output(year, month), endpoint_url):
+            print(f"Skipping {year}-{month:02d}, output already exists")
+        else:
+            pending.append((year, month))
+
+    def read(item):
+        (year, month) = item
+        return (year, month, read_data(f"{source}/yellow_tripdata_{year}-{month:02d}.parquet"))
+
+    def score(item):
+        (year, month, df) = item
+        y_pred = predict_fn(df)
+        return (year, month, make_output(df, y_pred, year, month, ride_id_encoding))
+
+    def write(item):
+        (year, month, output) = item
+        (path, partition) = get_output(year, month)
+        with PredictionSink(
+            path, output.schema, compression=compression, partition=partition, endpoint_url=endpoint_url
+        ) as sink:
+            stats = write_outputs([output], sink)
+        print(f"{year}-{month:02d}: mean {stats.mean}, std {stats.std}, output {sink.report()}")
+        return (year, month, stats)
+
+    busy_s = collections.defaultdict(float)
+    start = time.perf_counter()
+    results = list(run_pipeline(pending, [read, score, write], queue_size, busy_s))
+    elapsed = time.perf_counter() - start
+
+    busy = ", ".join(f"{name} {seconds:.2f}s" for name, seconds in busy_s.items())
+    print(f"Backfill: {len(results)} months scored in {elapsed:.2f}s, stage busy time: {busy}")
+
+    return results
+
+
 if __name__ == "__main__":
     parser = argparse.ArgumentParser()
 
     parser.add_argument("--month", default=2, type=int)
-    parser.add_argument("--output-file", default=None, required=False)
+    parser.add_argument("--output-file", default=None, required=False, help="local path or s3:// URI")
+    parser.add_argument("--source", default=BASE_URL, help="directory or URL of trip data files")
     parser.add_argument("--year", default=2022, type=int)
+    parser.add_argument("--streaming", action="store_true", help="score chunk by chunk in bounded memory")
+    parser.add_argument("--chunk-size", default=DEFAULT_CHUNK_SIZE, type=int, help="rows per chunk when streaming")
+    parser.add_argument("--workers", default=1, type=int, help="processes scoring row groups in parallel")
+    parser.add_argument("--model-file", default="model.bin")
+    parser.add_argument("--table-file", default=None, help="coefficient table used instead of model file")
+    parser.add_argument("--export-table", default=None, metavar="TABLE_FILE", help="compile model file and exit")
+    parser.add_argument("--compression", default="none", choices=COMPRESSIONS)
+    parser.add_argument("--ride-id-encoding", default="string", choices=list(RIDE_ID_ENCODINGS))
+    parser.add_argument("--partitioned", action="store_true", help="output file is base of year=/month= partitions")
+    parser.add_argument("--s3-endpoint-url", default=None, help="S3-compatible endpoint, e.g. MinIO")
+    parser.add_argument("--from", dest="from_month", default=None, metavar="YYYY-MM", help="first month to backfill")
+    parser.add_argument("--to", dest="to_month", default=None, metavar="YYYY-MM", help="last month to backfill")
+    parser.add_argument("--queue-size", default=1, type=int, help="months buffered between backfill stages")
 
     args = parser.parse_args()
 
-    month = args.month
-    output_file = args.output_file
-    year = args.year
+    if args.export_table:
+        try:
+            table = compile_table(*load_model(args.model_file))
+        except ValueError as e:
+            sys.exit(f"Model can't be compiled, keep scoring with {args.model_file}: {e}")
+        np.save(args.export_table, table)
+        print(f"Coefficient table {table.shape} saved to {args.export_table}")
+        sys.exit(0)
 
-    df = read_data(f"{BASE_URL}/yellow_tripdata_{year}-{month:02d}.parquet")
+    if args.from_month or args.to_month:
+        if not (args.from_month and args.to_month and args.output_file):
+            parser.error("backfill requires --from, --to and --output-file")
+        if not args.partitioned and "{month" not in args.output_file:
+            parser.error("backfill output file needs {year} and {month} placeholders unless --partitioned")
+        if args.queue_size < 1:
+            parser.error("--queue-size must be at least 1")
+        if args.streaming or args.workers > 1:
+            parser.error("backfill scores whole months, --streaming and --workers don't apply")
 
-    with open("model.bin", "rb") as f_in:
-        dv, model = pickle.load(f_in)
-
-    dicts = df[CATEGORICAL].to_dict(orient="records")
-    X_val = dv.transform(dicts)
-    y_pred = model.predict(X_val)
-
-    print(f"Predictions stats for {year}-{month:02d}")
-    print(f"Mean: {y_pred.mean()}")
-    print(f"Standard deviation: {y_pred.std()}")
-
-    if output_file:
-        df["ride_id"] = f"{year:04d}/{month:02d}_" + df.index.astype("str")
-        df["predictions"] = y_pred
-        df[["ride_id", "predictions"]].to_parquet(
-            output_file,
-            engine="pyarrow",
-            compression=None,
-            index=False
+        backfill(
+            iter_months(args.from_month, args.to_month),
+            args.source.rstrip("/\\"),
+            args.output_file,
+            load_predictor(args.model_file, args.table_file),
+            partitioned=args.partitioned,
+            compression=args.compression,
+            ride_id_encoding=args.ride_id_encoding,
+            endpoint_url=args.s3_endpoint_url,
+            queue_size=args.queue_size,
         )
+        if is_remote(args.source):
+            print(f"Trip data cache: {get_default_cache().stats()}")
+        sys.exit(0)
+
+    score_month(
+        args.source.rstrip("/\\"),
+        args.year,
+        args.month,
+        args.output_file,
+        streaming=args.streaming,
+        chunk_size=args.chunk_size,
+        workers=args.workers,
+        model_file=args.model_file,
+        table_file=args.table_file,
+        compression=args.compression,
+        ride_id_encoding=args.ride_id_encoding,
+        partitioned=args.partitioned,
+        endpoint_url=args.s3_endpoint_url,
+    )
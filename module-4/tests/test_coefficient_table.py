@@ -0,0 +1,76 @@
+import pickle
+
+import numpy as np
+import pandas as pd
+import pytest
+from sklearn.feature_extraction import DictVectorizer
+from sklearn.linear_model import LinearRegression, Ridge
+from sklearn.tree import DecisionTreeRegressor
+
+import starter
+
+
+N_TRAIN = 3000
+
+
+def fit_model(model):
+    """DictVectorizer and model over one-hot location IDs 1..49, some pickups missing (-1)"""
+    rng = np.random.default_rng(0)
+    df = pd.DataFrame({"PULocationID": rng.integers(1, 50, N_TRAIN), "DOLocationID": rng.integers(1, 50, N_TRAIN)})
+    df.loc[rng.random(N_TRAIN) < 0.05, "PULocationID"] = -1
+    y = rng.gamma(2.0, 7.0, N_TRAIN) + 0.1 * df["PULocationID"]
+
+    dv = DictVectorizer()
+    X = dv.fit_transform(df[starter.CATEGORICAL].astype("str").to_dict(orient="records"))
+
+    return (dv, model.fit(X, y))
+
+
+@pytest.fixture
+def scoring_frame():
+    """Known IDs, missing ones, and IDs unseen in training below and beyond table width"""
+    rng = np.random.default_rng(1)
+    known = pd.DataFrame({"PULocationID": rng.integers(1, 50, 500), "DOLocationID": rng.integers(1, 50, 500)})
+    unseen = pd.DataFrame(
+        {"PULocationID": [-1, 0, 50, 264, 10**9, 7], "DOLocationID": [3, -1, 265, 0, 12, 10**9]}
+    )
+    return pd.concat([known, unseen], ignore_index=True)
+
+
+@pytest.mark.parametrize("model", [LinearRegression(), Ridge(alpha=0.5)])
+def test_table_predictions_equal_model(scoring_frame, model):
+    (dv, model) = fit_model(model)
+    table = starter.compile_table(dv, model)
+
+    np.testing.assert_array_equal(
+        starter.predict_table(scoring_frame, table), starter.predict(scoring_frame, dv, model)
+    )
+
+
+def test_load_predictor_through_table_file(scoring_frame, tmp_path, capsys):
+    (dv, model) = fit_model(LinearRegression())
+    model_file = tmp_path / "model.bin"
+    with open(model_file, "wb") as file:
+        pickle.dump((dv, model), file)
+    table_file = tmp_path / "model.npy"
+    np.save(table_file, starter.compile_table(dv, model))
+
+    expected = starter.predict(scoring_frame, dv, model)
+    table_predict = starter.load_predictor(str(model_file), str(table_file))
+    np.testing.assert_array_equal(table_predict(scoring_frame), expected)
+
+    # missing table falls back to pickled model
+    fallback_predict = starter.load_predictor(str(model_file), str(tmp_path / "missing.npy"))
+    np.testing.assert_array_equal(fallback_predict(scoring_frame), expected)
+    assert "not found" in capsys.readouterr().err
+
+
+def test_unsupported_models_fail_to_compile():
+    with pytest.raises(ValueError, match="Not a single-output linear model"):
+        starter.compile_table(*fit_model(DecisionTreeRegressor(max_depth=3)))
+
+    (dv, model) = fit_model(LinearRegression())
+    dv_distance = DictVectorizer().fit([dict(PULocationID="1", DOLocationID="2", trip_distance=1.0)])
+    model.coef_ = np.zeros(len(dv_distance.feature_names_))
+    with pytest.raises(ValueError, match="Unsupported feature"):
+        starter.compile_table(dv_distance, model)
@@ -0,0 +1,82 @@
+import asyncio
+import json
+
+import pytest
+
+import serve
+
+
+def predict_sum(df):
+    """Stand-in model, failing on rides picked up at location 13"""
+    if (df["PULocationID"] == 13).any():
+        raise RuntimeError("scoring failed")
+
+    return df["PULocationID"].to_numpy() + 0.5 * df["DOLocationID"].to_numpy()
+
+
+async def send(port, body, path="/predict"):
+    """(status, payload) of one request, along with a second one on same connection"""
+    (reader, writer) = await asyncio.open_connection("127.0.0.1", port)
+    responses = []
+    for request_path, request_body in [(path, body), ("/health", None)]:
+        method = "GET" if request_body is None else "POST"
+        data = b"" if request_body is None else request_body.encode()
+        writer.write(f"{method} {request_path} HTTP/1.1\r\nContent-Length: {len(data)}\r\n\r\n".encode() + data)
+        await writer.drain()
+
+        (_, status, _) = (await reader.readline()).decode().split(" ", 2)
+        headers = dict()
+        while (line := await reader.readline()) not in (b"\r\n", b""):
+            (name, _, value) = line.decode().partition(":")
+            headers[name.strip().lower()] = value.strip()
+        responses.append((int(status), json.loads(await reader.readexactly(int(headers["content-length"])))))
+    writer.close()
+
+    assert responses[1] == (200, dict(status="ok")), "connection was not kept open"
+    return responses[0]
+
+
+async def send_together(*bodies):
+    """Responses to bodies sent concurrently, so their rides share micro-batches"""
+    batcher = serve.MicroBatcher(predict_sum, max_batch_size=64, max_wait_ms=50)
+    batching = asyncio.create_task(batcher.run())
+    server = await asyncio.start_server(
+        lambda reader, writer: serve.serve_connection(batcher, reader, writer), "127.0.0.1", 0
+    )
+    port = server.sockets[0].getsockname()[1]
+    try:
+        return (await asyncio.gather(*[send(port, body) for body in bodies]), batcher)
+    finally:
+        server.close()
+        await server.wait_closed()
+        batching.cancel()
+
+
+def test_mixed_batch_answers_every_request():
+    (responses, batcher) = asyncio.run(
+        send_together(
+            '{"PULocationID": 10, "DOLocationID": 50}',
+            '{"PULocationID": 100000000000000000000, "DOLocationID": 50}',
+            '[{"PULocationID": 13, "DOLocationID": 1}, {"PULocationID": 2}]',
+            '[{"PULocationID": 7, "DOLocationID": 4}, {"DOLocationID": 8}]',
+            '{"PULocationID": Infinity}',
+            '{"PULocationID": "abc"}',
+            '{"PULocationID": -2}',
+        )
+    )
+    statuses = [status for (status, _) in responses]
+
+    assert statuses == [200, 400, 500, 200, 400, 400, 400]
+    assert responses[0][1] == dict(duration=35.0)
+    assert "out of range" in responses[1][1]["error"]
+    assert "scoring failed" in responses[2][1]["error"]
+    assert responses[3][1] == [dict(duration=9.0), dict(duration=3.0)]
+    assert batcher.rides == 4
+
+
+def test_parse_ride():
+    assert serve.parse_ride({"PULocationID": 10, "DOLocationID": None}) == dict(PULocationID=10, DOLocationID=-1)
+    assert serve.parse_ride({"PULocationID": serve.MAX_LOCATION_ID})["PULocationID"] == serve.MAX_LOCATION_ID
+    for value in [serve.MAX_LOCATION_ID + 1, -2, float("nan"), [1]]:
+        with pytest.raises(ValueError):
+            serve.parse_ride({"PULocationID": value})
@@ -0,0 +1,181 @@
+import glob
+import os
+import pickle
+import socket
+import urllib.request
+
+import numpy as np
+import pandas as pd
+import pyarrow.fs as pafs
+import pyarrow.parquet as pq
+import pytest
+from sklearn.feature_extraction import DictVectorizer
+from sklearn.linear_model import LinearRegression
+
+import starter
+from sinks import PART_SUFFIX, PredictionSink, get_filesystem, get_output_path, output_exists
+
+
+YEAR, MONTH = 2022, 2
+N_ROWS = 5000
+
+
+@pytest.fixture
+def source(tmp_path):
+    """Directory holding one month of yellow trips, a third of them outliers"""
+    rng = np.random.default_rng(0)
+    pickup = pd.Timestamp(f"{YEAR}-{MONTH:02d}-01") + pd.to_timedelta(rng.integers(0, 27 * 86400, N_ROWS), unit="s")
+    df = pd.DataFrame(
+        {
+            "tpep_pickup_datetime": pickup,
+            "tpep_dropoff_datetime": pickup + pd.to_timedelta(rng.integers(0, 90 * 60, N_ROWS), unit="s"),
+            "PULocationID": rng.integers(1, 50, N_ROWS),
+            "DOLocationID": rng.integers(1, 50, N_ROWS),
+        }
+    )
+    directory = tmp_path / "source"
+    directory.mkdir()
+    df.to_parquet(directory / f"yellow_tripdata_{YEAR}-{MONTH:02d}.parquet", row_group_size=1000)
+
+    return str(directory)
+
+
+@pytest.fixture
+def model_file(source, tmp_path):
+    df = starter.read_data(f"{source}/yellow_tripdata_{YEAR}-{MONTH:02d}.parquet")
+    dv = DictVectorizer()
+    X = dv.fit_transform(df[starter.CATEGORICAL].astype("str").to_dict(orient="records"))
+    model = LinearRegression().fit(X, df["duration"])
+
+    file_path = tmp_path / "model.bin"
+    with open(file_path, "wb") as file:
+        pickle.dump((dv, model), file)
+
+    return str(file_path)
+
+
+def list_part_files(directory):
+    return glob.glob(os.path.join(directory, "**", f"*{PART_SUFFIX}"), recursive=True)
+
+
+@pytest.mark.parametrize(
+    "kwargs",
+    [dict(), dict(streaming=True, chunk_size=700), dict(workers=2), dict(partitioned=True, compression="zstd")],
+)
+def test_score_month_publishes_complete_output(source, model_file, tmp_path, kwargs):
+    output_dir = tmp_path / "output"
+    output_file = str(output_dir if kwargs.get("partitioned") else output_dir / "predictions.parquet")
+    starter.score_month(source, YEAR, MONTH, output_file, model_file=model_file, **kwargs)
+
+    (filesystem, path) = get_output_path(output_file, (YEAR, MONTH) if kwargs.get("partitioned") else None)
+    expected_rows = len(starter.read_data(f"{source}/yellow_tripdata_{YEAR}-{MONTH:02d}.parquet"))
+    assert pq.read_table(path).num_rows == expected_rows
+    assert list_part_files(str(output_dir)) == []
+
+
+@pytest.mark.parametrize("kwargs", [dict(), dict(streaming=True, chunk_size=700)])
+def test_score_month_failure_leaves_nothing(source, model_file, tmp_path, monkeypatch, kwargs):
+    def failing_predictor(*args, **kwargs):
+        def predict_fn(df):
+            raise RuntimeError("scoring failed")
+
+        return predict_fn
+
+    monkeypatch.setattr(starter, "load_predictor", failing_predictor)
+    output_dir = tmp_path / "output"
+    output_dir.mkdir()
+
+    with pytest.raises(RuntimeError, match="scoring failed"):
+        starter.score_month(source, YEAR, MONTH, str(output_dir / "predictions.parquet"), model_file=model_file, **kwargs)
+
+    assert os.listdir(output_dir) == []
+
+
+def score_to_frame(source, model_file, output_file, capsys, **kwargs):
+    """(output DataFrame, printed (mean, std)) of score_month"""
+    starter.score_month(source, YEAR, MONTH, str(output_file), model_file=model_file, **kwargs)
+    printed = dict(line.split(": ", 1) for line in capsys.readouterr().out.splitlines() if ": " in line)
+
+    return (pd.read_parquet(output_file), (float(printed["Mean"]), float(printed["Standard deviation"])))
+
+
+@pytest.mark.parametrize(
+    "kwargs",
+    [
+        dict(streaming=True, chunk_size=700),
+        dict(streaming=True, chunk_size=N_ROWS),
+        # 5 row groups, more than workers so each one scores several in turn
+        dict(workers=2),
+        dict(workers=2, ride_id_encoding="packed"),
+    ],
+)
+def test_scoring_modes_match_in_memory(source, model_file, tmp_path, capsys, kwargs):
+    ride_id_encoding = kwargs.get("ride_id_encoding", "string")
+    (expected, expected_stats) = score_to_frame(
+        source, model_file, tmp_path / "in_memory.parquet", capsys, ride_id_encoding=ride_id_encoding
+    )
+    (actual, stats) = score_to_frame(source, model_file, tmp_path / "actual.parquet", capsys, **kwargs)
+
+    pd.testing.assert_frame_equal(actual, expected)
+    assert stats == pytest.approx(expected_stats, rel=starter.STATS_RTOL)
+
+
+def test_running_stats_merge_chunks():
+    values = np.random.default_rng(0).gamma(2.0, 7.0, 10_001)
+    stats = starter.RunningStats()
+    for chunk in np.array_split(values, 13):
+        stats.update(chunk)
+    stats.update(values[:0])
+
+    assert stats.count == len(values)
+    assert (stats.mean, stats.std) == pytest.approx((values.mean(), values.std()), rel=starter.STATS_RTOL)
+
+
+def get_free_port():
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+@pytest.fixture
+def s3_endpoint(monkeypatch):
+    """Local S3 stand-in serving a "predictions" bucket"""
+    server_module = pytest.importorskip("moto.server")
+    boto3 = pytest.importorskip("boto3")
+
+    monkeypatch.setenv("AWS_ACCESS_KEY_ID", "testing")
+    monkeypatch.setenv("AWS_SECRET_ACCESS_KEY", "testing")
+    monkeypatch.setenv("AWS_DEFAULT_REGION", "us-east-1")
+
+    port = get_free_port()
+    server = server_module.ThreadedMotoServer(ip_address="127.0.0.1", port=port)
+    server.start()
+    endpoint_url = f"http://127.0.0.1:{port}"
+    # backend state lives in process, shared by servers of previous tests
+    urllib.request.urlopen(urllib.request.Request(f"{endpoint_url}/moto-api/reset", method="POST"))
+    boto3.client("s3", endpoint_url=endpoint_url).create_bucket(Bucket="predictions")
+    yield endpoint_url
+    server.stop()
+
+
+def list_s3_keys(endpoint_url):
+    (filesystem, path) = get_filesystem("s3://predictions", endpoint_url)
+    selector = pafs.FileSelector(path, recursive=True)
+    return sorted(info.path for info in filesystem.get_file_info(selector) if info.type == pafs.FileType.File)
+
+
+def test_s3_output_is_moved_into_place(source, model_file, s3_endpoint):
+    starter.score_month(
+        source, YEAR, MONTH, "s3://predictions", model_file=model_file, partitioned=True, endpoint_url=s3_endpoint
+    )
+
+    assert list_s3_keys(s3_endpoint) == [f"predictions/year={YEAR}/month={MONTH:02d}/predictions.parquet"]
+    assert output_exists("s3://predictions", (YEAR, MONTH), s3_endpoint)
+
+
+def test_s3_failed_write_is_aborted(s3_endpoint):
+    with pytest.raises(RuntimeError):
+        with PredictionSink("s3://predictions", starter.OUTPUT_SCHEMA, partition=(YEAR, MONTH), endpoint_url=s3_endpoint):
+            raise RuntimeError("scoring failed")
+
+    assert list_s3_keys(s3_endpoint) == []
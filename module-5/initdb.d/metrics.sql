@@ -1,5 +1,5 @@
 CREATE TABLE metrics (
-    timestamp TIMESTAMP,
+    timestamp TIMESTAMP PRIMARY KEY,
     prediction_drift FLOAT,
     num_drifted_columns INTEGER,
     share_missing_values FLOAT,
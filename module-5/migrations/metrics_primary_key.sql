@@ -0,0 +1,18 @@
+-- Adds primary key on timestamp to metrics tables created before it was part of
+-- initdb.d/metrics.sql, as METRICS_INSERT_QUERY upserts on it. Rows without
+-- timestamp are deleted and duplicated timestamps keep their last inserted row.
+-- Running it again on a migrated table does nothing.
+DO $$
+BEGIN
+    IF NOT EXISTS (
+        SELECT 1
+        FROM pg_index i
+        JOIN pg_attribute a ON a.attrelid = i.indrelid AND a.attnum = i.indkey[0]
+        WHERE i.indrelid = to_regclass('metrics') AND i.indisunique AND i.indnatts = 1 AND a.attname = 'timestamp'
+    ) THEN
+        DELETE FROM metrics WHERE timestamp IS NULL;
+        DELETE FROM metrics m USING metrics newer WHERE m.timestamp = newer.timestamp AND m.ctid < newer.ctid;
+        ALTER TABLE metrics ADD PRIMARY KEY (timestamp);
+    END IF;
+END
+$$;
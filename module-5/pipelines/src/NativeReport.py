@@ -0,0 +1,226 @@
+"""Drift report computed with NumPy and SciPy only, without building an Evidently Report
+
+Numerical columns (target, prediction and NUM_FEATURES) are stacked into one matrix
+and cleaned, sorted and summarized column-wise in single NumPy calls; reference
+side is prepared once by NativeReference and shared by every daily report.
+
+Column drift tests and their thresholds follow Evidently 0.3.3 conventions:
+    wasserstein: Wasserstein distance normed by reference std, drift when >= 0.1
+    ks: two-sample Kolmogorov-Smirnov p-value, drift when < 0.05
+    psi: population stability index over Evidently bins (Sturges histogram for
+        numerical columns with more than 20 reference values, values otherwise),
+        drift when >= 0.1
+    jensenshannon: Jensen-Shannon distance over Evidently bins, drift when >= 0.1
+
+Default "wasserstein" and "jensenshannon" tests match DefaultReport results, as
+numerical columns with 5 values or less are checked with Jensen-Shannon as well.
+
+Examples:
+    reference = NativeReference(df_ref)
+    report = NativeReport()
+    report.run(current_data=df, reference_data=reference)
+    print(report.results["prediction_drift"])
+
+    NativeReport(num_stattest="ks", cat_stattest="psi").run(df, df_ref)
+"""
+
+import numpy as np
+import pandas as pd
+from scipy import stats
+from scipy.spatial import distance
+
+from constants import CAT_FEATURES, NUM_FEATURES, PREDICTION, TARGET
+from ProfileReport import DRIFT_SHARE, get_share_missing_values
+
+
+NUM_COLUMNS = [TARGET, PREDICTION] + NUM_FEATURES
+NUM_STATTESTS = ["wasserstein", "ks", "psi"]
+CAT_STATTESTS = ["jensenshannon", "psi"]
+THRESHOLDS = dict(wasserstein=0.1, ks=0.05, psi=0.1, jensenshannon=0.1)
+MAX_JS_NUM_VALUES = 5
+# evidently.calculations.stattests.utils.get_binned_data bins numerical columns with
+# more reference values by Sturges rule and others by value, as categorical ones
+MAX_VALUE_BINS = 20
+MAX_EXACT_KS_SIZE = 10_000  # larger samples get asymptotic p-values, as scipy.stats.ks_2samp(method="auto")
+
+
+def _sorted_columns(df: pd.DataFrame, columns):
+    """(sorted matrix, valid counts) of columns, missing and infinite values sorted last"""
+    matrix = df[columns].to_numpy(dtype="float64", na_value=np.nan)
+    matrix[~np.isfinite(matrix)] = np.nan
+    matrix.sort(axis=0)
+
+    return (matrix, np.count_nonzero(~np.isnan(matrix), axis=0))
+
+
+def _count_unique(matrix: np.ndarray, counts: np.ndarray) -> np.ndarray:
+    """Distinct values of each sorted column among its valid counts rows"""
+    rows = np.arange(1, len(matrix))[:, None]
+    changes = (np.diff(matrix, axis=0) != 0) & (rows < counts)
+
+    return changes.sum(axis=0) + (counts > 0)
+
+
+def _cdf_distances(reference: np.ndarray, current: np.ndarray):
+    """(Wasserstein distance, KS statistic) of two sorted samples from their CDFs"""
+    values = np.sort(np.concatenate([reference, current]), kind="mergesort")
+    cdf_reference = np.searchsorted(reference, values[:-1], side="right") / len(reference)
+    cdf_current = np.searchsorted(current, values[:-1], side="right") / len(current)
+    cdf_diff = np.abs(cdf_reference - cdf_current)
+
+    return (float(np.sum(cdf_diff * np.diff(values))), float(cdf_diff.max(initial=0.0)))
+
+
+def _value_percents(reference: pd.Series, current: pd.Series, feel_zeroes: bool):
+    """Reference and current shares over union of their values, as Evidently binning"""
+    reference_counts = reference.value_counts(sort=False)
+    current_counts = current.value_counts(sort=False)
+    keys = reference_counts.index.union(current_counts.index)
+
+    reference_percents = reference_counts.reindex(keys, fill_value=0).to_numpy() / len(reference)
+    current_percents = current_counts.reindex(keys, fill_value=0).to_numpy() / len(current)
+    if feel_zeroes:
+        _feel_zeroes(reference_percents)
+        _feel_zeroes(current_percents)
+
+    return (reference_percents, current_percents)
+
+
+def _histogram_percents(reference: np.ndarray, current: np.ndarray, feel_zeroes: bool):
+    bins = np.histogram_bin_edges(np.concatenate([reference, current]), bins="sturges")
+    reference_percents = np.histogram(reference, bins)[0] / len(reference)
+    current_percents = np.histogram(current, bins)[0] / len(current)
+    if feel_zeroes:
+        _feel_zeroes(reference_percents)
+        _feel_zeroes(current_percents)
+
+    return (reference_percents, current_percents)
+
+
+def _feel_zeroes(percents: np.ndarray):
+    """Replace empty bins in place, as Evidently does before taking logarithms"""
+    smallest = percents[percents != 0].min()
+    np.place(percents, percents == 0, smallest / 10**6 if smallest <= 0.0001 else 0.0001)
+
+
+def _psi(reference_percents: np.ndarray, current_percents: np.ndarray) -> float:
+    return float(np.sum((reference_percents - current_percents) * np.log(reference_percents / current_percents)))
+
+
+class NativeReference:
+    """Reference data cleaned, sorted and summarized once for NativeReport runs"""
+
+    def __init__(self, df_ref: pd.DataFrame):
+        (matrix, counts) = _sorted_columns(df_ref, NUM_COLUMNS)
+        self.num_columns = {
+            column: matrix[: counts[j], j] for j, column in enumerate(NUM_COLUMNS)
+        }
+        self.num_std = dict(zip(NUM_COLUMNS, np.nanstd(matrix, axis=0)))
+        self.num_unique = dict(zip(NUM_COLUMNS, _count_unique(matrix, counts)))
+        self.cat_columns = {
+            column: df_ref[column].replace([-np.inf, np.inf], np.nan).dropna() for column in CAT_FEATURES
+        }
+
+        reference = df_ref[[TARGET, PREDICTION]].replace([np.inf, -np.inf], np.nan).dropna()
+        self.fare_median = df_ref["fare_amount"].quantile(0.5)
+        self.mean_abs_error = float(np.mean(np.abs(reference[PREDICTION] - reference[TARGET])))
+
+
+class NativeReport:
+    drift_scores = dict()
+    results = dict()
+
+    def __init__(self, num_stattest: str = "wasserstein", cat_stattest: str = "jensenshannon"):
+        if num_stattest not in NUM_STATTESTS:
+            raise ValueError(f"Unsupported numerical stattest: {num_stattest}")
+        if cat_stattest not in CAT_STATTESTS:
+            raise ValueError(f"Unsupported categorical stattest: {cat_stattest}")
+
+        self.num_stattest = num_stattest
+        self.cat_stattest = cat_stattest
+
+    def run(self, current_data: pd.DataFrame, reference_data):
+        """reference_data is a NativeReference, or a DataFrame prepared on the fly"""
+        if isinstance(reference_data, pd.DataFrame):
+            reference_data = NativeReference(reference_data)
+
+        drift = dict()
+        drift.update(self._num_drift(current_data, reference_data))
+        for column in CAT_FEATURES:
+            current = current_data[column].replace([-np.inf, np.inf], np.nan).dropna()
+            drift[column] = self._cat_drift(reference_data.cat_columns[column], current)
+        self.drift_scores = {column: score for column, (score, _) in drift.items()}
+
+        current = current_data[[TARGET, PREDICTION]].replace([np.inf, -np.inf], np.nan).dropna()
+        num_drifted_columns = sum(drifted for (_, drifted) in drift.values())
+
+        self.results = dict(
+            prediction_drift=self.drift_scores[PREDICTION],
+            num_drifted_columns=num_drifted_columns,
+            share_missing_values=get_share_missing_values(current_data),
+            fare_med_reference=reference_data.fare_median,
+            fare_med_current=current_data["fare_amount"].quantile(0.5),
+            mae_reference=reference_data.mean_abs_error,
+            mae_current=float(np.mean(np.abs(current[PREDICTION] - current[TARGET]))),
+            dataset_drift=num_drifted_columns / len(drift) >= DRIFT_SHARE,
+        )
+
+    def _num_drift(self, current_data: pd.DataFrame, reference_data: NativeReference) -> dict:
+        """(score, drifted) of numerical columns"""
+        (matrix, counts) = _sorted_columns(current_data, NUM_COLUMNS)
+        if not counts.all():
+            empty = [column for column, count in zip(NUM_COLUMNS, counts) if not count]
+            raise ValueError(f"Empty columns {empty} were provided for drift calculation")
+
+        drift = dict()
+        ks_statistics = dict()
+        for j, column in enumerate(NUM_COLUMNS):
+            reference = reference_data.num_columns[column]
+            current = matrix[: counts[j], j]
+
+            if reference_data.num_unique[column] <= MAX_JS_NUM_VALUES:
+                if len(np.union1d(reference, current)) <= MAX_JS_NUM_VALUES:
+                    drift[column] = self._cat_drift(pd.Series(reference), pd.Series(current), "jensenshannon")
+                    continue
+
+            if self.num_stattest == "psi":
+                if reference_data.num_unique[column] > MAX_VALUE_BINS:
+                    score = _psi(*_histogram_percents(reference, current, feel_zeroes=True))
+                else:
+                    score = _psi(*_value_percents(pd.Series(reference), pd.Series(current), feel_zeroes=True))
+                drift[column] = (score, score >= THRESHOLDS["psi"])
+                continue
+
+            if self.num_stattest == "ks" and max(len(reference), len(current)) <= MAX_EXACT_KS_SIZE:
+                p_value = stats.ks_2samp(reference, current).pvalue
+                drift[column] = (float(p_value), p_value < THRESHOLDS["ks"])
+                continue
+
+            (wasserstein, ks_statistic) = _cdf_distances(reference, current)
+            if self.num_stattest == "wasserstein":
+                score = wasserstein / max(reference_data.num_std[column], 0.001)
+                drift[column] = (score, score >= THRESHOLDS["wasserstein"])
+            else:
+                ks_statistics[column] = (ks_statistic, len(reference), len(current))
+
+        if ks_statistics:
+            # asymptotic p-values of all columns in one call, as scipy.stats.ks_2samp(method="asymp")
+            (statistics, n_reference, n_current) = map(np.array, zip(*ks_statistics.values()))
+            n = np.round(n_reference * n_current / (n_reference + n_current))
+            p_values = np.clip(stats.kstwo.sf(statistics, n), 0, 1)
+            for column, p_value in zip(ks_statistics, p_values):
+                drift[column] = (float(p_value), p_value < THRESHOLDS["ks"])
+
+        return {column: drift[column] for column in NUM_COLUMNS}
+
+    def _cat_drift(self, reference: pd.Series, current: pd.Series, stattest: str = None):
+        if current.empty:
+            raise ValueError(f"An empty column '{current.name}' was provided for drift calculation")
+
+        stattest = stattest or self.cat_stattest
+        if stattest == "psi":
+            score = _psi(*_value_percents(reference, current, feel_zeroes=True))
+        else:
+            score = float(distance.jensenshannon(*_value_percents(reference, current, feel_zeroes=False)))
+
+        return (score, score >= THRESHOLDS[stattest])
@@ -15,91 +15,137 @@ Examples:
         --models-dir models/ \
         --reports-dir reports/ \
         --year-month 2022-01
+
+    python3 batch_process_flow.py \
+        --data-dir data/ \
+        --models-dir models/ \
+        --year-month 2022-01 \
+        --max-workers 8 \
+        --task-runner sequential
+
+    python3 batch_process_flow.py \
+        --data-dir data/ \
+        --models-dir models/ \
+        --year-month 2022-01 \
+        --report-engine native
 """
 
 import argparse
-import calendar
 import datetime
 
 from prefect import flow, task
+from prefect.task_runners import ConcurrentTaskRunner, SequentialTaskRunner
+from prefect.utilities.annotations import quote
 
 from constants import CAT_FEATURES, NUM_FEATURES
-from DefaultReport import DefaultReport
-from io_tasks import load_df_reference, load_model, read_dataframe, write_to_pg
-from transform_tasks import preprocess_dataframe
+from io_tasks import get_metrics_values, load_df_reference, load_model, load_reference_profile, read_dataframe
+from report_engines import REPORT_ENGINES, get_report, prepare_reference
+from sinks import MetricsSink
+from transform_tasks import build_outliers_filter, preprocess_dataframe, split_by_day
 from utils import parse_year_month_str
 
 
-@flow
-def process_single_day(start_date, df, df_ref, model, reports_dir=None):
+@task
+def process_single_day(start_date, df, reference, model, report_engine="profile", reports_dir=None):
+    """Metrics table row of day against reference prepared for report engine"""
     features = CAT_FEATURES + NUM_FEATURES
-    df['prediction'] = model.predict(df[features].fillna(0))
-
-    report = DefaultReport()
-    report.run(current_data=df, reference_data=df_ref)
-
-    query_template = """
-        INSERT INTO metrics (
-            timestamp,
-            prediction_drift,
-            num_drifted_columns,
-            share_missing_values,
-            fare_median
-        )
-        VALUES (%s, %s, %s, %s, %s)
-    """
-    values = (
-        start_date,
-        report.results["prediction_drift"],
-        report.results["num_drifted_columns"],
-        report.results["share_missing_values"],
-        report.results["fare_med_current"],
-    )
-    # results = write_to_pg(query_template, values)
-    # assert results.rowcount == 1, f"Expected single insert"
-
-    if reports_dir:
+    # day frame is a slice of month one, shared with other days
+    df = df.assign(prediction=model.predict(df[features].fillna(0)))
+
+    report = get_report(report_engine)
+    report.run(df, reference)
+
+    if reports_dir and report_engine == "evidently":
         day = start_date.strftime("%Y%m%d")
         ts = str(datetime.datetime.now().timestamp()).replace(".", "_")
         report.evidently_report.save_html(f"{reports_dir}/batch_{day}_{ts}.html")
 
+    return get_metrics_values(start_date, report.results)
 
-@flow
+
+def get_task_runner(name: str):
+    if name == "concurrent":
+        return ConcurrentTaskRunner()
+    elif name == "sequential":
+        return SequentialTaskRunner()
+    else:
+        raise ValueError(f"Unsupported task runner: {name}")
+
+
+@flow(task_runner=ConcurrentTaskRunner())
 def batch_process_main_flow(
     data_dir: str,
     models_dir: str,
     reports_dir: str = None,
-    year_month: str = None
+    year_month: str = None,
+    max_workers: int = 4,
+    report_engine: str = None,
+    write_metrics: bool = True,
 ):
     """
+    Days are processed concurrently on flow task runner, at most max_workers at a
+    time, sharing month frame slices, reference and model across tasks.
+
+    report_engine is one of "evidently", "profile" (reference profile persisted by
+    baseline flow) or "native". It defaults to "evidently" when reports_dir is
+    given, as only Evidently renders HTML reports, and to "profile" otherwise.
+
+    Daily metrics rows are inserted into metrics table at once when all days are
+    processed, replacing rows of same days written by previous runs.
+
     Examples:
         batch_process_main_flow(data_dir, models_dir)
         batch_process_main_flow(data_dir, models_dir, year_month="2023-02")
         batch_process_main_flow(data_dir, models_dir, year_month="2023_02")
         batch_process_main_flow(data_dir, models_dir, reports_dir)
         batch_process_main_flow(data_dir, models_dir, reports_dir, "2023_2")
+        batch_process_main_flow(data_dir, models_dir, year_month="2023-02", max_workers=8)
+        batch_process_main_flow(data_dir, models_dir, year_month="2023-02", report_engine="native")
+        batch_process_main_flow(data_dir, models_dir, year_month="2023-02", write_metrics=False)
+        batch_process_main_flow.with_options(task_runner=SequentialTaskRunner())(data_dir, models_dir)
     """
     if year_month is None:
         year, month = 2022, 2
     else:
         year, month = parse_year_month_str(year_month)
 
-    df = read_dataframe(year, month, data_dir)
+    # all columns are read since missing values share is reported over whole dataset
+    df = read_dataframe(year, month, data_dir, filters=build_outliers_filter())
     df = preprocess_dataframe(df)
 
-    df_ref = load_df_reference(data_dir)
+    if report_engine is None:
+        report_engine = "evidently" if reports_dir else "profile"
+    if report_engine not in REPORT_ENGINES:
+        raise ValueError(f"Unsupported report engine: {report_engine}")
+
+    if report_engine == "profile":
+        reference = load_reference_profile(data_dir)
+    else:
+        reference = prepare_reference(report_engine, load_df_reference(data_dir))
     model = load_model(models_dir)
 
-    num_days = calendar.monthrange(year, month)[1]
-    start_date = datetime.datetime(year, month, 1)
-    for _ in range(1, num_days):
-        end_date = start_date + datetime.timedelta(days=1)
-        idx = (
-            (df["lpep_pickup_datetime"] >= start_date)
-            & (df["lpep_pickup_datetime"] < end_date)
+    rows = []
+    futures = []
+    for start_date, df_day in split_by_day(df, year, month):
+        if df_day.empty:
+            print(f"No trips on {start_date:%Y-%m-%d}, skipping")
+            continue
+        if len(futures) >= max_workers:
+            rows.append(futures.pop(0).result())
+        # quoted so Prefect passes frames and model as they are, without inspecting them
+        futures.append(
+            process_single_day.submit(
+                start_date, quote(df_day), quote(reference), quote(model), report_engine, reports_dir
+            )
         )
-        process_single_day(start_date, df[idx], df_ref, model, reports_dir)
-        start_date = end_date
+
+    rows.extend(future.result() for future in futures)
+
+    if write_metrics:
+        with MetricsSink() as sink:
+            for values in rows:
+                sink.add(values)
+        print(f"Metrics: {sink.report()}")
 
 
 if __name__ == "__main__":
@@ -108,6 +154,12 @@ if __name__ == "__main__":
     parser.add_argument("--models-dir", required=True)
     parser.add_argument("--reports-dir", default=None)
     parser.add_argument("--year-month", default=None)
+    parser.add_argument("--max-workers", default=4, type=int, help="days processed at a time")
+    parser.add_argument("--task-runner", default="concurrent", choices=["concurrent", "sequential"])
+    parser.add_argument("--report-engine", default=None, choices=REPORT_ENGINES)
+    parser.add_argument("--dry-run", action="store_true", help="process days without inserting metrics")
 
     kwargs = vars(parser.parse_args())
-    batch_process_main_flow(**kwargs)
+    kwargs["write_metrics"] = not kwargs.pop("dry_run")
+    task_runner = get_task_runner(kwargs.pop("task_runner"))
+    batch_process_main_flow.with_options(task_runner=task_runner)(**kwargs)
@@ -16,6 +16,11 @@ Examples:
         --reports-dir reports/ \
         --year-month 2022-01
 
+    python3 build_baseline_flow.py \
+        --data-dir data/ \
+        --models-dir models/ \
+        --report-engine native
+
 Note: reporting here is optional, it is added for demonstrational purposes
 """
 
@@ -28,9 +33,10 @@ from sklearn.linear_model import LinearRegression
 from sklearn.metrics import mean_absolute_error
 
 from constants import CAT_FEATURES, NUM_FEATURES, PREDICTION, TARGET
-from DefaultReport import DefaultReport
-from io_tasks import read_dataframe, write_df_reference, write_model
-from transform_tasks import preprocess_dataframe
+from io_tasks import read_dataframe, write_df_reference, write_model, write_reference_profile
+from ProfileReport import build_reference_profile
+from report_engines import REPORT_ENGINES, get_report, prepare_reference
+from transform_tasks import build_outliers_filter, preprocess_dataframe
 from utils import parse_year_month_str
 
 
@@ -56,9 +62,9 @@ def calculate_manual_metrics(df_train, df_val):
 
 
 @task(retries=2, retry_delay_seconds=5)
-def create_report(df_train, df_val, reports_dir=None):
-    report = DefaultReport()
-    report.run(current_data=df_val, reference_data=df_train)
+def create_report(df_train, df_val, reports_dir=None, report_engine="evidently"):
+    report = get_report(report_engine)
+    report.run(df_val, prepare_reference(report_engine, df_train))
 
     print("\n-----Report-----")
     print(f'Prediction drift: {report.results["prediction_drift"]}')
@@ -69,7 +75,7 @@ def create_report(df_train, df_val, reports_dir=None):
     print(f'MAE (trainining): {report.results["mae_reference"]}')
     print(f'MAE (validation): {report.results["mae_current"]:}')
 
-    if reports_dir:
+    if reports_dir and report_engine == "evidently":
         ts = str(datetime.now().timestamp()).replace(".", "_")
         report.evidently_report.save_html(f"{reports_dir}/baseline_{ts}.html")
 
@@ -79,19 +85,21 @@ def build_baseline_main_flow(
     data_dir: str,
     models_dir: str,
     reports_dir: str = None,
-    year_month: str = None
+    year_month: str = None,
+    report_engine: str = "evidently",
 ):
     if year_month is None:
         year, month = 2022, 1
     else:
         year, month = parse_year_month_str(year_month)
 
-    df = read_dataframe(year, month, data_dir)
+    # all columns are read since missing values share is reported over whole dataset
+    df = read_dataframe(year, month, data_dir, filters=build_outliers_filter())
     raw_shape = df.shape
     df = preprocess_dataframe(df)
 
     print("\n-----Data-----")
-    print(f"Shape of raw data: {raw_shape}")
+    print(f"Shape of read data: {raw_shape}")
     print(f"Shape of transformed data: {df.shape}")
 
     df_train, df_val = df[:30000], df[30000:]
@@ -104,8 +112,10 @@ def build_baseline_main_flow(
     print(f'MAE (trainining): {manual_metrics["mae_train"]}')
     print(f'MAE (validation): {manual_metrics["mae_val"]}')
 
-    create_report(df_train, df_val, reports_dir)
+    create_report(df_train, df_val, reports_dir, report_engine)
     write_df_reference(df_val, data_dir)
+    # compact reference summary, so daily drift reports don't rescan reference data
+    write_reference_profile(build_reference_profile(df_val), data_dir)
     write_model(model, models_dir)
 
 
@@ -115,6 +125,7 @@ if __name__ == "__main__":
     parser.add_argument("--models-dir", required=True)
     parser.add_argument("--reports-dir", default=True)
     parser.add_argument("--year-month", default=None)
+    parser.add_argument("--report-engine", default="evidently", choices=REPORT_ENGINES)
 
     kwargs = vars(parser.parse_args())
     build_baseline_main_flow(**kwargs)
@@ -1,3 +1,4 @@
+import json
 import os
 
 import joblib
@@ -6,11 +7,53 @@ import psycopg
 
 from prefect import task
 
+from tripdata import get_default_cache, is_remote, resolve_location
+
+
+METRICS_INSERT_QUERY = """
+    INSERT INTO metrics (
+        timestamp,
+        prediction_drift,
+        num_drifted_columns,
+        share_missing_values,
+        fare_median
+    )
+    VALUES (%s, %s, %s, %s, %s)
+    ON CONFLICT (timestamp) DO UPDATE SET
+        prediction_drift = EXCLUDED.prediction_drift,
+        num_drifted_columns = EXCLUDED.num_drifted_columns,
+        share_missing_values = EXCLUDED.share_missing_values,
+        fare_median = EXCLUDED.fare_median
+"""
+
+# unique index METRICS_INSERT_QUERY upserts on, missing on tables created before it
+METRICS_KEY_QUERY = """
+    SELECT 1
+    FROM pg_index i
+    JOIN pg_attribute a ON a.attrelid = i.indrelid AND a.attnum = i.indkey[0]
+    WHERE i.indrelid = to_regclass('metrics') AND i.indisunique AND i.indnatts = 1 AND a.attname = 'timestamp'
+"""
+
+
+def get_metrics_values(timestamp, results):
+    """Row of metrics table, in METRICS_INSERT_QUERY order, from report results"""
+    return (
+        timestamp,
+        results["prediction_drift"],
+        results["num_drifted_columns"],
+        results["share_missing_values"],
+        results["fare_med_current"],
+    )
+
 
 def __get_df_reference_path(data_dir):
     return f"{data_dir}/reference.parquet"
 
 
+def __get_reference_profile_path(data_dir):
+    return f"{data_dir}/reference_profile.json"
+
+
 def __get_model_file_path(models_dir):
     return f"{models_dir}/lin_reg.bin"
 
@@ -23,6 +66,15 @@ def load_df_reference(data_dir):
     return df
 
 
+@task(retries=3, retry_delay_seconds=10)
+def load_reference_profile(data_dir):
+    file_path = __get_reference_profile_path(data_dir)
+    with open(file_path) as file:
+        profile = json.load(file)
+
+    return profile
+
+
 @task(retries=3, retry_delay_seconds=10)
 def load_model(models_dir):
     file_path = __get_model_file_path(models_dir)
@@ -33,11 +85,16 @@ def load_model(models_dir):
 
 
 @task(retries=3, retry_delay_seconds=40)
-def read_dataframe(year, month, location=None):
+def read_dataframe(year, month, location=None, columns=None, filters=None):
+    """Read trip data pushing column projection and row filters down to Arrow reader"""
     if location is None:
         location = "https://d37ci6vzurychx.cloudfront.net/trip-data"
 
-    df = pd.read_parquet(f"{location}/green_tripdata_{year}-{month:02d}.parquet")
+    file_location = f"{location}/green_tripdata_{year}-{month:02d}.parquet"
+    df = pd.read_parquet(resolve_location(file_location), columns=columns, filters=filters)
+    if is_remote(file_location):
+        print(f"Trip data cache: {get_default_cache().stats()}")
+
     return df
 
 
@@ -49,20 +106,53 @@ def write_df_reference(df, data_dir):
     return file_path
 
 
-@task(retries=3, retry_delay_seconds=40)
-def write_to_pg(query_template, values):
+@task(retries=3, retry_delay_seconds=15)
+def write_reference_profile(profile, data_dir):
+    file_path = __get_reference_profile_path(data_dir)
+    with open(file_path, "w") as file:
+        json.dump(profile, file)
+
+    return file_path
+
+
+def get_pg_conninfo():
     # conn_info = "host=localhost port=5432 dbname=mlops user=postgres password=example"
-    kwargs = dict(
+    return psycopg.conninfo.make_conninfo(
         host=os.environ.get("PGHOST", "localhost"),
         port=os.environ.get("PGPORT", "5432"),
         dbname=os.environ.get("PGDATABASE", "mlops"),
         user=os.environ.get("PGUSER", "postgres"),
         password=os.environ.get("PGPASSWORD", "example"),
     )
-    with psycopg.connect(**kwargs) as conn:
-        results = conn.execute(query_template, values)
 
-    return results
+
+def check_metrics_table(connection):
+    """Fail early when metrics table cannot be upserted on timestamp"""
+    if connection.execute(METRICS_KEY_QUERY).fetchone() is None:
+        raise RuntimeError(
+            "Table metrics has no primary key on timestamp, required by METRICS_INSERT_QUERY: "
+            "run migrations/metrics_primary_key.sql on database"
+        )
+
+
+def insert_rows(query_template, rows, pool=None):
+    """Execute query for all rows in one transaction, on a connection of pool or a new one"""
+    if pool is None:
+        connection = psycopg.connect(get_pg_conninfo())
+    else:
+        connection = pool.connection()
+
+    with connection as conn:
+        with conn.cursor() as cursor:
+            cursor.executemany(query_template, rows)
+
+    return len(rows)
+
+
+@task(retries=3, retry_delay_seconds=40)
+def write_to_pg(query_template, rows, pool=None):
+    """insert_rows as a retried task, for flows writing rows outside MetricsSink"""
+    return insert_rows(query_template, rows, pool)
 
 
 @task(retries=3, retry_delay_seconds=15)
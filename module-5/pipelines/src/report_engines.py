@@ -0,0 +1,43 @@
+"""Report engines sharing DefaultReport results keys
+
+    evidently: DefaultReport, full Evidently Report against raw reference data, only
+        engine rendering HTML reports
+    profile: ProfileReport against reference profile persisted by build_baseline_flow
+    native: NativeReport, NumPy drift tests against reference prepared once
+
+Examples:
+    reference = prepare_reference("native", df_ref)
+    report = get_report("native")
+    report.run(df, reference)
+    print(report.results)
+"""
+
+from DefaultReport import DefaultReport
+from NativeReport import NativeReference, NativeReport
+from ProfileReport import ProfileReport, build_reference_profile
+
+
+REPORT_ENGINES = ["evidently", "profile", "native"]
+
+
+def get_report(engine: str):
+    if engine == "evidently":
+        return DefaultReport()
+    elif engine == "profile":
+        return ProfileReport()
+    elif engine == "native":
+        return NativeReport()
+    else:
+        raise ValueError(f"Unsupported report engine: {engine}")
+
+
+def prepare_reference(engine: str, df_ref):
+    """Reference as consumed by engine run, computed once and shared across reports"""
+    if engine == "evidently":
+        return df_ref
+    elif engine == "profile":
+        return build_reference_profile(df_ref)
+    elif engine == "native":
+        return NativeReference(df_ref)
+    else:
+        raise ValueError(f"Unsupported report engine: {engine}")
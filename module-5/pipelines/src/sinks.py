@@ -0,0 +1,93 @@
+"""Metrics sink buffering rows of metrics table for batched Postgres writes
+
+Rows are written with executemany in one transaction per flush, on connections
+kept open by a psycopg_pool pool across flushes, instead of one connection and
+transaction per row. Buffer is flushed once it holds flush_rows rows, or when a
+row is added flush_seconds after last flush, so rows of slow streams are not held
+back. METRICS_INSERT_QUERY upserts on timestamp, so rows written again by task
+retries or flow reruns replace earlier ones, and sink fails on opening when
+metrics table lacks the primary key it needs.
+
+Examples:
+    with MetricsSink(flush_rows=100, flush_seconds=10) as sink:
+        sink.add(get_metrics_values(start_date, report.results))
+    print(sink.report())
+"""
+
+import threading
+import time
+
+from psycopg_pool import ConnectionPool
+
+from io_tasks import METRICS_INSERT_QUERY, check_metrics_table, get_pg_conninfo, insert_rows
+
+
+class MetricsSink:
+    def __init__(
+        self,
+        query_template=METRICS_INSERT_QUERY,
+        flush_rows=100,
+        flush_seconds=None,
+        conninfo=None,
+        max_connections=2,
+    ):
+        self.query_template = query_template
+        self.flush_rows = flush_rows
+        self.flush_seconds = flush_seconds
+        self.flushed_at = time.monotonic()
+        self.pool = ConnectionPool(conninfo or get_pg_conninfo(), min_size=1, max_size=max_connections, open=False)
+        self.rows = []
+        self.lock = threading.Lock()
+        self.rows_written = 0
+        self.flushes = 0
+        self.write_seconds = 0.0
+
+    def __enter__(self):
+        self.pool.open(wait=True)
+        if self.query_template == METRICS_INSERT_QUERY:
+            try:
+                with self.pool.connection() as conn:
+                    check_metrics_table(conn)
+            except BaseException:
+                self.pool.close()
+                raise
+
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        try:
+            if exc_type is None:
+                self.flush()
+        finally:
+            self.pool.close()
+
+    def add(self, values):
+        """Buffer row, flushing buffer when full or flush_seconds after last flush"""
+        with self.lock:
+            self.rows.append(values)
+            due = len(self.rows) >= self.flush_rows
+            if self.flush_seconds is not None:
+                due = due or time.monotonic() - self.flushed_at >= self.flush_seconds
+        if due:
+            self.flush()
+
+    def flush(self):
+        with self.lock:
+            (rows, self.rows) = (self.rows, [])
+            self.flushed_at = time.monotonic()
+        if not rows:
+            return
+
+        start = time.perf_counter()
+        # plain function, sinks are used from flows, tasks and scripts alike
+        insert_rows(self.query_template, rows, self.pool)
+        self.write_seconds += time.perf_counter() - start
+        self.rows_written += len(rows)
+        self.flushes += 1
+
+    def report(self) -> dict:
+        return dict(
+            rows=self.rows_written,
+            flushes=self.flushes,
+            write_seconds=round(self.write_seconds, 3),
+        )
@@ -0,0 +1,147 @@
+"""Mergeable fixed-size sketches of scored trips for windowed drift monitoring
+
+Numerical columns are summarized by HistogramSketch, with one bin per reference
+profile point (distinct value or quantile), holding exact counts of values equal
+to the point along with count and sum of other values falling in bin. Categorical
+columns are counted by value, bounded by their domain (location IDs). Sketch size
+depends on reference profile only, never on how many trips were seen, and
+sketches of consecutive batches or windows merge by addition.
+
+Window results carry DefaultReport keys, computed as ProfileReport does with
+binned current values in place of raw ones.
+
+Examples:
+    sketch = WindowSketch(profile)
+    for df in batches:
+        sketch.update(df)
+    print(sketch.results(profile))
+"""
+
+import collections
+
+import numpy as np
+import pandas as pd
+
+from constants import CAT_FEATURES, NUM_FEATURES, PREDICTION, TARGET
+from ProfileReport import DRIFT_SHARE, DRIFT_THRESHOLD, count_missing_values, get_distribution_drift
+
+
+NUM_COLUMNS = [TARGET, PREDICTION] + NUM_FEATURES
+
+
+class HistogramSketch:
+    def __init__(self, points):
+        self.points = np.unique(np.asarray(points, dtype="float64"))
+        self.edges = (self.points[1:] + self.points[:-1]) / 2
+        self.counts = np.zeros(len(self.points), dtype="int64")
+        self.exact_counts = np.zeros(len(self.points), dtype="int64")
+        self.other_sums = np.zeros(len(self.points))
+
+    @classmethod
+    def from_profile(cls, column_profile: dict):
+        return cls(column_profile.get("values", column_profile.get("quantiles")))
+
+    def update(self, values: np.ndarray):
+        """Add finite values, others are counted as missing by caller"""
+        values = values[np.isfinite(values)]
+        bins = np.searchsorted(self.edges, values, side="right")
+        exact = values == self.points[bins]
+
+        size = len(self.points)
+        self.counts += np.bincount(bins, minlength=size)
+        self.exact_counts += np.bincount(bins[exact], minlength=size)
+        self.other_sums += np.bincount(bins[~exact], weights=values[~exact], minlength=size)
+
+    def merge(self, other: "HistogramSketch"):
+        self.counts += other.counts
+        self.exact_counts += other.exact_counts
+        self.other_sums += other.other_sums
+
+    @property
+    def count(self) -> int:
+        return int(self.counts.sum())
+
+    def sample(self):
+        """(values, weights) sorted by value: bin points with their exact counts, other values by bin mean"""
+        other_counts = self.counts - self.exact_counts
+        other = other_counts > 0
+        values = np.concatenate([self.points, self.other_sums[other] / other_counts[other]])
+        weights = np.concatenate([self.exact_counts, other_counts[other]])
+
+        keep = weights > 0
+        order = np.argsort(values[keep], kind="stable")
+        return (values[keep][order], weights[keep][order])
+
+    def quantile(self, q: float) -> float:
+        """Linearly interpolated quantile, as pandas computes over values"""
+        (values, weights) = self.sample()
+        if not len(values):
+            return float("nan")
+
+        position = (weights.sum() - 1) * q
+        ends = np.cumsum(weights)
+        lower = values[np.searchsorted(ends, np.floor(position), side="right")]
+        upper = values[np.searchsorted(ends, np.ceil(position), side="right")]
+
+        return float(lower + (upper - lower) * (position - np.floor(position)))
+
+
+class WindowSketch:
+    def __init__(self, profile: dict):
+        columns = profile["columns"]
+        self.numerical = {column: HistogramSketch.from_profile(columns[column]) for column in NUM_COLUMNS}
+        self.categorical = {column: collections.Counter() for column in CAT_FEATURES}
+        self.missing = collections.Counter()
+        self.rows = 0
+        self.abs_error_sum = 0.0
+        self.abs_error_count = 0
+
+    def update(self, df: pd.DataFrame):
+        """Add scored trips holding target and prediction columns"""
+        for column, sketch in self.numerical.items():
+            sketch.update(df[column].to_numpy(dtype="float64", na_value=np.nan))
+        for column, counter in self.categorical.items():
+            counter.update(df[column].dropna().value_counts(sort=False).to_dict())
+        self.missing.update(count_missing_values(df))
+        self.rows += len(df)
+
+        abs_error = np.abs(df[PREDICTION].to_numpy(dtype="float64") - df[TARGET].to_numpy(dtype="float64"))
+        abs_error = abs_error[np.isfinite(abs_error)]
+        self.abs_error_sum += abs_error.sum()
+        self.abs_error_count += len(abs_error)
+
+    def merge(self, other: "WindowSketch"):
+        for column, sketch in self.numerical.items():
+            sketch.merge(other.numerical[column])
+        for column, counter in self.categorical.items():
+            counter.update(other.categorical[column])
+        self.missing.update(other.missing)
+        self.rows += other.rows
+        self.abs_error_sum += other.abs_error_sum
+        self.abs_error_count += other.abs_error_count
+
+    def results(self, profile: dict) -> dict:
+        columns = profile["columns"]
+        empty = [column for column, sketch in self.numerical.items() if not sketch.count]
+        empty += [column for column, counter in self.categorical.items() if not counter]
+        if empty:
+            raise ValueError(f"Empty columns {empty} were provided for drift calculation")
+
+        drift_scores = dict()
+        for column, sketch in self.numerical.items():
+            drift_scores[column] = get_distribution_drift(columns[column], *sketch.sample())
+        for column, counter in self.categorical.items():
+            (values, weights) = zip(*counter.items())
+            drift_scores[column] = get_distribution_drift(columns[column], np.array(values), np.array(weights))
+        num_drifted_columns = sum(score >= DRIFT_THRESHOLD for score in drift_scores.values())
+
+        return dict(
+            prediction_drift=drift_scores[PREDICTION],
+            num_drifted_columns=num_drifted_columns,
+            share_missing_values=sum(self.missing.values()) / (self.rows * len(self.missing)),
+            fare_med_reference=profile["fare_median"],
+            fare_med_current=self.numerical["fare_amount"].quantile(0.5),
+            mae_reference=profile["mean_abs_error"],
+            mae_current=self.abs_error_sum / self.abs_error_count,
+            dataset_drift=num_drifted_columns / len(drift_scores) >= DRIFT_SHARE,
+        )
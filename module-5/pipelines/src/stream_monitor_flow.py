@@ -0,0 +1,234 @@
+"""Streaming ML monitoring over tumbling windows of incoming trips
+
+Trips are consumed in batches from a JSON Lines file, followed as it grows like
+"tail -f", or from a month Parquet file replayed in pickup order through a bounded
+local queue standing in for a message broker. Each batch is filtered and scored as
+in batch processing and added to mergeable sketches of its event-time windows
+(see sketches.py). Windows are closed once trips have moved past their end by
+allowed lateness, and their metrics are buffered by MetricsSink and inserted into
+metrics table in batches, at least every METRICS_FLUSH_SECONDS. Later trips of
+closed windows are dropped and counted.
+
+Memory stays constant however long it runs: sketches depend on reference profile
+only, and open windows are bounded by allowed lateness.
+
+Examples:
+    # replaying a month through local queue, one metrics row per hour
+    python3 stream_monitor_flow.py \
+        --data-dir data/ \
+        --models-dir models/ \
+        --source data/green_tripdata_2022-02.parquet \
+        --window-minutes 60
+
+    # following a file trips are appended to, printing metrics only
+    python3 stream_monitor_flow.py \
+        --data-dir data/ \
+        --models-dir models/ \
+        --source trips.jsonl \
+        --follow \
+        --allowed-lateness-minutes 10 \
+        --dry-run
+"""
+
+import argparse
+import contextlib
+import json
+import queue
+import threading
+import time
+
+import pandas as pd
+import pyarrow.parquet as pq
+
+from prefect import flow
+
+from constants import CAT_FEATURES, NUM_FEATURES
+from io_tasks import get_metrics_values, load_model, load_reference_profile
+from sinks import MetricsSink
+from sketches import WindowSketch
+from transform_tasks import preprocess_dataframe
+
+
+DATETIMES = ["lpep_pickup_datetime", "lpep_dropoff_datetime"]
+EVENT_TIME = "lpep_pickup_datetime"
+DEFAULT_BATCH_SIZE = 1000
+QUEUE_BATCHES = 8
+METRICS_FLUSH_SECONDS = 10
+
+
+def to_frame(records) -> pd.DataFrame:
+    df = pd.DataFrame.from_records(records)
+    for column in DATETIMES:
+        df[column] = pd.to_datetime(df[column], format="ISO8601")
+
+    return df
+
+
+def iter_jsonl(file_path, follow=False, batch_size=DEFAULT_BATCH_SIZE, poll_seconds=1.0):
+    """Yield frames of records appended to file, waiting for more when following"""
+    with open(file_path) as file:
+        records = []
+        partial = ""
+        while True:
+            line = file.readline()
+            if line.endswith("\n"):
+                records.append(json.loads(partial + line))
+                partial = ""
+                if len(records) < batch_size:
+                    continue
+            elif line:
+                # line still being written
+                partial += line
+                continue
+            elif not follow and partial.strip():
+                # last line of a complete file, written without trailing newline
+                records.append(json.loads(partial))
+                partial = ""
+
+            if records:
+                yield to_frame(records)
+                records = []
+            if not line:
+                if not follow:
+                    return
+                time.sleep(poll_seconds)
+
+
+def replay_parquet(file_path, batches: queue.Queue, batch_size=DEFAULT_BATCH_SIZE):
+    """Put frames of trips in pickup order into queue, then None, as a broker would deliver them"""
+    try:
+        table = pq.read_table(file_path).sort_by(EVENT_TIME)
+        for batch in table.to_batches(max_chunksize=batch_size):
+            batches.put(batch.to_pandas())
+    finally:
+        batches.put(None)
+
+
+def iter_queue(batches: queue.Queue):
+    while True:
+        df = batches.get()
+        if df is None:
+            return
+        yield df
+
+
+def iter_source(source, follow=False, batch_size=DEFAULT_BATCH_SIZE):
+    if source.endswith(".parquet"):
+        batches = queue.Queue(maxsize=QUEUE_BATCHES)
+        threading.Thread(target=replay_parquet, args=(source, batches, batch_size), daemon=True).start()
+        return iter_queue(batches)
+
+    return iter_jsonl(source, follow, batch_size)
+
+
+class TumblingWindows:
+    """Sketches of open event-time windows, closed once watermark passes their end"""
+
+    def __init__(self, profile, window_minutes=60, allowed_lateness_minutes=0):
+        self.profile = profile
+        self.window = pd.Timedelta(minutes=window_minutes)
+        self.allowed_lateness = pd.Timedelta(minutes=allowed_lateness_minutes)
+        self.open = dict()
+        self.watermark = None
+        self.closed_until = None
+        self.late_rows = 0
+
+    def add(self, df: pd.DataFrame):
+        if self.closed_until is not None:
+            late = df[EVENT_TIME] < self.closed_until
+            self.late_rows += int(late.sum())
+            df = df[~late]
+
+        starts = df[EVENT_TIME].dt.floor(self.window)
+        for start, df_window in df.groupby(starts, sort=False):
+            if start not in self.open:
+                self.open[start] = WindowSketch(self.profile)
+            self.open[start].update(df_window)
+
+        if len(df):
+            event_time = df[EVENT_TIME].max() - self.allowed_lateness
+            self.watermark = event_time if self.watermark is None else max(self.watermark, event_time)
+
+    def pop_closed(self, flush=False):
+        """(start, sketch) of windows ending before watermark, or of all windows when flushing"""
+        closed = sorted(
+            start for start in self.open if flush or start + self.window <= self.watermark
+        )
+        if closed:
+            self.closed_until = max(self.closed_until or closed[-1], closed[-1] + self.window)
+
+        return [(start, self.open.pop(start)) for start in closed]
+
+
+@flow
+def stream_monitor_main_flow(
+    data_dir: str,
+    models_dir: str,
+    source: str,
+    window_minutes: int = 60,
+    allowed_lateness_minutes: int = 0,
+    follow: bool = False,
+    batch_size: int = DEFAULT_BATCH_SIZE,
+    write_metrics: bool = True,
+):
+    """
+    Examples:
+        stream_monitor_main_flow(data_dir, models_dir, "data/green_tripdata_2022-02.parquet")
+        stream_monitor_main_flow(data_dir, models_dir, "trips.jsonl", follow=True, window_minutes=5)
+        stream_monitor_main_flow(data_dir, models_dir, "trips.jsonl", write_metrics=False)
+    """
+    profile = load_reference_profile(data_dir)
+    model = load_model(models_dir)
+    features = CAT_FEATURES + NUM_FEATURES
+
+    windows = TumblingWindows(profile, window_minutes, allowed_lateness_minutes)
+
+    def emit(closed, sink):
+        for start, sketch in closed:
+            try:
+                results = sketch.results(profile)
+            except ValueError as e:
+                print(f"Window {start} skipped: {e}")
+                continue
+
+            print(f"Window {start}: {sketch.rows} trips, {results}")
+            if sink is not None:
+                sink.add(get_metrics_values(start.to_pydatetime(), results))
+
+    if write_metrics:
+        sink_context = MetricsSink(flush_seconds=METRICS_FLUSH_SECONDS)
+    else:
+        sink_context = contextlib.nullcontext()
+
+    with sink_context as sink:
+        for df in iter_source(source, follow, batch_size):
+            # task function called directly, batches are too frequent for one task run each
+            df = preprocess_dataframe.fn(df)
+            if df.empty:
+                continue
+
+            df = df.assign(prediction=model.predict(df[features].fillna(0)))
+            windows.add(df)
+            emit(windows.pop_closed(), sink)
+
+        emit(windows.pop_closed(flush=True), sink)
+
+    print(f"Late trips dropped: {windows.late_rows}")
+    if sink is not None:
+        print(f"Metrics: {sink.report()}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--data-dir", required=True)
+    parser.add_argument("--models-dir", required=True)
+    parser.add_argument("--source", required=True, help="JSON Lines file, or Parquet file replayed through a queue")
+    parser.add_argument("--window-minutes", default=60, type=int)
+    parser.add_argument("--allowed-lateness-minutes", default=0, type=int)
+    parser.add_argument("--follow", action="store_true", help="wait for lines appended to JSON Lines source")
+    parser.add_argument("--batch-size", default=DEFAULT_BATCH_SIZE, type=int)
+    parser.add_argument("--dry-run", action="store_true", help="print window metrics without inserting them")
+
+    kwargs = vars(parser.parse_args())
+    kwargs["write_metrics"] = not kwargs.pop("dry_run")
+    stream_monitor_main_flow(**kwargs)
@@ -1,10 +1,28 @@
+import calendar
+import datetime
+
 import pandas as pd
+import pyarrow.compute as pc
 
 from prefect import task
 
 from constants import TARGET
 
 
+def build_outliers_filter():
+    """Arrow expression equivalent to filtering in preprocess_dataframe, for pushing down on read"""
+    duration_ms = pc.milliseconds_between(
+        pc.field("lpep_pickup_datetime"), pc.field("lpep_dropoff_datetime")
+    )
+
+    return (
+        (duration_ms >= 0)
+        & (duration_ms <= 60 * 60_000)
+        & (pc.field("passenger_count") > 0)
+        & (pc.field("passenger_count") <= 8)
+    )
+
+
 @task(retries=2, retry_delay_seconds=20)
 def preprocess_dataframe(df: pd.DataFrame):
     # create target
@@ -21,3 +39,20 @@ def preprocess_dataframe(df: pd.DataFrame):
     df = df[idx]
 
     return df
+
+
+def split_by_day(df: pd.DataFrame, year: int, month: int, column="lpep_pickup_datetime"):
+    """(start_date, df_day) of every calendar day of month, in a single sort pass
+
+    Rows are sorted by column once and day boundaries are found by binary search,
+    so each day is a contiguous slice instead of a mask over whole month. Rows out
+    of month are dropped, days without rows are kept as empty frames.
+    """
+    df = df.sort_values(column, kind="stable")
+
+    num_days = calendar.monthrange(year, month)[1]
+    start_date = datetime.datetime(year, month, 1)
+    dates = [start_date + datetime.timedelta(days=day) for day in range(num_days + 1)]
+    bounds = df[column].searchsorted(dates)
+
+    return [(dates[day], df.iloc[bounds[day] : bounds[day + 1]]) for day in range(num_days)]
@@ -0,0 +1,50 @@
+import os
+import sys
+
+import numpy as np
+import pandas as pd
+import pytest
+
+# flow scripts import each other as top-level modules
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), "..", "src"))
+
+from constants import PREDICTION, TARGET  # noqa: E402
+
+
+def __make_trips(n: int, shift: float, seed: int) -> pd.DataFrame:
+    rng = np.random.default_rng(seed)
+    duration = rng.gamma(2.0, 7.0 + shift, n)
+    fare = 2.5 + 1.8 * duration + rng.normal(0, 3, n)
+    df = pd.DataFrame(
+        {
+            TARGET: duration,
+            PREDICTION: duration + rng.normal(shift, 4, n),
+            "passenger_count": rng.integers(0, 7, n).astype("float64"),
+            # 20 distinct values, binned by value for PSI although Sturges bins would merge them
+            "trip_distance": np.minimum(np.round(2 * rng.exponential(2.5 + shift / 5, n)) / 2, 9.5),
+            "fare_amount": fare,
+            "total_amount": fare + rng.exponential(2, n),
+            "PULocationID": rng.integers(1, 60, n),
+            "DOLocationID": rng.integers(1, 60 + int(10 * shift), n),
+        }
+    )
+    df.loc[rng.random(n) < 0.03, "passenger_count"] = np.nan
+    df.loc[rng.random(n) < 0.01, "trip_distance"] = np.inf
+
+    return df
+
+
+@pytest.fixture(scope="session")
+def make_trips():
+    """Scored trips with a few missing values, distributions moved by shift"""
+    return __make_trips
+
+
+@pytest.fixture(scope="module")
+def reference(make_trips):
+    return make_trips(5000, shift=0.0, seed=0)
+
+
+@pytest.fixture(scope="module", params=[0.0, 1.5])
+def current(make_trips, request):
+    return make_trips(1200, shift=request.param, seed=1)
@@ -0,0 +1,80 @@
+import datetime
+import os
+import uuid
+
+import pytest
+
+psycopg = pytest.importorskip("psycopg")
+pytest.importorskip("psycopg_pool")
+pytest.importorskip("prefect")
+
+from io_tasks import get_pg_conninfo  # noqa: E402
+from sinks import MetricsSink  # noqa: E402
+
+
+MODULE_DIR = os.path.join(os.path.dirname(__file__), "..", "..")
+TIMESTAMPS = [datetime.datetime(2022, 2, day) for day in range(1, 4)]
+
+
+def read_sql(*path) -> str:
+    with open(os.path.join(MODULE_DIR, *path)) as file:
+        return file.read()
+
+
+@pytest.fixture
+def conninfo():
+    """Connection info of a throwaway schema, so metrics table of database is left untouched"""
+    try:
+        connection = psycopg.connect(get_pg_conninfo(), connect_timeout=3, autocommit=True)
+    except psycopg.OperationalError as e:
+        pytest.skip(f"Postgres not reachable: {e}")
+
+    schema = f"test_metrics_{uuid.uuid4().hex[:8]}"
+    with connection:
+        connection.execute(f"CREATE SCHEMA {schema}")
+        yield psycopg.conninfo.make_conninfo(get_pg_conninfo(), options=f"-c search_path={schema}")
+        connection.execute(f"DROP SCHEMA {schema} CASCADE")
+
+
+def execute(conninfo, query):
+    with psycopg.connect(conninfo, autocommit=True) as conn:
+        conn.execute(query)
+
+
+def fetch_all(conninfo, query):
+    with psycopg.connect(conninfo) as conn:
+        return conn.execute(query).fetchall()
+
+
+def write_rows(conninfo, fare_median: float):
+    with MetricsSink(conninfo=conninfo) as sink:
+        for timestamp in TIMESTAMPS:
+            sink.add((timestamp, 0.1, 1, 0.01, fare_median))
+
+
+def test_rewritten_rows_replace_earlier_ones(conninfo):
+    execute(conninfo, read_sql("initdb.d", "metrics.sql"))
+
+    write_rows(conninfo, fare_median=10.0)
+    write_rows(conninfo, fare_median=12.5)
+
+    rows = fetch_all(conninfo, "SELECT timestamp, fare_median FROM metrics ORDER BY timestamp")
+    assert rows == [(timestamp, 12.5) for timestamp in TIMESTAMPS]
+
+
+def test_table_without_primary_key_is_migrated(conninfo):
+    execute(conninfo, read_sql("initdb.d", "metrics.sql").replace(" PRIMARY KEY", ""))
+    for fare_median in [10.0, 11.0]:
+        execute(conninfo, f"INSERT INTO metrics (timestamp, fare_median) VALUES ('2022-02-01', {fare_median})")
+
+    with pytest.raises(RuntimeError, match="metrics_primary_key.sql"):
+        write_rows(conninfo, fare_median=12.5)
+
+    # migration keeps last inserted row of duplicates, and does nothing once applied
+    for _ in range(2):
+        execute(conninfo, read_sql("migrations", "metrics_primary_key.sql"))
+    assert fetch_all(conninfo, "SELECT fare_median FROM metrics") == [(11.0,)]
+
+    write_rows(conninfo, fare_median=12.5)
+    rows = fetch_all(conninfo, "SELECT timestamp, fare_median FROM metrics ORDER BY timestamp")
+    assert rows == [(timestamp, 12.5) for timestamp in TIMESTAMPS]
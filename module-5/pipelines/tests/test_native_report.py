@@ -0,0 +1,70 @@
+import pytest
+
+from constants import CAT_FEATURES
+from NativeReport import NUM_COLUMNS, NativeReference, NativeReport
+
+
+# stated in module README: native scores match Evidently up to floating point rounding
+RTOL = 1e-9
+ATOL = 1e-12
+
+
+def get_evidently_drift_scores(reference, current, num_stattest, cat_stattest) -> dict:
+    from evidently.metrics import DataDriftTable
+    from evidently.report import Report
+
+    from DefaultReport import DefaultReport
+
+    evidently_report = Report(metrics=[DataDriftTable(num_stattest=num_stattest, cat_stattest=cat_stattest)])
+    evidently_report.run(
+        current_data=current, reference_data=reference, column_mapping=DefaultReport.get_default_column_mapping()
+    )
+    drift_by_columns = evidently_report.as_dict()["metrics"][0]["result"]["drift_by_columns"]
+
+    return {column: result["drift_score"] for column, result in drift_by_columns.items()}
+
+
+@pytest.mark.parametrize(
+    "num_stattest,cat_stattest",
+    [("wasserstein", "jensenshannon"), ("ks", "psi"), ("psi", "jensenshannon"), ("psi", "psi")],
+)
+def test_drift_scores_match_evidently(reference, current, num_stattest, cat_stattest):
+    pytest.importorskip("evidently")
+    expected = get_evidently_drift_scores(reference, current, num_stattest, cat_stattest)
+
+    report = NativeReport(num_stattest, cat_stattest)
+    report.run(current, NativeReference(reference))
+
+    for column in NUM_COLUMNS + CAT_FEATURES:
+        assert report.drift_scores[column] == pytest.approx(expected[column], rel=RTOL, abs=ATOL), column
+
+
+def test_asymptotic_ks_matches_evidently(make_trips, current):
+    """References above MAX_EXACT_KS_SIZE rows get asymptotic p-values"""
+    pytest.importorskip("evidently")
+    reference = make_trips(12_000, shift=0.0, seed=2)
+    expected = get_evidently_drift_scores(reference, current, "ks", "jensenshannon")
+
+    report = NativeReport("ks")
+    report.run(current, reference)
+
+    for column in NUM_COLUMNS:
+        assert report.drift_scores[column] == pytest.approx(expected[column], rel=RTOL, abs=ATOL), column
+
+
+def test_results_match_default_report(reference, current):
+    pytest.importorskip("evidently")
+    from DefaultReport import DefaultReport
+
+    default_report = DefaultReport()
+    default_report.run(current_data=current, reference_data=reference)
+    report = NativeReport()
+    report.run(current, reference)
+
+    for key, expected in default_report.results.items():
+        assert report.results[key] == pytest.approx(expected, rel=RTOL, abs=ATOL), key
+
+
+def test_unsupported_stattest():
+    with pytest.raises(ValueError, match="Unsupported numerical stattest"):
+        NativeReport(num_stattest="anderson")
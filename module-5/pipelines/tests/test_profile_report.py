@@ -0,0 +1,24 @@
+import pytest
+
+from ProfileReport import DRIFT_ATOL, ProfileReport, build_reference_profile
+
+
+@pytest.fixture(scope="module")
+def profile(reference):
+    return build_reference_profile(reference)
+
+
+def test_results_match_default_report(reference, profile, current):
+    pytest.importorskip("evidently")
+    from DefaultReport import DefaultReport
+
+    default_report = DefaultReport()
+    default_report.run(current_data=current, reference_data=reference)
+    report = ProfileReport()
+    report.run(current, profile)
+
+    # drift scores of quantile-summarized columns are approximated, other results are exact
+    tolerances = dict(prediction_drift=DRIFT_ATOL)
+    for key, expected in default_report.results.items():
+        assert report.results[key] == pytest.approx(expected, rel=1e-12, abs=tolerances.get(key, 1e-12)), key
+
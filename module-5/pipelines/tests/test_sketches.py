@@ -0,0 +1,62 @@
+import numpy as np
+import pytest
+
+from ProfileReport import ProfileReport, build_reference_profile
+from sketches import WindowSketch
+
+
+# stated in module README, keys missing here are exact: against ProfileReport binned
+# values move prediction drift by ~1.2e-4 and fare median by less than a cent, against
+# DefaultReport profile quantiles add up to ~6.2e-4 on prediction drift
+PROFILE_REPORT_ATOL = dict(prediction_drift=1e-3, fare_med_current=0.01)
+DEFAULT_REPORT_ATOL = dict(prediction_drift=1e-3, fare_med_current=0.01)
+
+
+@pytest.fixture(scope="module")
+def profile(reference):
+    return build_reference_profile(reference)
+
+
+def sketch_batches(profile, df, n_batches: int) -> WindowSketch:
+    """Sketch of df built from batches merged together, as windows are"""
+    sketch = WindowSketch(profile)
+    for rows in np.array_split(np.arange(len(df)), n_batches):
+        batch = WindowSketch(profile)
+        batch.update(df.iloc[rows])
+        sketch.merge(batch)
+
+    return sketch
+
+
+def test_window_results_match_profile_report(profile, current):
+    report = ProfileReport()
+    report.run(current, profile)
+    results = sketch_batches(profile, current, n_batches=7).results(profile)
+
+    assert results.keys() == report.results.keys()
+    for key, expected in report.results.items():
+        assert results[key] == pytest.approx(expected, rel=1e-12, abs=PROFILE_REPORT_ATOL.get(key, 1e-12)), key
+
+
+def test_window_results_match_default_report(reference, profile, current):
+    pytest.importorskip("evidently")
+    from DefaultReport import DefaultReport
+
+    default_report = DefaultReport()
+    default_report.run(current_data=current, reference_data=reference)
+    results = sketch_batches(profile, current, n_batches=7).results(profile)
+
+    for key, expected in default_report.results.items():
+        assert results[key] == pytest.approx(expected, rel=1e-12, abs=DEFAULT_REPORT_ATOL.get(key, 1e-12)), key
+
+
+def test_merged_batches_match_one_update(profile, current):
+    merged = sketch_batches(profile, current, n_batches=5).results(profile)
+    single = sketch_batches(profile, current, n_batches=1).results(profile)
+
+    assert merged == pytest.approx(single, rel=1e-12)
+
+
+def test_empty_window(profile):
+    with pytest.raises(ValueError, match="Empty columns"):
+        WindowSketch(profile).results(profile)
@@ -0,0 +1,35 @@
+import json
+
+import pytest
+
+pytest.importorskip("prefect")
+pytest.importorskip("psycopg")
+
+from stream_monitor_flow import iter_jsonl  # noqa: E402
+
+
+def write_trips(file_path, n: int, trailing_newline: bool):
+    lines = [
+        json.dumps(
+            dict(
+                lpep_pickup_datetime=f"2022-02-01T00:{i:02d}:00.000",
+                lpep_dropoff_datetime=f"2022-02-01T00:{i:02d}:30.000",
+                PULocationID=i,
+            )
+        )
+        for i in range(n)
+    ]
+    with open(file_path, "w") as file:
+        file.write("\n".join(lines) + ("\n" if trailing_newline else ""))
+
+
+@pytest.mark.parametrize("trailing_newline", [True, False])
+def test_iter_jsonl_reads_every_line(tmp_path, trailing_newline):
+    file_path = tmp_path / "trips.jsonl"
+    write_trips(file_path, 5, trailing_newline)
+
+    frames = list(iter_jsonl(str(file_path), batch_size=2))
+
+    assert [len(df) for df in frames] == [2, 2, 1]
+    assert frames[-1]["PULocationID"].tolist() == [4]
+    assert str(frames[-1]["lpep_pickup_datetime"].dtype).startswith("datetime64")
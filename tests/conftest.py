@@ -0,0 +1,7 @@
+import os
+import sys
+
+ROOT_DIR = os.path.join(os.path.dirname(__file__), "..")
+
+# tripdata.py is shared by copies in every module, module-1 one is tested
+sys.path.insert(0, os.path.join(ROOT_DIR, "module-1"))
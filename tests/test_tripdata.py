@@ -0,0 +1,157 @@
+import filecmp
+import functools
+import http.server
+import os
+import threading
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+
+import pytest
+
+from tripdata import TripDataCache, load_months
+
+ROOT_DIR = os.path.join(os.path.dirname(__file__), "..")
+COPIES = [
+    "module-1/tripdata.py",
+    "module-3/src/tripdata.py",
+    "module-4/tripdata.py",
+    "module-5/pipelines/src/tripdata.py",
+]
+
+
+class QuietHandler(http.server.SimpleHTTPRequestHandler):
+    def log_message(self, *args):
+        pass
+
+
+@pytest.fixture
+def origin(tmp_path):
+    """(directory, base URL) of a local HTTP stand-in for CloudFront, answering 304 to If-Modified-Since"""
+    directory = tmp_path / "origin"
+    directory.mkdir()
+    handler = functools.partial(QuietHandler, directory=str(directory))
+    server = http.server.ThreadingHTTPServer(("127.0.0.1", 0), handler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    yield (directory, f"http://127.0.0.1:{server.server_address[1]}")
+    server.shutdown()
+    server.server_close()
+
+
+def write_file(directory, name, content: bytes, mtime: int):
+    path = directory / name
+    path.write_bytes(content)
+    os.utime(path, (mtime, mtime))
+
+
+def list_objects(cache: TripDataCache):
+    return sorted(os.listdir(cache.objects_dir))
+
+
+def fetch_all(cache_dir, urls):
+    cache = TripDataCache(cache_dir, offline=False)
+    return [cache.fetch(url) for url in urls]
+
+
+def read_bytes(file_path, columns=None, filters=None):
+    with open(file_path, "rb") as file:
+        return (os.path.basename(file_path), file.read(), columns)
+
+
+def test_copies_are_identical():
+    first = os.path.join(ROOT_DIR, COPIES[0])
+    for copy in COPIES[1:]:
+        assert filecmp.cmp(first, os.path.join(ROOT_DIR, copy), shallow=False), f"{copy} differs from {COPIES[0]}"
+
+
+def test_fetch_revalidates_and_replaces_changed_content(origin, tmp_path):
+    (directory, base_url) = origin
+    url = f"{base_url}/green_tripdata_2022-01.parquet"
+    write_file(directory, "green_tripdata_2022-01.parquet", b"a" * 1000, mtime=1_600_000_000)
+    cache = TripDataCache(str(tmp_path / "cache"), offline=False)
+
+    first = cache.fetch(url)
+    assert (cache.hits, cache.misses) == (0, 1)
+
+    # unchanged file answers 304 Not Modified
+    second = cache.fetch(url)
+    assert (cache.hits, cache.misses) == (1, 1)
+    assert second == first
+
+    write_file(directory, "green_tripdata_2022-01.parquet", b"b" * 3000, mtime=1_600_000_100)
+    third = cache.fetch(url)
+    assert (cache.hits, cache.misses) == (1, 2)
+    assert third != first
+    with open(third, "rb") as file:
+        assert file.read() == b"b" * 3000
+
+    # old object is removed, disk usage matches stats
+    assert list_objects(cache) == [os.path.basename(third)]
+    assert cache.stats()["files"] == 1
+    assert cache.stats()["bytes"] == 3000 == os.path.getsize(third)
+
+
+def test_shared_object_is_kept_while_referenced(origin, tmp_path):
+    (directory, base_url) = origin
+    write_file(directory, "a.parquet", b"x" * 100, mtime=1_600_000_000)
+    write_file(directory, "b.parquet", b"x" * 100, mtime=1_600_000_000)
+    cache = TripDataCache(str(tmp_path / "cache"), offline=False)
+
+    shared = cache.fetch(f"{base_url}/a.parquet")
+    assert cache.fetch(f"{base_url}/b.parquet") == shared
+
+    write_file(directory, "a.parquet", b"y" * 100, mtime=1_600_000_100)
+    cache.fetch(f"{base_url}/a.parquet")
+    assert os.path.exists(shared)
+    assert len(list_objects(cache)) == 2
+
+
+def test_least_recently_used_files_are_evicted_over_budget(origin, tmp_path):
+    (directory, base_url) = origin
+    for name, content in [("a", b"a"), ("b", b"b"), ("c", b"c")]:
+        write_file(directory, f"{name}.parquet", content * 100, mtime=1_600_000_000)
+    cache = TripDataCache(str(tmp_path / "cache"), max_bytes=250, offline=False)
+
+    path_a = cache.fetch(f"{base_url}/a.parquet")
+    path_b = cache.fetch(f"{base_url}/b.parquet")
+    cache.fetch(f"{base_url}/a.parquet")
+    path_c = cache.fetch(f"{base_url}/c.parquet")
+
+    assert not os.path.exists(path_b)
+    assert os.path.exists(path_a) and os.path.exists(path_c)
+    assert cache.stats()["files"] == 2
+    assert cache.stats()["bytes"] == 200
+
+
+def test_index_is_shared_by_concurrent_processes(origin, tmp_path):
+    (directory, base_url) = origin
+    urls = []
+    for i in range(16):
+        write_file(directory, f"{i}.parquet", str(i).encode() * 100, mtime=1_600_000_000)
+        urls.append(f"{base_url}/{i}.parquet")
+    cache_dir = str(tmp_path / "cache")
+
+    with ProcessPoolExecutor(max_workers=4) as executor:
+        list(executor.map(fetch_all, [cache_dir] * 4, [urls[i::4] for i in range(4)]))
+
+    cache = TripDataCache(cache_dir, offline=False)
+    assert cache.stats()["files"] == len(urls)
+    assert len(list_objects(cache)) == len(urls)
+
+
+@pytest.mark.parametrize("shared_executor", [False, True])
+def test_load_months_yields_in_requested_order(tmp_path, shared_executor):
+    pairs = [("green", f"2023-{month:02d}") for month in [3, 1, 2]] + [("yellow", "2023-01")]
+    for i, (vehicle_type, year_month) in enumerate(pairs):
+        write_file(tmp_path, f"{vehicle_type}_tripdata_{year_month}.parquet", bytes([i]) * (1000 - 100 * i), 0)
+    expected = [
+        (f"{vehicle_type}_tripdata_{year_month}.parquet", bytes([i]) * (1000 - 100 * i), ["PULocationID"])
+        for i, (vehicle_type, year_month) in enumerate(pairs)
+    ]
+    kwargs = dict(source=str(tmp_path), columns=["PULocationID"], read_fn=read_bytes, max_downloads=2)
+
+    if shared_executor:
+        with ThreadPoolExecutor(max_workers=2) as executor:
+            assert list(load_months(pairs, executor=executor, **kwargs)) == expected
+            # left running for next calls
+            assert list(load_months(pairs[:1], executor=executor, **kwargs)) == expected[:1]
+    else:
+        assert list(load_months(pairs, **kwargs)) == expected